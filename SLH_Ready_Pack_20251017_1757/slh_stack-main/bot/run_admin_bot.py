@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-import os, sys, json, logging, asyncio, time, re, pathlib, io
+import os, sys, json, logging, asyncio, time, re, pathlib, io, random
 from typing import List, Dict, Tuple, Optional
 import httpx
 
@@ -13,6 +13,21 @@ from telegram.ext import (
     filters,
 )
 
+# slh/ sits in the pack root of a built pack (scripts/build_ready_pack.py), at the repo root in a checkout
+_ROOT = next((p for p in pathlib.Path(__file__).resolve().parents if (p / "slh" / "__init__.py").exists()), None)
+if _ROOT and str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+from slh import startup
+from slh.jobs import JobFailed, JobQueue, JobRunner
+from slh.logsink import LogSink
+from slh.events import EventRing, matches, parse_since, scan_logs
+from slh.ratelimit import TokenBucketLimiter
+from slh import metrics
+from slh.metrics import timed_handler
+from slh.outbox import BULK, Outbox, outbox_from_env
+from slh.persistence import persistence_from_env
+from slh.updates import processor_from_env
+
 # =========================
 # Environment & Defaults
 # =========================
@@ -30,6 +45,25 @@ DEFAULT_META_CID = os.getenv("DEFAULT_META_CID","").strip()  # e.g. Qm....
 SELA_AMOUNT      = os.getenv("SELA_AMOUNT","0.15984").strip()
 
 LOG_DIR          = os.getenv("BOT_LOG_DIR", "/app/botdata/logs").strip()
+LOG_MAX_MB       = float(os.getenv("BOT_LOG_MAX_MB", "10"))
+LOG_FLUSH_SEC    = float(os.getenv("BOT_LOG_FLUSH_SECONDS", "1"))
+LOG_GZIP         = os.getenv("BOT_LOG_GZIP", "1").strip() not in ("0", "false", "no")
+EVENTS_CAPACITY  = int(os.getenv("BOT_EVENTS_CAPACITY", "800"))
+JOBS_DB          = os.getenv("BOT_JOBS_DB", "/app/botdata/jobs.sqlite").strip()
+STATE_DB         = os.getenv("BOT_STATE_DB", "/app/botdata/state.sqlite").strip()
+JOB_WORKERS      = int(os.getenv("BOT_JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("BOT_JOB_MAX_ATTEMPTS", "5"))
+RECEIPT_WAIT     = float(os.getenv("BOT_RECEIPT_TIMEOUT", "240"))  # API side: RECEIPT_TIMEOUT (180s) + fee bumps
+MINT_MAX_PENDING = int(os.getenv("MINT_MAX_PENDING", "50"))
+USER_LIMIT       = TokenBucketLimiter(rate=float(os.getenv("MINT_USER_PER_MIN", "2")) / 60, burst=float(os.getenv("MINT_USER_BURST", "3")))
+WALLET_LIMIT     = TokenBucketLimiter(rate=float(os.getenv("MINT_WALLET_PER_MIN", "0.2")) / 60, burst=float(os.getenv("MINT_WALLET_BURST", "2")))
+
+HTTP_MAX_CONN    = int(os.getenv("BOT_HTTP_MAX_CONN", "20"))
+HTTP_KEEPALIVE   = int(os.getenv("BOT_HTTP_KEEPALIVE", "10"))
+HTTP_HTTP2       = os.getenv("BOT_HTTP_HTTP2", "1").strip() not in ("0", "false", "no")
+HTTP_RETRIES     = int(os.getenv("BOT_HTTP_RETRIES", "3"))
+HTTP_BACKOFF     = float(os.getenv("BOT_HTTP_BACKOFF", "0.3"))
+EXECUTOR_WORKERS = int(os.getenv("BOT_EXECUTOR_WORKERS", "8"))
 
 if not TOKEN:
     print("TELEGRAM_BOT_TOKEN missing"); sys.exit(1)
@@ -56,14 +90,12 @@ except Exception as e:
 
 RUN_TS = int(time.time())
 RUN_ID = time.strftime("%Y%m%d-%H%M%S", time.gmtime(RUN_TS))
-SESSION_LOG_FILE = os.path.join(LOG_DIR, f"session-{RUN_ID}.log")
+# buffered writer thread: size/day rotation, gzip of closed segments, flushed on shutdown
+LOG_SINK = LogSink(LOG_DIR, f"session-{RUN_ID}", max_bytes=int(LOG_MAX_MB * 1024 * 1024),
+                   flush_interval=LOG_FLUSH_SEC, gzip_closed=LOG_GZIP)
 
 def write_log_line(line: str):
-    try:
-        with open(SESSION_LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(line.rstrip() + "\n")
-    except Exception as e:
-        log.error(f"write_log_line failed: {e}")
+    LOG_SINK.write(line)
 
 # =========================
 # Helpers: Admin, API calls
@@ -77,42 +109,305 @@ def _mask_token(t: str) -> str:
         return "****"
     return f"{t[:6]}...{t[-6:]}"
 
+# =========================
+# Shared HTTP client (API + Telegram)
+# =========================
+# per-route timeout profiles
+TIMEOUTS = {
+    "read":     httpx.Timeout(20, connect=10),
+    "write":    httpx.Timeout(30, connect=12),
+    "health":   httpx.Timeout(5, connect=3),
+    "telegram": httpx.Timeout(20, connect=10),
+    "receipt":  httpx.Timeout(RECEIPT_WAIT, connect=12),
+}
+ROUTE_TIMEOUTS = {
+    "/healthz": "health",
+    "/v1/chain/mint-demo": "write",
+    "/v1/chain/grant-sela": "write",
+}
+_RETRY_STATUS = (429, 502, 503, 504)
+_RETRY_AFTER_MAX = 60.0
+
+def _retryable(r: httpx.Response) -> bool:
+    # 409 + Retry-After: the API still holds this Idempotency-Key for a send in flight (or one whose lease runs out)
+    return r.status_code in _RETRY_STATUS or (r.status_code == 409 and "retry-after" in r.headers)
+
+def _retry_after(err: BaseException) -> Optional[float]:
+    if isinstance(err, httpx.HTTPStatusError):
+        try:
+            return min(float(err.response.headers["retry-after"]), _RETRY_AFTER_MAX)
+        except (KeyError, ValueError):
+            pass
+    return None
+
+HTTP: Optional[httpx.AsyncClient] = None
+
+def _http() -> httpx.AsyncClient:
+    """App-scoped keep-alive client; opened in post_init, closed on shutdown (lazily reopened if needed)."""
+    global HTTP
+    if HTTP is None or HTTP.is_closed:
+        http2 = HTTP_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401  (httpx[http2])
+            except ImportError:
+                log.warning("[HTTP] h2 not installed, using HTTP/1.1")
+                http2 = False
+        HTTP = httpx.AsyncClient(
+            http2=http2,
+            timeout=TIMEOUTS["read"],
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONN, max_keepalive_connections=HTTP_KEEPALIVE,
+                                keepalive_expiry=60),
+        )
+    return HTTP
+
+async def _close_http():
+    global HTTP
+    if HTTP is not None and not HTTP.is_closed:
+        await HTTP.aclose()
+    HTTP = None
+
+async def http_request(method: str, url: str, profile: str = "read", idempotent: bool = True, **kw) -> httpx.Response:
+    """
+    Request on the shared client. Idempotent calls retry transport errors and 429/5xx with
+    full-jitter backoff; non-idempotent ones only retry when the connection never opened.
+    """
+    retries = HTTP_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            r = await _http().request(method, url, timeout=TIMEOUTS[profile], **kw)
+            if idempotent and _retryable(r) and attempt < retries:
+                raise httpx.HTTPStatusError(f"{r.status_code} from {url}", request=r.request, response=r)
+            r.raise_for_status()
+            return r
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+            err = e
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            if not idempotent or (isinstance(e, httpx.HTTPStatusError) and not _retryable(e.response)):
+                raise
+            err = e
+        if attempt >= retries:
+            raise err
+        delay = _retry_after(err) or random.uniform(0, HTTP_BACKOFF * (2 ** attempt))
+        metrics.RETRIES.labels("http").inc()
+        log.warning(f"[HTTP] {method} {url} attempt {attempt + 1}/{retries + 1} failed: {err} | retry in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+HTTP_SECONDS = metrics.histogram("slh_bot_http_seconds", "Outbound API/Telegram call latency incl. retries", ("target",))
+
 async def api_get(path: str, params: dict | None = None):
-    url = f"{API}{path}"
-    timeout = httpx.Timeout(20, connect=10)
-    async with httpx.AsyncClient(timeout=timeout) as cx:
-        r = await cx.get(url, params=params)
-        r.raise_for_status()
-        return r.json()
-
-async def api_post(path: str, payload: dict):
-    url = f"{API}{path}"
-    timeout = httpx.Timeout(30, connect=12)
-    async with httpx.AsyncClient(timeout=timeout) as cx:
-        r = await cx.post(url, json=payload)
-        r.raise_for_status()
-        return r.json()
+    with HTTP_SECONDS.labels(path).time():
+        r = await http_request("GET", f"{API}{path}", ROUTE_TIMEOUTS.get(path, "read"), params=params)
+    return r.json()
+
+async def api_post(path: str, payload: dict, key: Optional[str] = None, wait: bool = False):
+    """POST to the API; with an Idempotency-Key the API replays its first answer, so retries are safe.
+
+    ``wait`` makes the API answer once the tx is mined (``ok`` is the receipt status, ``block`` is set).
+    """
+    headers = {"Idempotency-Key": key} if key else None
+    profile = "receipt" if wait else ROUTE_TIMEOUTS.get(path, "write")
+    with HTTP_SECONDS.labels(path).time():
+        r = await http_request("POST", f"{API}{path}", profile, idempotent=bool(key),
+                               json=payload, headers=headers, params={"wait": "true"} if wait else None)
+    return r.json()
+
+async def tg_call(method: str, http_method: str = "POST", **kw) -> dict:
+    with HTTP_SECONDS.labels(f"telegram:{method}").time():
+        r = await http_request(http_method, f"https://api.telegram.org/bot{TOKEN}/{method}", "telegram", **kw)
+    return r.json()
 
 # =========================
 # In-memory events + file
 # =========================
-EVENTS: List[dict] = []
+# ring buffer indexed by wallet / type / tx; older history comes from the session logs
+EVENTS = EventRing(EVENTS_CAPACITY)
 
 def push_event(ev: dict):
     ev = dict({"ts": int(time.time())}, **ev)
-    EVENTS.append(ev)
-    if len(EVENTS) > 800:
-        del EVENTS[:300]
-    # write to file (append)
-    write_log_line(json.dumps(ev, ensure_ascii=False))
+    rec = EVENTS.push(ev)
+    # write to file (append); seq lets the disk fallback skip what the ring still holds
+    write_log_line(json.dumps(dict(ev, seq=rec.seq), ensure_ascii=False))
+
+def _in_ring(path: str, ev: dict) -> bool:
+    """True for log lines of this run that the ring still holds (avoid showing them twice)."""
+    if not os.path.basename(path).startswith(f"session-{RUN_ID}."):
+        return False
+    return ev.get("seq", -1) >= EVENTS.evicted
+
+async def query_events(limit: int, **flt) -> List[dict]:
+    """Newest-first: ring first, then the on-disk session logs if the ring runs short."""
+    out = [e.as_dict() for e in EVENTS.query(limit=limit, **flt)]
+    if len(out) < limit:
+        out += await asyncio.to_thread(scan_logs, LOG_DIR, limit - len(out),
+                                       lambda ev: matches(ev, **flt), skip=_in_ring)
+    return out
+
+# =========================
+# Outbound messages
+# =========================
+OUTBOX: Optional[Outbox] = None  # created in build_app; rate limits, 429s and lanes are handled there
+
+def reply(update: Update, text: str, **kw):
+    """Queue a reply on the interactive lane; the handler does not wait for Telegram."""
+    return OUTBOX.reply(update, text, **kw)
 
 def block_header(title: str) -> str:
     return f"===== {title} | {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())} ====="
 
+# =========================
+# Durable mint + SELA grant jobs
+# =========================
+JOBS: Optional[JobQueue] = None
+RUNNER: Optional[JobRunner] = None
+
+JOB_SECONDS = metrics.histogram("slh_job_seconds", "Mint job latency from enqueue to confirmation", ("kind",),
+                               buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+metrics.gauge("slh_jobs_backlog", "Jobs waiting for a worker").set_function(lambda: RUNNER.backlog if RUNNER else 0)
+metrics.gauge("slh_jobs", "Persisted jobs by state", ("state",)).set_function(lambda: JOBS.counts() if JOBS else {})
+metrics.gauge("slh_log_queue", "Session log lines waiting for the writer").set_function(lambda: LOG_SINK.backlog)
+metrics.gauge("slh_log_dropped", "Session log lines dropped (writer queue full)").set_function(lambda: LOG_SINK.dropped)
+metrics.gauge("slh_events_ring", "Events held in the in-memory ring").set_function(lambda: len(EVENTS))
+
+def _tx_links(mint_tx: str, sela_tx: str) -> str:
+    links = []
+    if re.fullmatch(r"0x[0-9a-fA-F]{64}", mint_tx or ""):
+        links.append(f"[Mint TX](https://testnet.bscscan.com/tx/{mint_tx})")
+    if re.fullmatch(r"0x[0-9a-fA-F]{64}", sela_tx or ""):
+        links.append(f"[SELA TX](https://testnet.bscscan.com/tx/{sela_tx})")
+    return " | ".join(links) if links else "(לינקים יופיעו לאחר כרייה)"
+
+_TX_RE = re.compile(r"0x[0-9a-fA-F]{64}")
+
+async def _submit(path: str, payload: dict, key: str) -> str:
+    res = await api_post(path, payload, key=key)
+    tx = res.get("tx") or ""
+    if not _TX_RE.fullmatch(tx):
+        raise JobFailed(f"{path}: no tx hash in {res}")
+    return tx
+
+async def _mined(path: str, payload: dict, key: str) -> str:
+    """Same request and key with wait=true: the API replays its send and answers with the receipt."""
+    res = await api_post(path, payload, key=key, wait=True)
+    if res.get("block") is None:
+        raise JobFailed(f"tx {res.get('tx')} not mined: {res.get('error') or 'no receipt'}")
+    if not res.get("ok"):
+        raise JobFailed(f"tx {res.get('tx')} reverted (block {res['block']})")
+    return res["tx"]  # the mined version: a fee-bumped replacement has its own hash
+
+async def _process_job(app, job: dict):
+    """Mint → receipt → grant → receipt → notify; each step is persisted, so a restart resumes where it stopped."""
+    jid = job["id"]
+    # one key per Telegram update (job id for jobs without one): webhook redeliveries and job retries reuse it
+    origin = f"tg:{job['update_id']}" if job["update_id"] is not None else f"job:{jid}"
+    mint = ("/v1/chain/mint-demo", {"to_wallet": job["wallet"], "token_uri": job["token_uri"]}, f"{origin}:mint")
+    grant = ("/v1/chain/grant-sela", {"to_wallet": job["wallet"], "amount": job["amount"]}, f"{origin}:grant")
+    if job["state"] == "queued":
+        job = JOBS.update(jid, state="mint_sent", mint_tx=await _submit(*mint))
+    if job["state"] == "mint_sent":
+        # SELA is only paid out for a mint that is on chain with status 1
+        job = JOBS.update(jid, state="minted", mint_tx=await _mined(*mint))
+    if job["state"] == "minted":
+        job = JOBS.update(jid, state="grant_sent", sela_tx=await _submit(*grant))
+    if job["state"] == "grant_sent":
+        # closed before anything user-facing: a retry can neither mint again nor add a second event
+        job = JOBS.update(jid, state="confirmed", sela_tx=await _mined(*grant), error=None)
+        JOB_SECONDS.labels(job["kind"]).observe(time.time() - job["created_at"])
+        log.info(f"[JOB] #{jid} confirmed | wallet={job['wallet']} mint={job['mint_tx']} sela={job['sela_tx']}")
+        push_event({
+            "type": job["kind"],
+            "wallet": job["wallet"],
+            "token_uri": job["token_uri"],
+            "mint_tx": job["mint_tx"],
+            "sela_tx": job["sela_tx"],
+            "note": job["note"],
+            "job": jid
+        })
+        if job["chat_id"]:
+            title = "✅ *הונפק לך NFT והועבר SELA!*" if job["kind"] == "mint_user" else "✅ *Sold + Granted*"
+            msg = (
+                f"{title}\n"
+                f"• Wallet: `{job['wallet']}`\n"
+                f"• tokenURI: `{job['token_uri']}`\n"
+                f"• {_tx_links(job['mint_tx'], job['sela_tx'])}\n"
+            )
+            # best-effort, bulk lane: the outbox retries 429s and network errors, not Forbidden/BadRequest
+            _notify(jid, job["chat_id"], msg, parse_mode=ParseMode.MARKDOWN, disable_web_page_preview=True)
+
+def _notify(jid: int, chat_id: int, text: str, **kw):
+    def done(f: asyncio.Future):
+        if not f.cancelled() and f.exception() is not None:
+            log.warning(f"[JOB] #{jid} notice not delivered: {f.exception()}")
+    try:
+        OUTBOX.send(chat_id, text, lane=BULK, **kw).add_done_callback(done)
+    except asyncio.QueueFull as e:
+        log.warning(f"[JOB] #{jid} notice dropped: {e}")
+
+async def _job_failed(app, job: dict, err: BaseException):
+    push_event({"type": f"{job['kind']}_failed", "wallet": job["wallet"], "token_uri": job["token_uri"],
+                "mint_tx": job["mint_tx"] or "-", "note": str(err), "job": job["id"]})
+    if job["chat_id"]:
+        prefix = "API error" if isinstance(err, httpx.HTTPError) else "Chain" if isinstance(err, JobFailed) else "Unexpected"
+        _notify(job["id"], job["chat_id"], f"❗ בקשה #{job['id']} נכשלה — {prefix}: {err}")
+
+async def _start_jobs(app):
+    global JOBS, RUNNER
+    if RUNNER is not None:
+        return
+    JOBS = JobQueue(JOBS_DB)
+    RUNNER = JobRunner(JOBS, lambda job: _process_job(app, job),
+                       on_failed=lambda job, err: _job_failed(app, job, err),
+                       concurrency=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS)
+    await RUNNER.start()
+
+async def _stop_jobs(app):
+    global JOBS, RUNNER
+    if RUNNER:
+        await RUNNER.stop()
+    if JOBS:
+        JOBS.close()
+    JOBS = RUNNER = None
+
+async def enqueue_mint(update: Update, kind: str, wallet: str, token_uri: str, note: str):
+    """Persist the job and answer right away; the worker pool does the chain round-trips."""
+    public = kind == "mint_user"  # /adm_sell is not throttled
+    if public:
+        wait = USER_LIMIT.allow(update.effective_user.id)
+        if wait:
+            log.warning(f"[MINT] user rate-limited | user={update.effective_user.id} retry_in={wait:.0f}s")
+            reply(update, f"⏳ יותר מדי בקשות. נסה/י שוב בעוד {wait:.0f} שניות.")
+            return
+    # same (wallet, tokenURI) already queued/running/done → point at that job instead of minting again
+    existing = JOBS.find(wallet, token_uri)
+    if existing and existing["state"] != "failed":
+        reply(update,
+            f"בקשה זהה כבר קיימת (#{existing['id']}, מצב: {existing['state']}). לא נבצע הנפקה כפולה."
+        )
+        return
+    if public:
+        wait = WALLET_LIMIT.allow(wallet.lower())
+        if wait:
+            log.warning(f"[MINT] wallet rate-limited | wallet={wallet} retry_in={wait:.0f}s")
+            reply(update, f"⏳ הארנק הזה קיבל mint לאחרונה. נסה/י שוב בעוד {wait:.0f} שניות.")
+            return
+    if RUNNER.backlog >= MINT_MAX_PENDING:
+        log.warning(f"[MINT] busy | backlog={RUNNER.backlog}")
+        reply(update, "⏳ המערכת עמוסה כרגע. נסה/י שוב בעוד דקה.")
+        return
+    job, created = JOBS.enqueue(kind, wallet, token_uri, amount=str(SELA_AMOUNT), note=note,
+                                chat_id=update.effective_chat.id, update_id=update.update_id)
+    if not created:
+        reply(update,
+            f"בקשה זהה כבר קיימת (#{job['id']}, מצב: {job['state']}). לא נבצע הנפקה כפולה."
+        )
+        return
+    RUNNER.submit(job["id"])
+    reply(update, f"⏳ בקשה #{job['id']} נקלטה — נעדכן כאן כשההנפקה וההעברה יושלמו.")
+
 # =========================
 # On-boot summary for admins
 # =========================
-def startup_dump():
+def startup_dump(warm: Optional[dict] = None):
     lines = [
         "===== SLH Admin Bot – Startup =====",
         f"MODE: {MODE}",
@@ -126,8 +421,15 @@ def startup_dump():
         f"DEFAULT_META_CID: {DEFAULT_META_CID or '-'}",
         f"SELA_AMOUNT: {SELA_AMOUNT}",
         f"TOKEN(masked): {_mask_token(TOKEN)}",
-        f"LOG_DIR: {LOG_DIR}",
+        f"LOG_DIR: {LOG_DIR} (rotate={LOG_MAX_MB}MB/day gzip={LOG_GZIP})",
+        f"JOBS_DB: {JOBS_DB} (workers={JOB_WORKERS})",
+        f"STATE_DB: {STATE_DB or '(memory)'}",
+        f"HTTP: http2={HTTP_HTTP2} max_conn={HTTP_MAX_CONN} keepalive={HTTP_KEEPALIVE} retries={HTTP_RETRIES}",
     ]
+    if warm is not None:
+        lines.append("WARMUP: " + ("ok" if warm["ok"] else "FAILED") + " | " + " ".join(
+            f"{n}={'ok' if r['ok'] else r['error']} ({r['seconds']}s)" for n, r in warm["steps"].items()))
+        lines.append("BOOT(s since process start): " + " ".join(f"{k}={v}" for k, v in warm["marks"].items()))
     for ln in lines: log.info(ln)
     write_log_line("\n".join(lines))
 
@@ -140,11 +442,9 @@ async def ensure_webhook() -> Tuple[bool, str]:
         return False, "BOT_WEBHOOK_PUBLIC_BASE must be https for webhook mode"
     url = PUBLIC + PATH
     try:
-        async with httpx.AsyncClient(timeout=20) as cx:
-            delete = (await cx.post(f"https://api.telegram.org/bot{TOKEN}/deleteWebhook")).json()
-            set_    = (await cx.post(f"https://api.telegram.org/bot{TOKEN}/setWebhook",
-                                     data={"url": url, "secret_token": SECRET})).json()
-            info    = (await cx.get (f"https://api.telegram.org/bot{TOKEN}/getWebhookInfo")).json()
+        delete = await tg_call("deleteWebhook")
+        set_   = await tg_call("setWebhook", data={"url": url, "secret_token": SECRET})
+        info   = await tg_call("getWebhookInfo", "GET")
         log.info("ensure_webhook: ok=True")
         log.info(f"url={url}")
         log.info(f"delete={delete}")
@@ -171,11 +471,11 @@ def _ensure_main_loop():
 # =========================
 # Guided state for /adm_sell wizard
 # =========================
-WIZ_SELL: Dict[int, Dict[str, str]] = {}
+# kept in context.user_data so a half-done wizard survives a restart (BOT_STATE_DB)
+WIZ_SELL = "wiz_sell"
 
-def reset_wiz(user_id: int):
-    if user_id in WIZ_SELL:
-        del WIZ_SELL[user_id]
+def reset_wiz(context: ContextTypes.DEFAULT_TYPE):
+    context.user_data.pop(WIZ_SELL, None)
 
 # =========================
 # Handlers
@@ -190,10 +490,10 @@ async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "דוגמה:\n"
         "`/mint 0x1234...abcd`\n"
     )
-    await update.message.reply_text(msg, parse_mode=ParseMode.MARKDOWN)
+    reply(update, msg, parse_mode=ParseMode.MARKDOWN)
 
 async def ping_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("pong ✅")
+    reply(update, "pong ✅")
 
 async def health_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """בדיקת בריאות נגד ה-API /healthz + סיכום קצר."""
@@ -202,11 +502,11 @@ async def health_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ok = h.get("ok")
         net = h.get("network","?")
         contract = h.get("contract","?")
-        await update.message.reply_text(
+        reply(update,
             f"healthz: ok={ok} | network={net} | contract={contract}"
         )
     except Exception as e:
-        await update.message.reply_text(f"healthz error: {e}")
+        reply(update, f"healthz error: {e}")
 
 async def adm_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
@@ -215,14 +515,14 @@ async def adm_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "*פקודות אדמין שימושיות:*\n"
         "/adm_status — מצב ריצה והגדרות\n"
         "/adm_setwebhook — קובע webhook לפי ההגדרות הנוכחיות\n"
-        "/adm_recent [N] — האירועים האחרונים | אפשר גם `save` לשמירה לקובץ\n"
+        "/adm_recent [N] [wallet=… type=… tx=… since=…] — האירועים האחרונים (כולל היסטוריה מהדיסק) | אפשר גם `save` לשמירה לקובץ\n"
         "/adm_sell `<wallet> <ipfs://CID|https://...> [note]` — מהיר\n"
         "/adm_sell — ללא פרמטרים: אשף דו־שלבי + אישור\n"
         "/adm_echo <טקסט> — החזר טקסט (בדיקה)\n"
         "/ping — בדיקת חיים\n"
         "/health — בדיקת /healthz של ה־API\n"
     )
-    await update.message.reply_markdown(txt)
+    reply(update, txt, parse_mode=ParseMode.MARKDOWN)
 
 async def adm_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
@@ -232,116 +532,90 @@ async def adm_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"MODE={MODE} | PORT={PORT} | PUBLIC='{PUBLIC}' | PATH='{PATH}' | SECRET.len={len(SECRET)} | API='{API}'\n"
         f"DEFAULT_WALLET={DEFAULT_WALLET or '-'} | DEFAULT_META_CID={DEFAULT_META_CID or '-'} | SELA_AMOUNT={SELA_AMOUNT}\n"
         f"LOG_DIR={LOG_DIR}\n"
-        f"SESSION_LOG={os.path.basename(SESSION_LOG_FILE)}"
+        f"SESSION_LOG={os.path.basename(LOG_SINK.path)} | written={LOG_SINK.written} dropped={LOG_SINK.dropped}\n"
+        f"JOBS={JOBS.counts() if JOBS else '-'} | backlog={RUNNER.backlog if RUNNER else '-'}"
     )
-    await update.message.reply_text(info)
+    reply(update, info)
 
 async def adm_setwebhook(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         return
     ok, msg = await ensure_webhook()
-    await update.message.reply_text(f"SetWebhook → {ok}\n{PUBLIC}{PATH}")
+    reply(update, f"SetWebhook → {ok}\n{PUBLIC}{PATH}")
 
 async def adm_echo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         return
     text = " ".join(context.args) if context.args else "(no text)"
-    await update.message.reply_text(f"echo: {text}")
+    reply(update, f"echo: {text}")
 
 async def adm_recent(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         return
     # special: /adm_recent save → force save block file
     if context.args and context.args[0].lower() == "save":
-        # פשוט מצביע על קובץ הסשן הנוכחי
-        await update.message.reply_text(f"Saved to file: {os.path.basename(SESSION_LOG_FILE)}")
+        # מרוקן את התור לדיסק ומצביע על קובץ הסשן הנוכחי
+        await asyncio.to_thread(LOG_SINK.flush)
+        reply(update, f"Saved to file: {os.path.basename(LOG_SINK.path)}")
         return
 
-    n = 20
-    if context.args and context.args[0].isdigit():
-        n = min(int(context.args[0]), 120)
-    if not EVENTS:
-        await update.message.reply_text("No events yet.")
+    n, flt = 20, {}
+    for a in context.args or []:
+        if a.isdigit():
+            n = min(int(a), 120)
+            continue
+        k, _, v = a.partition("=")
+        k = k.lower()
+        if k not in ("wallet", "type", "tx", "since") or not v:
+            reply(update,
+                "שימוש: /adm_recent [N] [wallet=0x…] [type=adm_sell] [tx=0x…] [since=2h|7d|2025-10-17|<unix>]"
+            )
+            return
+        try:
+            flt[k] = parse_since(v) if k == "since" else v
+        except ValueError as e:
+            reply(update, str(e))
+            return
+
+    found = await query_events(n, **flt)
+    if not found:
+        reply(update, "No events yet." if not flt else "No matching events.")
         return
-    lines = [block_header(f"RECENT last {n}")]
-    for ev in EVENTS[-n:]:
+    title = f"RECENT last {n}" + (" | " + " ".join(f"{k}={v}" for k, v in flt.items()) if flt else "")
+    lines = [block_header(title)]
+    for ev in reversed(found):
         lines.append(
             f"ts={ev.get('ts')} | type={ev.get('type','-')} | wallet={ev.get('wallet','-')}\n"
             f"tokenURI={ev.get('token_uri','-')} | mint={ev.get('mint_tx','-')} | sela={ev.get('sela_tx','-')} | note={ev.get('note','-')}"
         )
     txt = "```\n" + ("\n\n".join(lines)) + "\n```"
-    await update.message.reply_text(txt, parse_mode=ParseMode.MARKDOWN)
+    reply(update, txt, parse_mode=ParseMode.MARKDOWN)
 
 # ---------- /mint (לכל המשתמשים) ----------
 async def mint_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """User-facing mint: /mint <wallet> — uses DEFAULT_META_CID for token_uri, then grant SELA."""
+    """User-facing mint: /mint <wallet> — queues mint (DEFAULT_META_CID) + SELA grant."""
     if not context.args:
-        await update.message.reply_markdown(
-            "שימוש: `/mint <כתובת־ארנק>`\nדוגמה: `/mint 0x1234...abcd`"
-        )
+        reply(update, "שימוש: `/mint <כתובת־ארנק>`\nדוגמה: `/mint 0x1234...abcd`",
+              parse_mode=ParseMode.MARKDOWN)
         return
 
     wallet = context.args[0].strip()
     if not re.fullmatch(r"0x[a-fA-F0-9]{40}", wallet):
-        await update.message.reply_text("כתובת ארנק לא תקינה (צורה: 0x… 40 hex).")
+        reply(update, "כתובת ארנק לא תקינה (צורה: 0x… 40 hex).")
         return
 
     if not DEFAULT_META_CID:
-        await update.message.reply_text("Default CID לא מוגדר בשרת (DEFAULT_META_CID). פנה לאדמין.")
+        reply(update, "Default CID לא מוגדר בשרת (DEFAULT_META_CID). פנה לאדמין.")
         return
 
     token_uri = f"ipfs://{DEFAULT_META_CID}"
-    try:
-        # Mint
-        mint_res = await api_post("/v1/chain/mint-demo", {
-            "to_wallet": wallet,
-            "token_uri": token_uri
-        })
-        mint_tx = mint_res.get("tx") or mint_res.get("hash") or "-"
-
-        # Grant SELA
-        grant_res = await api_post("/v1/chain/grant-sela", {
-            "to_wallet": wallet,
-            "amount": str(SELA_AMOUNT)
-        })
-        sela_tx = grant_res.get("tx") or grant_res.get("hash") or "-"
-
-        push_event({
-            "type": "mint_user",
-            "wallet": wallet,
-            "token_uri": token_uri,
-            "mint_tx": mint_tx,
-            "sela_tx": sela_tx,
-            "note": "user /mint"
-        })
-
-        links = []
-        if re.fullmatch(r"0x[0-9a-fA-F]{64}", mint_tx):
-            links.append(f"[Mint TX](https://testnet.bscscan.com/tx/{mint_tx})")
-        if re.fullmatch(r"0x[0-9a-fA-F]{64}", sela_tx):
-            links.append(f"[SELA TX](https://testnet.bscscan.com/tx/{sela_tx})")
-        links_str = " | ".join(links) if links else "(לינקים יופיעו לאחר כרייה)"
-
-        msg = (
-            "✅ *הונפק לך NFT והועבר SELA!*\n"
-            f"• Wallet: `{wallet}`\n"
-            f"• tokenURI: `{token_uri}`\n"
-            f"• {links_str}\n"
-        )
-        await update.message.reply_markdown(msg, disable_web_page_preview=True)
-
-    except httpx.HTTPError as e:
-        await update.message.reply_text(f"API error: {e}")
-    except Exception as e:
-        await update.message.reply_text(f"Unexpected: {e}")
+    await enqueue_mint(update, "mint_user", wallet, token_uri, "user /mint")
 
 # ---------- /adm_sell (מהיר או אשף) ----------
 async def adm_sell(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         return
 
-    uid = update.effective_user.id
-
     # מצב מהיר עם ארגומנטים
     if len(context.args) >= 2:
         wallet = context.args[0].strip()
@@ -351,8 +625,8 @@ async def adm_sell(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # אשף דו-שלבי
-    WIZ_SELL[uid] = {"step": "wallet"}
-    await update.message.reply_text(
+    context.user_data[WIZ_SELL] = {"step": "wallet"}
+    reply(update,
         "אשף הנפקה למכירה 🚀\n"
         "שלב 1/2 — שלח/י את כתובת הארנק (0x…):"
     )
@@ -368,53 +642,10 @@ async def _exec_sell(update: Update, wallet: str, uri_in: str, note: str):
 
     # Validate wallet
     if not re.fullmatch(r"0x[a-fA-F0-9]{40}", wallet):
-        await update.message.reply_text("כתובת ארנק לא תקינה (צורה: 0x… 40 hex).")
+        reply(update, "כתובת ארנק לא תקינה (צורה: 0x… 40 hex).")
         return
 
-    try:
-        # 1) Mint
-        mint_res = await api_post("/v1/chain/mint-demo", {
-            "to_wallet": wallet,
-            "token_uri": token_uri
-        })
-        mint_tx = mint_res.get("tx") or mint_res.get("hash") or "-"
-
-        # 2) Grant SELA
-        sela_amt = SELA_AMOUNT
-        grant_res = await api_post("/v1/chain/grant-sela", {
-            "to_wallet": wallet,
-            "amount": str(sela_amt)
-        })
-        sela_tx = grant_res.get("tx") or grant_res.get("hash") or "-"
-
-        push_event({
-            "type": "adm_sell",
-            "wallet": wallet,
-            "token_uri": token_uri,
-            "mint_tx": mint_tx,
-            "sela_tx": sela_tx,
-            "note": note
-        })
-
-        links = []
-        if re.fullmatch(r"0x[0-9a-fA-F]{64}", mint_tx):
-            links.append(f"[Mint TX](https://testnet.bscscan.com/tx/{mint_tx})")
-        if re.fullmatch(r"0x[0-9a-fA-F]{64}", sela_tx):
-            links.append(f"[SELA TX](https://testnet.bscscan.com/tx/{sela_tx})")
-        links_str = " | ".join(links) if links else "(לינקים יופיעו לאחר כרייה)"
-
-        msg = (
-            "✅ *Sold + Granted*\n"
-            f"• Wallet: `{wallet}`\n"
-            f"• tokenURI: `{token_uri}`\n"
-            f"• {links_str}\n"
-        )
-        await update.message.reply_markdown(msg, disable_web_page_preview=True)
-
-    except httpx.HTTPError as e:
-        await update.message.reply_text(f"API error: {e}")
-    except Exception as e:
-        await update.message.reply_text(f"Unexpected: {e}")
+    await enqueue_mint(update, "adm_sell", wallet, token_uri, note)
 
 async def text_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Router לפלואו אשף /adm_sell + fallback פקודות לא מוכרות."""
@@ -422,20 +653,19 @@ async def text_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     txt = update.message.text.strip()
-    uid = update.effective_user.id
 
     # אשף מכירה לאדמין
-    if uid in WIZ_SELL:
-        st = WIZ_SELL[uid]
+    st = context.user_data.get(WIZ_SELL)
+    if st is not None:
         step = st.get("step")
 
         if step == "wallet":
             if not re.fullmatch(r"0x[a-fA-F0-9]{40}", txt):
-                await update.message.reply_text("כתובת ארנק לא תקינה. נסה שוב (0x… 40 hex).")
+                reply(update, "כתובת ארנק לא תקינה. נסה שוב (0x… 40 hex).")
                 return
             st["wallet"] = txt
             st["step"] = "uri"
-            await update.message.reply_text(
+            reply(update,
                 "שלב 2/2 — שלח/י את ה־tokenURI:\n"
                 "• `ipfs://<CID>` (מומלץ)\n"
                 "• או `https://...` קובץ מטאדטה תקין\n"
@@ -461,44 +691,79 @@ async def text_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "כתבו: `confirm` כדי לבצע / `cancel` לביטול.\n"
                 "(אפשר גם לצרף הערה אחרי confirm, למשל: `confirm לקוח דמו`)\n"
             )
-            await update.message.reply_markdown(echo)
+            reply(update, echo, parse_mode=ParseMode.MARKDOWN)
             return
 
         if step == "confirm":
             low = txt.lower()
             if low.startswith("cancel"):
-                reset_wiz(uid)
-                await update.message.reply_text("בוטל.")
+                reset_wiz(context)
+                reply(update, "בוטל.")
                 return
             if low.startswith("confirm"):
                 note = txt[len("confirm"):].strip()
                 wallet = st["wallet"]; token_uri = st["token_uri"]
-                reset_wiz(uid)
+                reset_wiz(context)
                 # בצע
                 await _exec_sell(update, wallet, token_uri, note)
                 return
 
     # fallback — אם טקסט מתחיל ב־/ והפקודה לא מוכרת
     if txt.startswith("/"):
-        await update.message.reply_text("Unknown command. נסה /adm_help או /mint")
+        reply(update, "Unknown command. נסה /adm_help או /mint")
 
 # =========================
 # App & Run
 # =========================
+WARMUP = startup.warmup_from_env()
+
+async def _warm_api():
+    # opens the keep-alive pool to the API; the API answers 503 until its own warm-up is done
+    h = await api_get("/healthz")
+    return {"ok": h.get("ok"), "block": h.get("block")}
+
+WARMUP.step("api", _warm_api)
+
+async def post_init(app):
+    # to_thread work (log scans, sink close) on a pool whose saturation shows up in /metrics
+    asyncio.get_running_loop().set_default_executor(metrics.TrackedExecutor("bot_default", EXECUTOR_WORKERS))
+    metrics.serve_from_env()
+    _http()
+    await _start_jobs(app)
+    await WARMUP.wait()  # before the first update is taken; each step is bounded by WARMUP_TIMEOUT
+    startup_dump(WARMUP.report())
+    # webhook preflight (non-fatal — PTB sets the webhook again on start; polling stays as fallback)
+    if MODE == "webhook":
+        ok, msg = await ensure_webhook()
+        if not ok:
+            log.error(f"ensure_webhook FAILED: {msg}")
+
+async def post_shutdown(app):
+    await _stop_jobs(app)
+    await OUTBOX.close()  # delivers what is still queued, bounded
+    await _close_http()
+    await asyncio.to_thread(LOG_SINK.close)
+
 def build_app():
-    app = ApplicationBuilder().token(TOKEN).build()
-    app.add_handler(CommandHandler("start", start_cmd))
-    app.add_handler(CommandHandler("ping",  ping_cmd))
-    app.add_handler(CommandHandler("health",  health_cmd))
-    app.add_handler(CommandHandler("mint",  mint_cmd))
-    app.add_handler(CommandHandler("adm_help", adm_help))
-    app.add_handler(CommandHandler("adm_status", adm_status))
-    app.add_handler(CommandHandler("adm_setwebhook", adm_setwebhook))
-    app.add_handler(CommandHandler("adm_recent", adm_recent))
-    app.add_handler(CommandHandler("adm_sell", adm_sell))
-    app.add_handler(CommandHandler("adm_echo", adm_echo))
+    global OUTBOX
+    # chats are served concurrently (BOT_CONCURRENT_UPDATES), each chat strictly in order so wizard
+    # steps never overtake each other; redelivered update_ids are dropped
+    proc = processor_from_env()
+    app = (ApplicationBuilder().token(TOKEN).update_queue(proc.update_queue).concurrent_updates(proc)
+           .persistence(persistence_from_env(STATE_DB)).post_init(post_init).post_shutdown(post_shutdown).build())
+    OUTBOX = outbox_from_env(app.bot)
+    app.add_handler(CommandHandler("start", timed_handler("start", start_cmd)))
+    app.add_handler(CommandHandler("ping", timed_handler("ping", ping_cmd)))
+    app.add_handler(CommandHandler("health", timed_handler("health", health_cmd)))
+    app.add_handler(CommandHandler("mint", timed_handler("mint", mint_cmd)))
+    app.add_handler(CommandHandler("adm_help", timed_handler("adm_help", adm_help)))
+    app.add_handler(CommandHandler("adm_status", timed_handler("adm_status", adm_status)))
+    app.add_handler(CommandHandler("adm_setwebhook", timed_handler("adm_setwebhook", adm_setwebhook)))
+    app.add_handler(CommandHandler("adm_recent", timed_handler("adm_recent", adm_recent)))
+    app.add_handler(CommandHandler("adm_sell", timed_handler("adm_sell", adm_sell)))
+    app.add_handler(CommandHandler("adm_echo", timed_handler("adm_echo", adm_echo)))
     # wizard + fallback
-    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), text_router))
+    app.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), timed_handler("text", text_router)))
     # generic fallback for anything else
     app.add_handler(MessageHandler(filters.ALL, lambda *_: None))
     return app
@@ -526,17 +791,7 @@ def run_webhook(app):
     )
 
 if __name__ == "__main__":
-    startup_dump()
-
-    # וובהוק ברמת פרה-פלייט (לא פוסל דיפלוי אם נכשל — תהיה פולינג)
-    if MODE == "webhook":
-        try:
-            ok, msg = asyncio.run(ensure_webhook())
-            if not ok:
-                log.error(f"ensure_webhook FAILED: {msg}")
-        except Exception as e:
-            log.error(f"ensure_webhook crashed: {e}")
-
+    startup.mark("imports")
     print(f"🚀 Admin bot is starting ({MODE})…")
     app = build_app()
 
@@ -1,10 +1,18 @@
-import os, asyncio, logging
+import os, sys, asyncio, logging, pathlib, time
 from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 from web3 import Web3
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))  # repo root -> slh/
+from slh.outbox import Outbox, outbox_from_env
+from slh.receipts import ReceiptWatcher
+from slh.ratelimit import Coalescer, TokenBucketLimiter
+from slh.rpc import AsyncRPC, get_w3, get_contract, rpc_spec_from_env
+from slh.txengine import AsyncTxEngine
+from slh import abi, metrics
+
 # ---------- Logging robust (accepts "info"/"INFO"/numeric like 20) ----------
 def _resolve_log_level():
     val = os.environ.get("LOG_LEVEL", "INFO")
@@ -52,26 +60,58 @@ def _erc721_tokenuri_abi():
 
 # ---------- utils ----------
 def _fetch_token_id_from_receipt(w3: Web3, contract_address: str, tx_hash_hex: str) -> Optional[int]:
-    sig = Web3.keccak(text="Transfer(address,address,uint256)").hex()
-    rc = w3.eth.get_transaction_receipt(tx_hash_hex)
-    for lg in rc.logs:
-        if lg["address"].lower() == Web3.to_checksum_address(contract_address).lower():
-            t0 = lg["topics"][0].hex() if hasattr(lg["topics"][0], "hex") else str(lg["topics"][0])
-            if t0.lower() == sig.lower() and len(lg["topics"]) >= 4:
-                return int(lg["topics"][3].hex(), 16)
-    return None
+    return abi.token_ids([w3.eth.get_transaction_receipt(tx_hash_hex)], contract_address)[0]
 
 def _get_w3():
-    rpc = _need("BSC_RPC_URL")
-    import math
-    try:
-        to = int(os.environ.get("BSC_RPC_TIMEOUT","30"))
-    except Exception:
-        to = 30
-    w3 = Web3(Web3.HTTPProvider(rpc, request_kwargs={"timeout": to}))
-    if not w3.is_connected():
-        raise RuntimeError("RPC לא זמין")
-    return w3# ---------- UI ----------
+    # provider משותף (keep-alive); בריאות ה-RPC נבדקת ברקע ולא בכל קריאה
+    return get_w3(rpc_spec_from_env())
+
+_RPC: Optional[AsyncRPC] = None
+
+def _get_rpc() -> AsyncRPC:
+    # חיבור אסינכרוני אחד לשליחה, לקבלות ולמחירי gas
+    global _RPC
+    if _RPC is None:
+        _RPC = AsyncRPC(rpc_spec_from_env())
+    return _RPC
+
+_OUTBOX: Optional[Outbox] = None
+
+def _get_outbox(bot) -> Outbox:
+    # הודעות יוצאות דרך תור עם מגבלות קצב (גלובלית ולכל צ'אט); ה-handler לא ממתין לטלגרם
+    global _OUTBOX
+    if _OUTBOX is None:
+        _OUTBOX = outbox_from_env(bot)
+    return _OUTBOX
+
+_WATCHER: Optional[ReceiptWatcher] = None
+
+def _get_watcher() -> ReceiptWatcher:
+    global _WATCHER
+    if _WATCHER is None:
+        _WATCHER = ReceiptWatcher(
+            rpc_spec_from_env(), _need("NFT_CONTRACT"),
+            poll_interval=float(_env("RECEIPT_POLL_SECONDS", "1")),
+            timeout=float(_env("RECEIPT_TIMEOUT", "180")),
+            rpc=_get_rpc(),
+        )
+    return _WATCHER
+
+_ENGINE: Optional[AsyncTxEngine] = None
+
+def _get_engine() -> AsyncTxEngine:
+    global _ENGINE
+    if _ENGINE is None:
+        w3 = _get_w3()
+        _ENGINE = AsyncTxEngine(
+            rpc_spec_from_env(), int(_env("CHAIN_ID", "97")), w3.eth.account.from_key(_need("TREASURY_PRIVATE_KEY")),
+            retries=int(_env("MINT_RETRIES", "5")), backoff=float(_env("MINT_BACKOFF_SECONDS", "1")),
+            watcher=_get_watcher(), rpc=_get_rpc(),
+            bump_after=float(_env("GAS_BUMP_AFTER", "30")), max_bumps=int(_env("GAS_MAX_BUMPS", "3")),
+        )
+    return _ENGINE
+
+# ---------- UI ----------
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     kb = [
         [InlineKeyboardButton("⚡ קנה/י SELA (NFT)", callback_data="buy_sela_nft"),
@@ -82,128 +122,146 @@ async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = ("ברוך/ה הבא/ה ל־<b>SLH Admin Bot</b> ✨\n"
             "כאן מבצעים mint ל־NFT (ERC-721) על BSC Testnet.\n\n"
             "בחר/י פעולה:")
-    msg = update.message or update.effective_message
-    await msg.reply_text(text, reply_markup=InlineKeyboardMarkup(kb), parse_mode=ParseMode.HTML)
+    _get_outbox(context.bot).reply(update, text, reply_markup=InlineKeyboardMarkup(kb), parse_mode=ParseMode.HTML)
 
 async def on_cb(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     data = (q.data or "").strip()
     await q.answer()
+    box = _get_outbox(context.bot)
     if data == "buy_sela_nft":
         await mint_start(update, context)
     elif data == "sell_wizard":
-        await q.message.reply_text("🔧 בקרוב: אשף הנפקה/מכירה.")
+        box.reply(update, "🔧 בקרוב: אשף הנפקה/מכירה.")
     elif data == "status":
-        await q.message.reply_text("✅ הבוט פעיל. נסה/י /mint")
+        box.reply(update, "✅ הבוט פעיל. נסה/י /mint")
     elif data == "help":
-        await q.message.reply_text("עזרה: /mint לנפק NFT, /tokenId לקבלת מזהה אחרון, /tokenURI לקבלת ה-URI.")
+        box.reply(update, "עזרה: /mint לנפק NFT, /tokenId לקבלת מזהה אחרון, /tokenURI לקבלת ה-URI.")
     else:
-        await q.message.reply_text("⌛ בקרוב…")
+        box.reply(update, "⌛ בקרוב…")
 
 # ---------- Commands ----------
 async def ping_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await (update.message or update.effective_message).reply_text("pong 🟢")
+    _get_outbox(context.bot).reply(update, "pong 🟢")
 
 async def mint_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["awaiting_wallet_for_mint_nft"] = True
-    await (update.message or update.effective_message).reply_text("שלח/י כתובת ארנק BSC (0x…) לקבלת NFT (טסטנט).")
+    _get_outbox(context.bot).reply(update, "שלח/י כתובת ארנק BSC (0x…) לקבלת NFT (טסטנט).")
+
+# ---------- /mint guards: per-user + per-wallet token buckets, global cap, coalescing ----------
+_USER_LIMIT   = TokenBucketLimiter(rate=float(_env("MINT_USER_PER_MIN", "2")) / 60, burst=float(_env("MINT_USER_BURST", "3")))
+_WALLET_LIMIT = TokenBucketLimiter(rate=float(_env("MINT_WALLET_PER_MIN", "0.2")) / 60, burst=float(_env("MINT_WALLET_BURST", "2")))
+_MINT_SLOTS   = asyncio.Semaphore(int(_env("MINT_CONCURRENCY", "64")))
+_MINT_MAX_PENDING = int(_env("MINT_MAX_PENDING", "50"))
+_MINTS = Coalescer()  # wallet -> running mint (send + confirmation)
+
+MINT_SECONDS = metrics.histogram("slh_mint_seconds", "/mint end-to-end: send + confirmation", ("result",))
+metrics.gauge("slh_mints_pending", "Wallets with a mint in flight").set_function(lambda: len(_MINTS))
+metrics.gauge("slh_receipts_pending", "Transactions waiting for a receipt").set_function(lambda: _WATCHER.pending if _WATCHER else 0)
 
 async def mint_wallet_collector(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.user_data.get("awaiting_wallet_for_mint_nft"):
         return
+    box = _get_outbox(context.bot)
     addr = (update.message.text or "").strip()
     if not addr.startswith("0x") or len(addr) != 42:
-        await update.message.reply_text("❗ כתובת לא תקינה. נא שלח/י כתובת בפורמט 0x...")
+        box.reply(update, "❗ כתובת לא תקינה. נא שלח/י כתובת בפורמט 0x...")
+        return
+    wait = _USER_LIMIT.allow(update.effective_user.id)
+    if wait:
+        logger.warning("[MINT] user rate-limited | user=%s retry_in=%.0fs", update.effective_user.id, wait)
+        box.reply(update, f"⏳ יותר מדי בקשות. נסה/י שוב בעוד {wait:.0f} שניות.")
         return
     context.user_data["awaiting_wallet_for_mint_nft"] = False
+    key = addr.lower()
+
+    running = _MINTS.get(key)
+    if running is not None:
+        # אותו ארנק כבר בתהליך — ממתינים לתוצאה שלו במקום לשלוח עסקה נוספת
+        logger.info("[MINT] coalesced | to=%s", addr)
+        msg = box.reply(update, "⏳ כבר מתבצע mint לארנק הזה — ממתין לתוצאה…")
+        context.application.create_task(_follow_mint(update.effective_chat.id, msg, context.user_data, running))
+        return
+    wait = _WALLET_LIMIT.allow(key)
+    if wait:
+        logger.warning("[MINT] wallet rate-limited | to=%s retry_in=%.0fs", addr, wait)
+        box.reply(update, f"⏳ הארנק הזה קיבל mint לאחרונה. נסה/י שוב בעוד {wait:.0f} שניות.")
+        return
+    if len(_MINTS) >= _MINT_MAX_PENDING:
+        logger.warning("[MINT] busy | pending=%s", len(_MINTS))
+        box.reply(update, "⏳ המערכת עמוסה כרגע. נסה/י שוב בעוד דקה.")
+        return
+
     logger.info("[MINT] start | to=%s", addr)
-    await update.message.reply_text("⏳ מבצע mint ל-NFT על BSC Testnet…")
-    loop = asyncio.get_running_loop()
+    sent_msg = box.reply(update, "⏳ מבצע mint ל-NFT על BSC Testnet…")
+    # שליחה ואישור רצים ברקע; ה-handler משתחרר מיד
+    _MINTS.submit(key, lambda: _mint_flow(addr, update.effective_chat.id, sent_msg, context.user_data),
+                  spawn=context.application.create_task)
+
+async def _mint_flow(addr: str, chat_id: int, sent_msg, user_data: dict):
+    """Send (under the global cap) and confirm; returns (tx_hash or None, TxResult or error)."""
+    t0 = time.perf_counter()
     try:
-        tx_hash = await loop.run_in_executor(None, erc721_mint_from_treasury, addr)
-        context.user_data["last_mint_tx"] = tx_hash
-        logger.info("[MINT] sent | tx=%s", tx_hash)
-        # נסה לאסוף tokenId מהקבלה
-        try:
-            w3 = _get_w3()
-            tid = _fetch_token_id_from_receipt(w3, _need("NFT_CONTRACT"), tx_hash)
-            if tid is not None:
-                context.user_data["last_token_id"] = tid
-                await update.message.reply_text(f"✅ NFT הונפק!\nTokenID: <code>{tid}</code>\nTx: <code>{tx_hash}</code>", parse_mode=ParseMode.HTML)
-            else:
-                await update.message.reply_text(f"✅ NFT הונפק!\n(לא אותר tokenId מהקבלה)\nTx: <code>{tx_hash}</code>", parse_mode=ParseMode.HTML)
-        except Exception as ie:
-            logger.exception("[MINT] parse receipt failed: %s", ie)
-            await update.message.reply_text(f"✅ NFT הונפק!\n(שחזור tokenId נדחה: {ie})\nTx: <code>{tx_hash}</code>", parse_mode=ParseMode.HTML)
+        async with _MINT_SLOTS:
+            tx_hash = await erc721_mint_from_treasury(addr)
     except Exception as e:
         logger.exception("[MINT] failed: %s", e)
-        await update.message.reply_text(f"❗ שגיאה בביצוע:\n{e}")
-
-def erc721_mint_from_treasury(to_addr: str) -> str:
-    import time
-    w3 = _get_w3()
-    chain_id      = int(_env("CHAIN_ID", "97"))
-    contract_addr = _need("NFT_CONTRACT")
-    pk            = _need("TREASURY_PRIVATE_KEY")
-    acct = w3.eth.account.from_key(pk)
-    contract = w3.eth.contract(address=Web3.to_checksum_address(contract_addr), abi=_erc721_mint_abi())
+        _OUTBOX.edit(chat_id, sent_msg, f"❗ שגיאה בביצוע:\n{e}")
+        MINT_SECONDS.labels("send_failed").observe(time.perf_counter() - t0)
+        return None, e
+    user_data["last_mint_tx"] = tx_hash
+    logger.info("[MINT] sent | tx=%s", tx_hash)
+    _OUTBOX.edit(chat_id, sent_msg, f"📤 העסקה נשלחה, ממתין לאישור…\nTx: <code>{tx_hash}</code>", parse_mode=ParseMode.HTML)
+    try:
+        res = await _get_engine().wait(tx_hash)
+    except Exception as e:
+        logger.warning("[MINT] confirmation failed: %s | tx=%s", e, tx_hash)
+        res = e
+    MINT_SECONDS.labels("timeout" if isinstance(res, Exception) else ("ok" if res.status == 1 else "reverted")).observe(time.perf_counter() - t0)
+    await _report_mint(chat_id, sent_msg, user_data, tx_hash, res)
+    return tx_hash, res
+
+async def _follow_mint(chat_id: int, msg, user_data: dict, running: asyncio.Task):
+    try:
+        tx_hash, res = await asyncio.shield(running)
+    except Exception as e:
+        tx_hash, res = None, e
+    if tx_hash is None:
+        _OUTBOX.edit(chat_id, msg, f"❗ שגיאה בביצוע:\n{res}")
+        return
+    user_data["last_mint_tx"] = tx_hash
+    await _report_mint(chat_id, msg, user_data, tx_hash, res)
+
+async def _report_mint(chat_id: int, sent_msg, user_data: dict, tx_hash: str, res):
+    if isinstance(res, Exception):
+        _OUTBOX.edit(chat_id, sent_msg, f"⌛ לא התקבל אישור לעסקה ({res})\nTx: <code>{tx_hash}</code>", parse_mode=ParseMode.HTML)
+        return
+    if res.tx_hash.lower() != tx_hash.lower():  # mined as a fee-bumped replacement
+        tx_hash = user_data["last_mint_tx"] = res.tx_hash
+    if res.status != 1:
+        _OUTBOX.edit(chat_id, sent_msg, f"❗ העסקה נכשלה על השרשרת\nTx: <code>{tx_hash}</code>", parse_mode=ParseMode.HTML)
+        return
+    if res.token_id is not None:
+        user_data["last_token_id"] = res.token_id
+        _OUTBOX.edit(chat_id, sent_msg, f"✅ NFT הונפק!\nTokenID: <code>{res.token_id}</code>\nTx: <code>{tx_hash}</code>", parse_mode=ParseMode.HTML)
+    else:
+        _OUTBOX.edit(chat_id, sent_msg, f"✅ NFT הונפק!\n(לא אותר tokenId מהקבלה)\nTx: <code>{tx_hash}</code>", parse_mode=ParseMode.HTML)
+
+async def erc721_mint_from_treasury(to_addr: str) -> str:
+    """Sign + broadcast safeMint on the event loop; returns the tx hash without waiting for the receipt."""
+    engine = _get_engine()
+    contract = get_contract(engine.w3, _need("NFT_CONTRACT"), _erc721_mint_abi())
     fn = contract.get_function_by_name("safeMint")(Web3.to_checksum_address(to_addr))
+    return await engine.send(fn, 220000)  # limit estimated per call shape; 220000 only if the estimate is unreachable
 
-    max_fee   = w3.to_wei(_env("MAX_FEE_GWEI","2"), "gwei")
-    max_prio  = w3.to_wei(_env("MAX_PRIO_FEE_GWEI","1"), "gwei")
-
-    attempts = int(_env("MINT_RETRIES","5"))
-    back0    = float(_env("MINT_BACKOFF_SECONDS","1"))
-    last_exc = None
-
-    for i in range(attempts):
-        t0 = time.time()
-        try:
-            nonce = w3.eth.get_transaction_count(acct.address)
-            tx = fn.build_transaction({
-                "from": acct.address,
-                "nonce": nonce,
-                "chainId": chain_id,
-                "gas": 220000,
-                "maxFeePerGas": max_fee,
-                "maxPriorityFeePerGas": max_prio,
-            })
-            signed  = acct.sign_transaction(tx)
-            tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
-            logger.debug("[MINT] sent nonce=%s maxFee=%s maxPrio=%s tx=%s", nonce, max_fee, max_prio, tx_hash.hex())
-
-            rc = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=int(_env("RECEIPT_TIMEOUT","180")))
-            dt = time.time() - t0
-            gas_used = getattr(rc, "gasUsed", None)
-            blk = getattr(rc, "blockNumber", None)
-            cg  = getattr(rc, "cumulativeGasUsed", None)
-            logger.info("[MINT] receipt status=%s block=%s gas=%s cumGas=%s dt=%.2fs tx=%s", rc.status, blk, gas_used, cg, dt, tx_hash.hex())
-            if rc.status != 1:
-                raise RuntimeError(f"tx failed: {tx_hash.hex()}")
-
-            # נסיון להפיק tokenId בלוגים, נשאיר גם לוג לטובת דיבוג
-            try:
-                tid = _fetch_token_id_from_receipt(w3, contract_addr, tx_hash.hex())
-                logger.debug("[MINT] parsed tokenId=%s", tid)
-            except Exception as ie:
-                logger.debug("[MINT] parse tokenId failed: %s", ie)
-
-            return tx_hash.hex()
-        except Exception as e:
-            last_exc = e
-            wait = back0 * (2 ** i)
-            logger.warning("[MINT] attempt %s/%s failed: %s | backoff %.1fs", i+1, attempts, e, wait)
-            time.sleep(wait)
-
-    raise RuntimeError(f"mint failed after {attempts} attempts: {last_exc}")
 async def debug_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keys = ["DEBUG","LOG_LEVEL","BSC_RPC_URL","CHAIN_ID","NFT_CONTRACT","RECEIPT_TIMEOUT","MINT_RETRIES","MINT_BACKOFF_SECONDS","MAX_FEE_GWEI","MAX_PRIO_FEE_GWEI"]
+    keys = ["DEBUG","LOG_LEVEL","BSC_RPC_URL","BSC_RPC_URLS","CHAIN_ID","NFT_CONTRACT","RECEIPT_TIMEOUT","MINT_RETRIES","MINT_BACKOFF_SECONDS","MINT_USER_PER_MIN","MINT_WALLET_PER_MIN","MINT_CONCURRENCY","MAX_FEE_GWEI","MAX_PRIO_FEE_GWEI","GAS_ORACLE","GAS_SPEED","GAS_MAX_FEE_GWEI","GAS_BUMP_AFTER"]
     vals = []
     for k in keys:
         v = os.environ.get(k, "")
-        if k == "BSC_RPC_URL" and v:
+        if k in ("BSC_RPC_URL","BSC_RPC_URLS") and v:
             v = v[:20] + "..."   # קיצור תצוגה
         if k == "TREASURY_PRIVATE_KEY":  # ליתר בטחון לא נציג
             v = "***"
         vals.append(f"{k}={v}")
-    await (update.message or update.effective_message).reply_text("DEBUG="+("ON" if _is_debug() else "OFF")+"\n"+"\n".join(vals))
\ No newline at end of file
+    _get_outbox(context.bot).reply(update, "DEBUG="+("ON" if _is_debug() else "OFF")+"\n"+"\n".join(vals))
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os, asyncio, logging, json
+from slh import startup  # first: the boot profile counts from process start
 from typing import Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -7,7 +8,20 @@ from telegram.ext import (
     ApplicationBuilder, ContextTypes, CommandHandler,
     MessageHandler, CallbackQueryHandler, filters
 )
-from web3 import Web3
+
+from slh.metrics import serve_from_env, timed_handler
+from slh.persistence import persistence_from_env
+from slh.updates import processor_from_env
+
+# web3 and the chain helpers (~1s of imports) load in the warm-up, after the bot is up
+web3 = startup.lazy("web3")
+rpc = startup.lazy("slh.rpc")
+indexer = startup.lazy("slh.indexer")
+viewcache = startup.lazy("slh.viewcache")
+abi = startup.lazy("slh.abi")
+receipts = startup.lazy("slh.receipts")
+txengine = startup.lazy("slh.txengine")
+startup.mark("imports")
 
 logger = logging.getLogger("slh.bot")
 logging.basicConfig(level=getattr(logging, os.environ.get("LOG_LEVEL","INFO"), logging.INFO))
@@ -39,26 +53,51 @@ def _erc721_tokenuri_abi():
         "type": "function"
     }]
 
-def _fetch_token_id_from_receipt(w3: Web3, contract_address: str, tx_hash_hex: str) -> Optional[int]:
-    sig = Web3.keccak(text="Transfer(address,address,uint256)").hex()
-    receipt = w3.eth.get_transaction_receipt(tx_hash_hex)
-    for lg in receipt.logs:
-        if lg["address"].lower() == Web3.to_checksum_address(contract_address).lower():
-            topic0 = lg["topics"][0].hex() if hasattr(lg["topics"][0], "hex") else str(lg["topics"][0])
-            if topic0.lower() == sig.lower() and len(lg["topics"]) >= 4:
-                return int(lg["topics"][3].hex(), 16)
-    return None
+def _fetch_token_id_from_receipt(w3: "web3.Web3", contract_address: str, tx_hash_hex: str) -> Optional[int]:
+    return abi.token_ids([w3.eth.get_transaction_receipt(tx_hash_hex)], contract_address)[0]
+
+def _get_w3():
+    return rpc.get_w3(rpc.rpc_spec_from_env())
 
 def _get_w3_and_contract_for_tokenuri():
-    rpc = _get_required("BSC_RPC_URL")
-    contract_addr = _get_required("NFT_CONTRACT")
-    w3 = Web3(Web3.HTTPProvider(rpc))
-    if not w3.is_connected():
-        raise RuntimeError("RPC לא זמין")
-    abi = _erc721_tokenuri_abi()
-    c = w3.eth.contract(address=Web3.to_checksum_address(contract_addr), abi=abi)
+    w3 = _get_w3()
+    c = rpc.get_contract(w3, _get_required("NFT_CONTRACT"), _erc721_tokenuri_abi())
     return w3, c
 
+# same mint stack as bot/run_admin_bot.py: one RPC pool, batched receipts, tracked nonces, fee oracle + bumps
+_RPC: "Optional[rpc.AsyncRPC]" = None
+_WATCHER: "Optional[receipts.ReceiptWatcher]" = None
+_ENGINE: "Optional[txengine.AsyncTxEngine]" = None
+
+def _get_rpc() -> "rpc.AsyncRPC":
+    global _RPC
+    if _RPC is None:
+        _RPC = rpc.AsyncRPC(rpc.rpc_spec_from_env())
+    return _RPC
+
+def _get_watcher() -> "receipts.ReceiptWatcher":
+    global _WATCHER
+    if _WATCHER is None:
+        _WATCHER = receipts.ReceiptWatcher(
+            rpc.rpc_spec_from_env(), _get_required("NFT_CONTRACT"),
+            poll_interval=float(_env("RECEIPT_POLL_SECONDS", "1")),
+            timeout=float(_env("RECEIPT_TIMEOUT", "180")),
+            rpc=_get_rpc(),
+        )
+    return _WATCHER
+
+def _get_engine() -> "txengine.AsyncTxEngine":
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = txengine.AsyncTxEngine(
+            rpc.rpc_spec_from_env(), int(_env("CHAIN_ID", "97")),
+            _get_w3().eth.account.from_key(_get_required("TREASURY_PRIVATE_KEY")),
+            retries=int(_env("MINT_RETRIES", "5")), backoff=float(_env("MINT_BACKOFF_SECONDS", "1")),
+            watcher=_get_watcher(), rpc=_get_rpc(),
+            bump_after=float(_env("GAS_BUMP_AFTER", "30")), max_bumps=int(_env("GAS_MAX_BUMPS", "3")),
+        )
+    return _ENGINE
+
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         kb = [
@@ -113,90 +152,49 @@ async def mint_nft_wallet_collector(update: Update, context: ContextTypes.DEFAUL
         await update.message.reply_text("❗ כתובת לא תקינה. נא שלח/י כתובת בפורמט 0x...")
         return
     context.user_data["awaiting_wallet_for_mint_nft"] = False
+    await WARMUP.wait()  # right after a restart: join the warm-up instead of racing it
 
     logger.info("[MINT] start | to=%s", addr)
     await update.message.reply_text("⏳ מבצע mint ל-NFT על BSC Testnet…")
 
-    loop = asyncio.get_running_loop()
     try:
-        tx_hash = await loop.run_in_executor(None, erc721_mint_from_treasury, addr)
-        context.user_data["last_mint_tx"] = tx_hash
-        logger.info("[MINT] sent | tx=%s", tx_hash)
-
-        try:
-            rpc = _get_required("BSC_RPC_URL")
-            contract_addr = _get_required("NFT_CONTRACT")
-            w3 = Web3(Web3.HTTPProvider(rpc))
-            if w3.is_connected():
-                tid = _fetch_token_id_from_receipt(w3, contract_addr, tx_hash)
-                logger.info("[MINT] receipt parsed | tokenId=%s", tid)
-                if tid is not None:
-                    context.user_data["last_token_id"] = tid
-                    await update.message.reply_text(
-                        f"✅ NFT הונפק!\nTokenID: <code>{tid}</code>\nTx: <code>{tx_hash}</code>",
-                        parse_mode=ParseMode.HTML
-                    )
-                else:
-                    await update.message.reply_text(
-                        f"✅ NFT הונפק!\n(לא אותר tokenId מהקבלה)\nTx: <code>{tx_hash}</code>",
-                        parse_mode=ParseMode.HTML
-                    )
-            else:
-                logger.warning("[MINT] RPC not connected for receipt parse")
-                await update.message.reply_text(
-                    f"✅ NFT הונפק!\n(אין חיבור RPC לזיהוי tokenId כעת)\nTx: <code>{tx_hash}</code>",
-                    parse_mode=ParseMode.HTML
-                )
-        except Exception as ie:
-            logger.exception("[MINT] parse receipt failed: %s", ie)
-            await update.message.reply_text(
-                f"✅ NFT הונפק!\n(שחזור tokenId נדחה: {ie})\nTx: <code>{tx_hash}</code>",
-                parse_mode=ParseMode.HTML
-            )
+        tx_hash = await erc721_mint_from_treasury(addr)
     except Exception as e:
         logger.exception("[MINT] failed: %s", e)
         await update.message.reply_text(f"❗ שגיאה בביצוע:\n{e}")
+        return
+    context.user_data["last_mint_tx"] = tx_hash
+    logger.info("[MINT] sent | tx=%s", tx_hash)
+    try:
+        res = await _get_engine().wait(tx_hash)  # batched receipt poll; a fee-bumped replacement counts too
+    except Exception as e:
+        logger.warning("[MINT] confirmation failed: %s | tx=%s", e, tx_hash)
+        await update.message.reply_text(f"⌛ לא התקבל אישור לעסקה ({e})\nTx: <code>{tx_hash}</code>", parse_mode=ParseMode.HTML)
+        return
+    tx_hash = context.user_data["last_mint_tx"] = res.tx_hash
+    logger.info("[MINT] mined | status=%s tokenId=%s tx=%s", res.status, res.token_id, tx_hash)
+    if res.status != 1:
+        await update.message.reply_text(f"❗ העסקה נכשלה על השרשרת\nTx: <code>{tx_hash}</code>", parse_mode=ParseMode.HTML)
+    elif res.token_id is not None:
+        context.user_data["last_token_id"] = res.token_id
+        await update.message.reply_text(
+            f"✅ NFT הונפק!\nTokenID: <code>{res.token_id}</code>\nTx: <code>{tx_hash}</code>",
+            parse_mode=ParseMode.HTML
+        )
+    else:
+        await update.message.reply_text(
+            f"✅ NFT הונפק!\n(לא אותר tokenId מהקבלה)\nTx: <code>{tx_hash}</code>",
+            parse_mode=ParseMode.HTML
+        )
 
-def erc721_mint_from_treasury(to_addr: str) -> str:
-    rpc = _get_required("BSC_RPC_URL")
-    chain_id = int(_env("CHAIN_ID", "97"))
+async def erc721_mint_from_treasury(to_addr: str) -> str:
+    """Sign + broadcast safeMint on the event loop; returns the tx hash without waiting for the receipt."""
+    engine = _get_engine()
     contract_addr = _get_required("NFT_CONTRACT")
-    pk = _get_required("TREASURY_PRIVATE_KEY")
-
-    logger.info("[TX] prepare | rpc=%s | chain_id=%s | contract=%s", rpc, chain_id, contract_addr)
-    w3 = Web3(Web3.HTTPProvider(rpc))
-    if not w3.is_connected():
-        raise RuntimeError("RPC לא זמין")
-
-    acct = w3.eth.account.from_key(pk)
-    logger.debug("[TX] from address=%s", acct.address)
-
-    abi = _erc721_mint_abi()
-    contract = w3.eth.contract(address=Web3.to_checksum_address(contract_addr), abi=abi)
-    fn = contract.get_function_by_name("safeMint")(Web3.to_checksum_address(to_addr))
-
-    nonce = w3.eth.get_transaction_count(acct.address)
-    logger.debug("[TX] nonce=%s", nonce)
-
-    tx = fn.build_transaction({
-        "from": acct.address,
-        "nonce": nonce,
-        "chainId": chain_id,
-        "gas": 220000,
-        "maxFeePerGas": w3.to_wei("2", "gwei"),
-        "maxPriorityFeePerGas": w3.to_wei("1", "gwei"),
-    })
-    logger.debug("[TX] built")
-
-    signed = acct.sign_transaction(tx)
-    tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
-    logger.info("[TX] sent | hash=%s", tx_hash.hex())
-
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=180)
-    logger.info("[TX] mined | status=%s", getattr(receipt,'status',None))
-    if receipt.status != 1:
-        raise RuntimeError(f"tx failed: {tx_hash.hex()}")
-    return tx_hash.hex()
+    logger.info("[TX] prepare | rpc=%s | chain_id=%s | contract=%s", engine.rpc_url, engine.chain_id, contract_addr)
+    fn = rpc.get_contract(engine.w3, contract_addr, _erc721_mint_abi()).get_function_by_name("safeMint")(
+        web3.Web3.to_checksum_address(to_addr))
+    return await engine.send(fn, 220000)  # limit estimated per call shape; 220000 only if the estimate is unreachable
 
 async def cmd_tokenId(update: Update, context: ContextTypes.DEFAULT_TYPE):
     tid = context.user_data.get("last_token_id")
@@ -207,14 +205,15 @@ async def cmd_tokenId(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not txh:
         await update.message.reply_text("אין tokenId שמור עדיין. בצע/י mint קודם.")
         return
+    # אינדקס מקומי קודם; קבלה מה-RPC רק אם העסקה עוד לא נסרקה
+    ix = indexer.indexer_from_env(_get_w3())
+    hit = ix.index.token_by_tx(ix.contract, txh) if ix else None
+    if hit is not None:
+        context.user_data["last_token_id"] = hit["token_id"]
+        await update.message.reply_text(f"🔖 tokenId האחרון שלך: <code>{hit['token_id']}</code>", parse_mode=ParseMode.HTML)
+        return
     try:
-        rpc = _get_required("BSC_RPC_URL")
-        contract_addr = _get_required("NFT_CONTRACT")
-        w3 = Web3(Web3.HTTPProvider(rpc))
-        if not w3.is_connected():
-            await update.message.reply_text("RPC לא זמין כרגע לשחזור tokenId.")
-            return
-        tid = _fetch_token_id_from_receipt(w3, contract_addr, txh)
+        tid = _fetch_token_id_from_receipt(_get_w3(), _get_required("NFT_CONTRACT"), txh)
         if tid is None:
             await update.message.reply_text("לא אותר tokenId מהקבלה. ייתכן והחוזה לא סטנדרטי או שהאירוע שונה.")
             return
@@ -232,21 +231,60 @@ async def cmd_tokenURI(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         w3, c = _get_w3_and_contract_for_tokenuri()
         fn = c.get_function_by_name("tokenURI")(tid)
-        uri = fn.call()
+        uri = viewcache.cached_call(fn)
         await update.message.reply_text(f"🔗 tokenURI:\n<code>{uri}</code>", parse_mode=ParseMode.HTML)
     except Exception as e:
         logger.exception("[tokenURI] failed: %s", e)
         await update.message.reply_text(f"שגיאה בקריאת tokenURI: {e}")
 
+def _warm_chain() -> dict:
+    """Imports, RPC pool, contract objects and the first chain reads, so the first /mint pays none of it."""
+    startup.preload(web3, rpc, indexer, viewcache, receipts, txengine)
+    w3 = _get_w3()
+    indexer.indexer_from_env(w3)  # background Transfer indexer (only if NFT_INDEX_DB is set)
+    chain_id = w3.eth.chain_id
+    if chain_id != int(_env("CHAIN_ID", "97")):
+        raise RuntimeError(f"RPC chain id {chain_id} != CHAIN_ID {_env('CHAIN_ID', '97')}")
+    out = {"chain_id": chain_id, "gas_price": w3.eth.gas_price}
+    contract = _env("NFT_CONTRACT")
+    if contract:
+        rpc.get_contract(w3, contract, _erc721_mint_abi())
+        rpc.get_contract(w3, contract, _erc721_tokenuri_abi())
+    return out
+
+async def _warm_engine():
+    if not _env("TREASURY_PRIVATE_KEY"):
+        return "skipped (no TREASURY_PRIVATE_KEY)"
+    return await _get_engine().warm()  # RPC pool open, chain id checked, nonce and fee history fetched
+
+WARMUP = startup.warmup_from_env()
+WARMUP.step("chain", lambda: asyncio.to_thread(_warm_chain))
+WARMUP.step("engine", _warm_engine)
+
+async def _post_init(app):
+    WARMUP.start()  # in the background: /start and the menus answer right away
+
+async def _post_shutdown(app):
+    global _ENGINE, _WATCHER, _RPC
+    if _ENGINE is not None:
+        await _ENGINE.close()
+    if _RPC is not None:
+        await _RPC.close()
+    _ENGINE = _WATCHER = _RPC = None
+
 def build_app():
     TOKEN = _get_required("TELEGRAM_BOT_TOKEN")
-    app = ApplicationBuilder().token(TOKEN).build()
-    app.add_handler(CommandHandler("start", start_cmd))
-    app.add_handler(CommandHandler("mint", mint_nft_start))
-    app.add_handler(CommandHandler("tokenId", cmd_tokenId))
-    app.add_handler(CommandHandler("tokenURI", cmd_tokenURI))
-    app.add_handler(CallbackQueryHandler(on_cb))
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, mint_nft_wallet_collector))
+    # updates of different chats run concurrently, each chat in order; redeliveries dropped
+    proc = processor_from_env()
+    # user_data (awaiting wallet, last mint tx / tokenId) survives restarts in BOT_STATE_DB
+    app = (ApplicationBuilder().token(TOKEN).update_queue(proc.update_queue).concurrent_updates(proc)
+           .persistence(persistence_from_env()).post_init(_post_init).post_shutdown(_post_shutdown).build())
+    app.add_handler(CommandHandler("start", timed_handler("start", start_cmd)))
+    app.add_handler(CommandHandler("mint", timed_handler("mint", mint_nft_start)))
+    app.add_handler(CommandHandler("tokenId", timed_handler("tokenId", cmd_tokenId)))
+    app.add_handler(CommandHandler("tokenURI", timed_handler("tokenURI", cmd_tokenURI)))
+    app.add_handler(CallbackQueryHandler(timed_handler("callback", on_cb)))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, timed_handler("wallet", mint_nft_wallet_collector)))
     return app
 
 async def _run_webhook(app):
@@ -255,15 +293,18 @@ async def _run_webhook(app):
     secret = _get_required("BOT_WEBHOOK_SECRET")
     port   = int(_env("PORT", "8080"))
     await app.initialize(); await app.start()
+    await _post_init(app)  # run_polling calls it itself; this path drives the app by hand
     await app.updater.start_webhook(
         listen="0.0.0.0", port=port, url_path=path.lstrip("/"),
         secret_token=secret, webhook_url=f"{public}{path}",
     )
     logger.info("[WEBHOOK] listening on %s%s", public, path)
     await app.updater.idle(); await app.stop(); await app.shutdown()
+    await _post_shutdown(app)
 
 def main():
     mode = _env("BOT_MODE","webhook").lower()
+    serve_from_env()             # GET /metrics on METRICS_PORT
     app = build_app()
     if mode == "polling":
         app.run_polling(close_loop=False)
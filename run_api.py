@@ -1,16 +1,67 @@
-import os
-from fastapi import FastAPI
+import asyncio, os, json, time
+from slh import startup  # first: the boot profile counts from process start
+from typing import Dict, List, Optional
+import anyio
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from web3 import Web3, HTTPProvider
+from slh.idempotency import KeyReused, request_hash, store_from_env
+from slh import metrics
 
-RPC_URL = os.getenv("BSC_RPC_URL","https://bsc-testnet-rpc.publicnode.com")
+# the chain stack (web3, eth_abi, eth_account: most of the import time) loads in the warm-up,
+# after the port is open
+rpc = startup.lazy("slh.rpc")
+treasury = startup.lazy("slh.treasury")
+txengine = startup.lazy("slh.txengine")
+bulk = startup.lazy("slh.bulk")
+indexer = startup.lazy("slh.indexer")
+signer = startup.lazy("slh.signer")
+startup.mark("imports")
+
+# same lookup as slh.rpc.rpc_spec_from_env; BSC_RPC_URLS=a,b,c for failover
+RPC_URL = os.getenv("BSC_RPC_URLS") or os.getenv("BSC_RPC_URL") or "https://bsc-testnet-rpc.publicnode.com"
 CHAIN_ID = int(os.getenv("CHAIN_ID","97"))
 CONTRACT = os.getenv("NFT_CONTRACT","0x8AD1de67648dB44B1b1D0E3475485910CedDe90b")
+SELA_TOKEN = os.getenv("SELA_TOKEN","")
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS","500"))
+BATCH_SEND_CONCURRENCY = int(os.getenv("BATCH_SEND_CONCURRENCY","8"))
+BULK_MAX_TOKENS = int(os.getenv("BULK_MAX_TOKENS","10000"))
 
-w3 = Web3(HTTPProvider(RPC_URL))
+w3 = None  # set by the warm-up: offline encoding, local index and batch signing; health probed in the background
+RPC: "Optional[rpc.AsyncRPC]" = None  # every RPC made on the event loop shares this connection pool
+_ENGINE: "Optional[txengine.AsyncTxEngine]" = None
+_SIGNER: "Optional[signer.PoolSigner]" = None
+WARMUP = startup.warmup_from_env()
+IDEM = store_from_env()  # Idempotency-Key -> stored response (IDEMPOTENCY_DB)
+_IDEM_RUNNING: Dict[str, asyncio.Future] = {}
 
 app = FastAPI(title="SLH API")
 
+HTTP_SECONDS = metrics.histogram("slh_http_request_seconds", "API latency until response headers", ("route", "method", "status"))
+metrics.gauge("slh_receipts_pending", "Transactions waiting for a receipt").set_function(lambda: _ENGINE.watcher.pending if _ENGINE else 0)
+IDEM_REQUESTS = metrics.counter("slh_idempotent_requests_total", "Write requests carrying an Idempotency-Key", ("result",))
+metrics.gauge("slh_nonces_inflight", "Treasury nonces reserved and not yet accepted").set_function(lambda: _ENGINE.nonces.in_flight if _ENGINE else 0)
+
+@app.middleware("http")
+async def _timed(request: Request, call_next):
+    t0, status = time.perf_counter(), 500
+    try:
+        resp = await call_next(request)
+        status = resp.status_code
+        return resp
+    finally:
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_SECONDS.labels(route, request.method, status).observe(time.perf_counter() - t0)
+        if route not in ("/healthz", "/metrics"):
+            startup.first_request()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    lim = anyio.to_thread.current_default_thread_limiter()  # sync routes run on this pool
+    metrics.EXECUTOR_INFLIGHT.labels("api_threadpool").set(lim.borrowed_tokens)
+    metrics.EXECUTOR_WORKERS.labels("api_threadpool").set(lim.total_tokens)
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 class MintReq(BaseModel):
     to_wallet: str
     token_uri: str
@@ -19,18 +70,276 @@ class GrantReq(BaseModel):
     to_wallet: str
     amount: str
 
-@app.get("/healthz")
-def healthz():
-    return {"ok": True, "network": "BSC Testnet", "contract": CONTRACT, "connected": w3.is_connected()}
+def _load_chain():
+    global w3, RPC
+    startup.preload(rpc, treasury, txengine, bulk, indexer)
+    w3 = rpc.get_w3(RPC_URL)
+    RPC = rpc.AsyncRPC(RPC_URL)
+    indexer.indexer_from_env(w3)  # NFT_INDEX_DB enables the local Transfer index
 
-@app.post("/v1/chain/mint-demo")
-def mint_demo(req: MintReq):
+async def _warm_chain():
+    await asyncio.to_thread(_load_chain)
+
+async def _warm_engine():
     if not os.getenv("TREASURY_PRIVATE_KEY"):
-        return {"ok": True, "tx": "0xFAKE_MINT_TX_FOR_TESTS"}
-    return {"ok": True, "tx": "0xNOT_IMPLEMENTED_IN_STARTER"}
+        return "skipped (no TREASURY_PRIVATE_KEY)"
+    return await _engine().warm()  # RPC pool open, chain id checked, nonce and fee history fetched
+
+async def _warm_signer():
+    s = _signer()
+    if s is None:
+        return "inline (SIGN_WORKERS=0 or no TREASURY_PRIVATE_KEY)"
+    await asyncio.to_thread(s.start)  # batch routes do not pay for the worker spawn
+    return {"workers": s.workers}
+
+WARMUP.step("chain", _warm_chain, required=True)
+WARMUP.step("engine", _warm_engine)
+WARMUP.step("signer", _warm_signer)
+
+@app.on_event("startup")
+async def _boot():
+    startup.mark("serving")
+    WARMUP.start()  # in the background; /healthz answers 503 until it is done
+
+async def _warm():
+    """Chain routes wait for the warm-up (started on boot, or by the first request when run without lifespan)."""
+    if not await WARMUP.wait():
+        raise HTTPException(status_code=503, detail={"warmup": WARMUP.steps})
 
-@app.post("/v1/chain/grant-sela")
-def grant_sela(req: GrantReq):
+_CHAIN = [Depends(_warm)]
+
+@app.on_event("shutdown")
+async def _close_engine():
+    global _ENGINE
+    if _ENGINE is not None:
+        await _ENGINE.close()
+        _ENGINE = None
+
+@app.on_event("shutdown")
+async def _close_signer():
+    global _SIGNER
+    if _SIGNER is not None:
+        await asyncio.to_thread(_SIGNER.close)
+        _SIGNER = None
+
+@app.on_event("shutdown")
+async def _close_rpc():
+    if RPC is not None:
+        await RPC.close()
+
+def _engine() -> "txengine.AsyncTxEngine":
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = txengine.AsyncTxEngine(RPC_URL, CHAIN_ID, treasury.treasury_account(w3), contract=CONTRACT,
+                                retries=int(os.getenv("MINT_RETRIES","5")), backoff=float(os.getenv("MINT_BACKOFF_SECONDS","1")),
+                                receipt_timeout=float(os.getenv("RECEIPT_TIMEOUT","180")),
+                                bump_after=float(os.getenv("GAS_BUMP_AFTER","30")), max_bumps=int(os.getenv("GAS_MAX_BUMPS","3")),
+                                rpc=RPC)
+    return _ENGINE
+
+def _treasury():
+    """Write routes refuse to run (rather than pretend) without the treasury key."""
     if not os.getenv("TREASURY_PRIVATE_KEY"):
-        return {"ok": True, "tx": "0xFAKE_SELA_TX_FOR_TESTS"}
-    return {"ok": True, "tx": "0xNOT_IMPLEMENTED_IN_STARTER"}
+        raise HTTPException(status_code=503, detail="treasury not configured")
+
+_WRITE = [Depends(_treasury)] + _CHAIN
+
+def _signer() -> "Optional[signer.PoolSigner]":
+    global _SIGNER
+    if _SIGNER is None:
+        _SIGNER = signer.signer_from_env()
+    return _SIGNER
+
+async def _send(fn, gas: int, on_signed=None) -> str:
+    try:
+        return await _engine().send(fn, gas, on_signed=on_signed)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"send failed: {e}")
+
+async def _landed(txs) -> Optional[str]:
+    """The first of a taken-over claim's signed txs that the node knows (pending or mined), if any."""
+    try:
+        for _nonce, tx in txs:
+            if await _engine().call("eth_getTransactionByHash", [tx]) is not None:
+                return tx
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"could not check an earlier attempt: {e}")
+    return None
+
+async def _result(tx: str, wait: bool, key: Optional[str] = None) -> dict:
+    if not wait:
+        return {"ok": True, "tx": tx}
+    try:
+        res = await _engine().wait(tx)
+    except asyncio.TimeoutError as e:
+        return {"ok": False, "tx": tx, "error": str(e)}
+    out = {"ok": res.status == 1, "tx": res.tx_hash, "block": res.block, "gas_used": res.gas_used, "token_id": res.token_id}
+    if key and IDEM is not None:
+        IDEM.complete(key, out)
+    return out
+
+async def _transact(key: Optional[str], route: str, req: BaseModel, wait: bool, response: Response, build) -> dict:
+    """One transaction per Idempotency-Key: repeats get the stored response (the receipt too once known)."""
+    if not key or IDEM is None:
+        fn, gas = await build()
+        return await _result(await _send(fn, gas), wait)
+    h = request_hash(route, req.model_dump())
+    while (running := _IDEM_RUNNING.get(key)) is not None:
+        await asyncio.shield(running)  # same key in flight here: wait for its send, then replay (or take over)
+    try:
+        rec = IDEM.begin(key, h)
+    except KeyReused:
+        IDEM_REQUESTS.labels("reused").inc()
+        raise HTTPException(status_code=422, detail="Idempotency-Key already used for a different request")
+    if rec is not None and rec["state"] != "stale":
+        if rec["state"] != "done":
+            # another process holds the lease; once it runs out (that process died) a retry takes over
+            IDEM_REQUESTS.labels("in_progress").inc()
+            raise HTTPException(status_code=409, detail="a request with this Idempotency-Key is still in progress",
+                                headers={"Retry-After": str(rec["retry_after"])})
+        IDEM_REQUESTS.labels("replayed").inc()
+        response.headers["Idempotent-Replayed"] = "true"
+        out = rec["response"]
+        if wait and "block" not in out and out.get("tx"):
+            out = await _result(out["tx"], True, key)
+        return out
+    IDEM_REQUESTS.labels("new" if rec is None else "taken_over").inc()
+    running = _IDEM_RUNNING[key] = asyncio.get_running_loop().create_future()
+    try:
+        # a taken-over claim: the dead owner may have broadcast before it could store the answer
+        tx = await _landed(rec["txs"]) if rec is not None else None
+        if tx is None:
+            fn, gas = await build()
+            tx = await _send(fn, gas, on_signed=lambda nonce, h: IDEM.attempt(key, nonce, h))
+        IDEM.complete(key, {"ok": True, "tx": tx})  # from here on a retry can no longer send twice
+    except BaseException:
+        IDEM.release(key)  # nothing was accepted; what was signed is checked by whoever retries
+        raise
+    finally:
+        _IDEM_RUNNING.pop(key, None)
+        running.set_result(None)
+    return await _result(tx, wait, key)
+
+def _index():
+    ix = indexer.indexer_from_env(w3)
+    if ix is None:
+        raise HTTPException(status_code=503, detail="NFT index disabled (set NFT_INDEX_DB)")
+    return ix
+
+@app.get("/healthz")
+async def healthz(response: Response):
+    # on the loop, not the threadpool, and no RPC: answers even while the RPC or the workers are saturated.
+    # 503 until the warm-up is done, so a restarted instance only takes traffic once it is warm
+    WARMUP.start()
+    if not WARMUP.ok:
+        response.status_code = 503
+        return {"ok": False, "network": "BSC Testnet", "contract": CONTRACT, "warmup": WARMUP.report()}
+    h = rpc.rpc_health(RPC_URL)
+    return {"ok": True, "network": "BSC Testnet", "contract": CONTRACT, "connected": h.get("ok"), "block": h.get("block"),
+            "warmup": WARMUP.report()}
+
+@app.post("/v1/chain/mint-demo", dependencies=_WRITE)
+async def mint_demo(req: MintReq, response: Response, wait: bool = False,
+                    idempotency_key: Optional[str] = Header(None)):
+    if not treasury.WALLET_RE.fullmatch(req.to_wallet.strip()):
+        raise HTTPException(status_code=400, detail="invalid wallet")
+
+    async def build():
+        return treasury.mint_call(w3, CONTRACT, req.to_wallet.strip(), req.token_uri), int(os.getenv("MINT_GAS","220000"))
+    return await _transact(idempotency_key, "/v1/chain/mint-demo", req, wait, response, build)
+
+@app.post("/v1/chain/grant-sela", dependencies=_WRITE)
+async def grant_sela(req: GrantReq, response: Response, wait: bool = False,
+                     idempotency_key: Optional[str] = Header(None)):
+    if not SELA_TOKEN:
+        raise HTTPException(status_code=503, detail="SELA_TOKEN not configured")
+    if not treasury.WALLET_RE.fullmatch(req.to_wallet.strip()):
+        raise HTTPException(status_code=400, detail="invalid wallet")
+
+    async def build():
+        decimals = await treasury.erc20_decimals_async(w3, SELA_TOKEN, RPC.call, CHAIN_ID)  # one RPC, then pinned in the view cache
+        return treasury.grant_call(w3, SELA_TOKEN, req.to_wallet.strip(), req.amount, decimals), int(os.getenv("GRANT_GAS","100000"))
+    return await _transact(idempotency_key, "/v1/chain/grant-sela", req, wait, response, build)
+
+# ---------- local NFT index (no RPC) ----------
+@app.get("/v1/nft/token/{token_id}", dependencies=_CHAIN)
+def nft_token(token_id: int):
+    ix = _index()
+    tok = ix.index.token(ix.contract, token_id)
+    if tok is None:
+        raise HTTPException(status_code=404, detail="token not indexed")
+    return tok
+
+@app.get("/v1/nft/tx/{tx_hash}", dependencies=_CHAIN)
+def nft_by_tx(tx_hash: str):
+    ix = _index()
+    tok = ix.index.token_by_tx(ix.contract, tx_hash)
+    if tok is None:
+        raise HTTPException(status_code=404, detail="tx not indexed")
+    return tok
+
+@app.get("/v1/nft/wallet/{wallet}", dependencies=_CHAIN)
+def nft_wallet(wallet: str):
+    ix = _index()
+    return {"wallet": wallet, "owned": ix.index.tokens_of(ix.contract, wallet),
+            "received": ix.index.received_by(ix.contract, wallet), "indexed_block": ix.index.stats(ix.contract)["block"]}
+
+# ---------- bulk ownerOf/tokenURI (Multicall3 / JSON-RPC batch) ----------
+@app.get("/v1/nft/inspect", dependencies=_CHAIN)
+async def nft_inspect(range: str, chunk: int = 200, concurrency: int = 4, mode: str = "auto"):
+    try:
+        ids = bulk.parse_range(range)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="range must look like 1-5000 or 1,5,10-20")
+    if len(ids) > BULK_MAX_TOKENS:
+        raise HTTPException(status_code=413, detail=f"range too large (max {BULK_MAX_TOKENS})")
+    if mode not in ("auto", "multicall", "batch"):
+        raise HTTPException(status_code=400, detail="mode must be auto|multicall|batch")
+
+    async def gen():
+        async with bulk.BulkReader(RPC_URL, CONTRACT, chunk=min(chunk, 1000), concurrency=min(concurrency, 16), mode=mode, rpc=RPC) as br:
+            async for row in br.read(ids):
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+# ---------- batch (NDJSON stream, one line per item) ----------
+def _batch_stream(items, build_calls, gas: int):
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"batch too large (max {BATCH_MAX_ITEMS})")
+    accepted, rejected = treasury.dedupe_wallets(items)
+
+    async def gen():
+        for ln in rejected:
+            yield ln
+        if not accepted:
+            return
+        try:
+            signed = await _engine().sign_batch(await build_calls(accepted), gas, signer=_signer())
+        except Exception as e:
+            for i, it in accepted:
+                yield {"i": i, "wallet": it.to_wallet, "ok": False, "error": f"sign failed: {e}"}
+            return
+        async for ln in _engine().broadcast(signed, BATCH_SEND_CONCURRENCY):
+            yield ln
+
+    async def ndjson():
+        async for ln in gen():
+            yield json.dumps(ln, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.post("/v1/chain/mint-batch", dependencies=_WRITE)
+async def mint_batch(reqs: List[MintReq]):
+    async def calls(accepted):
+        return [(i, r.to_wallet, treasury.mint_call(w3, CONTRACT, r.to_wallet, r.token_uri)) for i, r in accepted]
+    return _batch_stream(reqs, calls, int(os.getenv("MINT_GAS","220000")))
+
+@app.post("/v1/chain/grant-batch", dependencies=_WRITE)
+async def grant_batch(reqs: List[GrantReq]):
+    if not SELA_TOKEN:
+        raise HTTPException(status_code=503, detail="SELA_TOKEN not configured")
+    async def calls(accepted):
+        decimals = await treasury.erc20_decimals_async(w3, SELA_TOKEN, RPC.call, CHAIN_ID)
+        return [(i, r.to_wallet, treasury.grant_call(w3, SELA_TOKEN, r.to_wallet, r.amount, decimals)) for i, r in accepted]
+    return _batch_stream(reqs, calls, int(os.getenv("GRANT_GAS","100000")))
@@ -0,0 +1,296 @@
+"""Reproducible load test against the in-process stand-in RPC (slh.devnet).
+
+Starts a devnet with a fixed block time and injected latency, points the API
+(run_api.app, called in-process over ASGI) and the /mint bot handlers
+(bot/run_admin_bot.py, fed synthetic Telegram updates) at it, and drives each
+scenario at a fixed concurrency. Per scenario: throughput, p50/p95/p99
+latency, errors and stand-in RPC requests per operation (JSON-RPC batches
+count once as HTTP requests and per call under "methods"). Results are
+written as JSON; ``--baseline`` prints the delta against an earlier run.
+
+    python scripts/bench.py --mints 200 --concurrency 32 --block-time 1 --latency 0.02
+    python scripts/bench.py --scenarios api_mint --baseline bench/20251020T120000Z.json
+"""
+import argparse, asyncio, datetime, importlib.util, itertools, json, os, pathlib, platform, subprocess, sys, time
+from types import SimpleNamespace
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))  # repo root -> slh/, run_api
+
+from eth_account import Account
+from web3 import Web3
+
+from slh.devnet import Chain, StandInRPC
+
+NFT = "0x8AD1de67648dB44B1b1D0E3475485910CedDe90b"
+SCENARIOS = ("api_healthz", "api_mint", "api_inspect", "bot_mint")
+
+
+def _pct(xs, q):
+    """Nearest-rank percentile of a sorted list."""
+    if not xs:
+        return None
+    return xs[min(len(xs) - 1, max(0, int(round(q / 100 * len(xs))) - 1))]
+
+def _summary(name, lat, errors, wall, ops, concurrency, rpc_before, rpc_after):
+    lat = sorted(lat)
+    methods = {m: n - rpc_before[1].get(m, 0) for m, n in rpc_after[1].items() if n - rpc_before[1].get(m, 0)}
+    requests = rpc_after[0] - rpc_before[0]
+    return {
+        "scenario": name, "ops": ops, "ok": len(lat), "errors": errors, "concurrency": concurrency,
+        "wall_seconds": round(wall, 3), "throughput_per_s": round(len(lat) / wall, 2) if wall else None,
+        "latency_ms": {k: round(v * 1000, 1) if v is not None else None for k, v in
+                       {"p50": _pct(lat, 50), "p95": _pct(lat, 95), "p99": _pct(lat, 99),
+                        "max": lat[-1] if lat else None, "mean": sum(lat) / len(lat) if lat else None}.items()},
+        "rpc": {"requests": requests, "per_op": round(requests / ops, 2) if ops else None,
+                "calls_per_op": round(sum(methods.values()) / ops, 2) if ops else None,
+                "methods": dict(sorted(methods.items()))},
+    }
+
+async def _drive(n, concurrency, op):
+    """Run ``op(i)`` n times with at most ``concurrency`` in flight; (latencies of successes, errors, wall)."""
+    sem, lat, errors = asyncio.Semaphore(concurrency), [], []
+
+    async def one(i):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await op(i)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                return
+            lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return lat, errors, time.perf_counter() - t0
+
+def _wallet(i: int) -> str:
+    return Web3.to_checksum_address("0x" + (i + 1).to_bytes(20, "big").hex())
+
+
+# ---------- synthetic Telegram ----------
+class _Chat:
+    """Stand-in for a private chat: reply_text/edit_text record the bot's answers."""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.done = asyncio.get_running_loop().create_future()
+        self.texts = []
+
+    async def reply_text(self, text, **kw):
+        await self.edit_text(text)
+        return SimpleNamespace(edit_text=self.edit_text)
+
+    async def edit_text(self, text, **kw):
+        self.texts.append(text)
+        if text[:1] in ("✅", "❗", "⌛") and not self.done.done():  # success / failure / no receipt
+            self.done.set_result(text)
+
+class _Bot:
+    """Stand-in for ``context.bot``: what the outbox sends/edits lands in the chat's record."""
+
+    def __init__(self):
+        self.chats = {}
+        self._ids = itertools.count(1)
+
+    def chat(self, user_id: int) -> _Chat:
+        c = self.chats[user_id] = _Chat(user_id)
+        return c
+
+    async def send_message(self, chat_id, text, **kw):
+        await self.chats[chat_id].edit_text(text)
+        return SimpleNamespace(message_id=next(self._ids))
+
+    async def edit_message_text(self, text, chat_id, message_id, **kw):
+        await self.chats[chat_id].edit_text(text)
+        return True
+
+def _update(chat: _Chat, text: str):
+    msg = SimpleNamespace(text=text, reply_text=chat.reply_text)
+    return SimpleNamespace(message=msg, effective_message=msg, effective_user=SimpleNamespace(id=chat.user_id),
+                           effective_chat=SimpleNamespace(id=chat.user_id))
+
+def _load_bot():
+    spec = importlib.util.spec_from_file_location("slh_bench_bot", ROOT / "bot" / "run_admin_bot.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+# ---------- scenarios ----------
+async def api_healthz(a, client):
+    async def op(i):
+        r = await client.get("/healthz")
+        r.raise_for_status()
+    return await _drive(a.requests, a.concurrency, op), a.requests
+
+async def api_mint(a, client):
+    async def op(i):
+        r = await client.post("/v1/chain/mint-demo", params={"wait": "true"},
+                              json={"to_wallet": _wallet(i), "token_uri": f"ipfs://bench/{i}.json"})
+        r.raise_for_status()
+        body = r.json()
+        if not body.get("ok") or body.get("token_id") is None:
+            raise RuntimeError(f"mint not confirmed: {body}")
+    return await _drive(a.mints, a.concurrency, op), a.mints
+
+async def api_inspect(a, client):
+    async def op(i):
+        r = await client.get("/v1/nft/inspect", params={"range": f"1-{a.inspect_tokens}"})
+        r.raise_for_status()
+        rows = [json.loads(line) for line in r.text.splitlines() if line.strip()]
+        if len(rows) != a.inspect_tokens:
+            raise RuntimeError(f"{len(rows)} rows")
+    return await _drive(a.requests, a.concurrency, op), a.requests
+
+async def bot_mint(a, bot):
+    users = itertools.count(10_000)
+    tg = _Bot()
+
+    async def op(i):
+        chat = tg.chat(next(users))
+        ctx = SimpleNamespace(user_data={}, bot=tg, application=SimpleNamespace(create_task=asyncio.get_running_loop().create_task))
+        await bot.mint_start(_update(chat, "/mint"), ctx)
+        wallet = _wallet(1_000_000 + i)
+        await bot.mint_wallet_collector(_update(chat, wallet), ctx)
+        if bot._MINTS.get(wallet.lower()) is None and not chat.done.done():
+            raise RuntimeError(chat.texts[-1].splitlines()[0])  # rejected (rate limit / busy / bad address)
+        text = await asyncio.wait_for(chat.done, a.timeout)
+        if not text.startswith("✅"):
+            raise RuntimeError(text.splitlines()[0])
+    return await _drive(a.mints, a.concurrency, op), a.mints
+
+
+# ---------- main ----------
+def _configure_env(a, rpc_url: str):
+    os.environ.update({
+        "BSC_RPC_URL": rpc_url, "CHAIN_ID": str(a.chain_id), "NFT_CONTRACT": NFT,
+        "TREASURY_PRIVATE_KEY": Account.create().key.hex(),
+    })
+    os.environ.pop("BSC_RPC_URLS", None)
+    os.environ.pop("NFT_INDEX_DB", None)
+    # bench load must not trip the anti-abuse limits, nor the outbox's Telegram flood limits (the stub is not
+    # Telegram); each run is a fresh process, so setdefault lets callers override
+    for k, v in {"MINT_USER_BURST": "1000", "MINT_WALLET_BURST": "1000", "MINT_MAX_PENDING": "100000",
+                 "MINT_CONCURRENCY": str(max(a.concurrency, 64)), "RECEIPT_POLL_SECONDS": str(a.poll),
+                 "GAS_POLL_SECONDS": str(max(a.block_time, 0.5)), "BULK_MAX_TOKENS": "100000",
+                 "IDEMPOTENCY_DB": "0", "LOG_LEVEL": "WARNING",
+                 "TG_GLOBAL_PER_SEC": "100000", "TG_CHAT_PER_SEC": "1000", "TG_CHAT_BURST": "1000",
+                 "TG_SEND_CONCURRENCY": "256"}.items():
+        os.environ.setdefault(k, v)
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def _compare(results, baseline_path):
+    base = {r["scenario"]: r for r in json.loads(pathlib.Path(baseline_path).read_text(encoding="utf-8"))["results"]}
+    for r in results:
+        b = base.get(r["scenario"])
+        if not b:
+            continue
+        def delta(new, old):
+            return f"{(new - old) / old * 100:+.1f}%" if new is not None and old else "n/a"
+        print(f"  vs baseline {r['scenario']}: throughput {delta(r['throughput_per_s'], b['throughput_per_s'])}, "
+              f"p95 {delta(r['latency_ms']['p95'], b['latency_ms']['p95'])}, "
+              f"rpc/op {delta(r['rpc']['per_op'], b['rpc']['per_op'])}", file=sys.stderr)
+
+async def _close_engines(bot):
+    import run_api
+    await run_api._close_engine()
+    if bot is not None and bot._ENGINE is not None:
+        await bot._ENGINE.close()  # closes the shared watcher too
+        await bot._RPC.close()
+        bot._ENGINE = bot._WATCHER = None
+    if bot is not None and bot._OUTBOX is not None:
+        await bot._OUTBOX.close()
+        bot._OUTBOX = None
+
+async def run(a, srv):
+    import httpx
+    import run_api
+    bot = _load_bot() if "bot_mint" in a.scenarios else None
+    rpc_state = lambda: (srv.requests, dict(srv.methods))
+    results = []
+    await run_api.WARMUP.wait()  # no lifespan over ASGITransport: warm up here, before the clock starts
+    warmup = run_api.WARMUP.report()
+    print(f"warmup       ok={warmup['ok']}  " + "  ".join(f"{n}={r['seconds']}s" for n, r in warmup["steps"].items()),
+          file=sys.stderr)
+    transport = httpx.ASGITransport(app=run_api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=a.timeout) as client:
+        for name in a.scenarios:
+            before = rpc_state()
+            try:
+                if name == "bot_mint":
+                    (lat, errors, wall), ops = await bot_mint(a, bot)
+                else:
+                    (lat, errors, wall), ops = await globals()[name](a, client)
+            finally:
+                # stop the engines' fee/receipt polling so it is not billed to the next scenario
+                await _close_engines(bot)
+            res = _summary(name, lat, len(errors), wall, ops, a.concurrency, before, rpc_state())
+            if errors:
+                res["first_errors"] = errors[:5]
+            results.append(res)
+            l = res["latency_ms"]
+            print(f"{name:12} {res['ok']}/{ops} ok  {res['throughput_per_s']}/s  p50={l['p50']}ms p95={l['p95']}ms "
+                  f"p99={l['p99']}ms  rpc/op={res['rpc']['per_op']}", file=sys.stderr)
+    await run_api._close_rpc()
+    return results, warmup
+
+def main():
+    ap = argparse.ArgumentParser(description="SLH load test against the local stand-in RPC")
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma list of {', '.join(SCENARIOS)}")
+    ap.add_argument("--mints", type=int, default=100, help="mints per mint scenario")
+    ap.add_argument("--requests", type=int, default=200, help="requests per read scenario")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--inspect-tokens", type=int, default=50, help="token ids per /v1/nft/inspect call")
+    ap.add_argument("--block-time", type=float, default=1.0, help="stand-in block time (0 = mine on every tx)")
+    ap.add_argument("--latency", type=float, default=0.02, help="stand-in per-request latency (s)")
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--chain-id", type=int, default=97)
+    ap.add_argument("--poll", type=float, default=0.25, help="RECEIPT_POLL_SECONDS")
+    ap.add_argument("--timeout", type=float, default=120.0, help="per-operation timeout (s)")
+    ap.add_argument("--out", help="results file (default bench/<UTC timestamp>.json)")
+    ap.add_argument("--baseline", help="earlier results file to compare against")
+    a = ap.parse_args()
+    a.scenarios = [s.strip() for s in a.scenarios.split(",") if s.strip()]
+    bad = [s for s in a.scenarios if s not in SCENARIOS]
+    if bad:
+        ap.error(f"unknown scenario(s): {', '.join(bad)}")
+    if "api_inspect" in a.scenarios and "api_mint" not in a.scenarios and "bot_mint" not in a.scenarios:
+        ap.error("api_inspect reads minted tokens: run it with api_mint or bot_mint")
+
+    chain = Chain(a.chain_id, a.block_time, NFT).start()
+    srv = StandInRPC(chain, latency=a.latency, jitter=a.jitter, error_rate=a.error_rate).start()
+    _configure_env(a, srv.url)
+    if "api_inspect" in a.scenarios:  # read what the mint scenarios produced
+        a.scenarios.sort(key=lambda s: s == "api_inspect")
+    started = datetime.datetime.now(datetime.timezone.utc)
+    try:
+        results, warmup = asyncio.run(run(a, srv))
+    finally:
+        srv.stop()
+        chain.stop()
+
+    report = {
+        "started_at": started.isoformat(timespec="seconds"), "git_rev": _git_rev(),
+        "python": platform.python_version(), "platform": platform.platform(),
+        "params": {k: v for k, v in vars(a).items() if k not in ("out", "baseline")},
+        "warmup": warmup, "results": results,
+    }
+    out = pathlib.Path(a.out) if a.out else ROOT / "bench" / (started.strftime("%Y%m%dT%H%M%SZ") + ".json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    print(f"results -> {out}", file=sys.stderr)
+    if a.baseline:
+        _compare(results, a.baseline)
+    return 1 if any(r["errors"] for r in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
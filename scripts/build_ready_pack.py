@@ -0,0 +1,46 @@
+"""Assemble the Ready Pack for a release.
+
+The pack folder in the repo keeps only what is specific to it (bot, Procfiles,
+railway.toml, README, requirements). The API (``run_api.py``) and the ``slh/``
+package are copied in from the repo root here, so they only ever live once in
+the tree. Deploy (or push) the built folder, not the source one.
+
+    python scripts/build_ready_pack.py            # -> dist/slh_stack-main/
+    python scripts/build_ready_pack.py --zip      # also dist/slh_stack-main.zip
+"""
+import argparse, pathlib, shutil, sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+PACK = ROOT / "SLH_Ready_Pack_20251017_1757" / "slh_stack-main"
+SHARED = ("run_api.py", "slh")  # taken from the repo root
+_SKIP = shutil.ignore_patterns("__pycache__", "*.py[cod]", "*.sqlite*", ".env")
+
+
+def build(out: pathlib.Path) -> pathlib.Path:
+    if out.exists():
+        if not (out / "slh" / "__init__.py").exists():
+            raise SystemExit(f"{out} exists and is not an earlier pack build; refusing to replace it")
+        shutil.rmtree(out)
+    shutil.copytree(PACK, out, ignore=_SKIP)
+    for name in SHARED:
+        src = ROOT / name
+        if src.is_dir():
+            shutil.copytree(src, out / name, ignore=_SKIP)
+        else:
+            shutil.copy2(src, out / name)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Build the SLH Ready Pack (pack folder + root API and slh/)")
+    ap.add_argument("--out", default=str(ROOT / "dist" / PACK.name), help="output folder (replaced if it is an earlier build)")
+    ap.add_argument("--zip", action="store_true", help="also write <out>.zip")
+    a = ap.parse_args()
+    out = build(pathlib.Path(a.out).resolve())
+    print(f"pack -> {out}", file=sys.stderr)
+    if a.zip:
+        print(f"zip  -> {shutil.make_archive(str(out), 'zip', out.parent, out.name)}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,67 @@
 from web3 import Web3, HTTPProvider
-import json, sys
+import argparse, asyncio, contextlib, csv, json, os, pathlib, sys, time
 
 RPC  = "https://bsc-testnet-rpc.publicnode.com"
 ADDR = "0x8AD1de67648dB44B1b1D0E3475485910CedDe90b"  # checksum
 ABI  = "abi/SLHNFT.json"
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))  # repo root -> slh/
+
+def local_owner(tid: int):
+    """ownerOf from the local Transfer index (NFT_INDEX_DB), synced first."""
+    from slh.indexer import indexer_from_env
+    from slh.rpc import get_w3
+    os.environ.setdefault("NFT_INDEX_DB", "nft_index.sqlite")
+    os.environ.setdefault("NFT_CONTRACT", ADDR)
+    ix = indexer_from_env(get_w3(os.environ.get("BSC_RPC_URLS") or os.environ.get("BSC_RPC_URL") or RPC), start=False)
+    ix.sync_once()
+    return ix.index.token(ix.contract, tid)
+
+async def bulk_dump(a, out):
+    """ownerOf/tokenURI for a whole id range via Multicall3 (or JSON-RPC batches) -> CSV/NDJSON."""
+    from slh.bulk import BulkReader, parse_range
+    ids = parse_range(a.range)
+    w = csv.DictWriter(out, ["token_id", "owner", "uri", "error"]) if a.format == "csv" else None
+    if w:
+        w.writeheader()
+    t0, n, bad = time.perf_counter(), 0, 0
+    async with BulkReader(a.rpc, ADDR, chunk=a.chunk, concurrency=a.concurrency, mode=a.mode) as br:
+        async for row in br.read(ids):
+            n += 1
+            bad += row["error"] is not None
+            if w:
+                w.writerow(row)
+            else:
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+    print(f"{n} tokens ({bad} errors) in {time.perf_counter() - t0:.2f}s, {br.rpc_calls} RPC requests [{br.mode}]", file=sys.stderr)
+
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="SLHNFT sanity check")
+    ap.add_argument("token_id", nargs="?", type=int, default=1)
+    ap.add_argument("--local", action="store_true", help="read the local Transfer index instead of RPC")
+    ap.add_argument("--range", help="bulk mode: token ids, e.g. 1-5000 or 1,5,10-20")
+    ap.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    ap.add_argument("--chunk", type=int, default=200, help="tokens per multicall / batch request")
+    ap.add_argument("--concurrency", type=int, default=4, help="requests in flight")
+    ap.add_argument("--mode", choices=("auto", "multicall", "batch"), default="auto")
+    ap.add_argument("--out", help="output file (default stdout)")
+    ap.add_argument("--rpc", default=os.environ.get("BSC_RPC_URLS") or os.environ.get("BSC_RPC_URL") or RPC)
+    a = ap.parse_args()
+    if a.range:
+        with (open(a.out, "w", newline="", encoding="utf-8") if a.out else contextlib.nullcontext(sys.stdout)) as out:
+            asyncio.run(bulk_dump(a, out))
+        sys.exit(0)
+    tid = a.token_id
+    if a.local:
+        tok = local_owner(tid)
+        print(f"ownerOf({tid}) [index]:", tok["owner"] if tok else "(not indexed)")
+        if tok:
+            print("mint tx:", tok["mint_tx"], "| block:", tok["mint_block"])
+        sys.exit(0)
     w3 = Web3(HTTPProvider(RPC))
     with open(ABI, "r", encoding="utf-8-sig") as f:
         abi = json.load(f)
     c = w3.eth.contract(address=ADDR, abi=abi)
-    tid = int(sys.argv[1]) if len(sys.argv) > 1 else 1
     print("name():", c.functions.name().call())
     print("symbol():", c.functions.symbol().call())
     print(f"ownerOf({tid}):", c.functions.ownerOf(tid).call())
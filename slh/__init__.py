@@ -0,0 +1 @@
+"""Shared chain/runtime helpers for the SLH bot and API services."""
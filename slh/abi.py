@@ -0,0 +1,259 @@
+"""ABI registry and batch event-log decoder.
+
+Every ``abi/*.json`` (a plain ABI list, or a build artifact with an ``"abi"``
+key; ``ABI_DIR`` overrides the folder) is read once, on first use. Function
+selectors and event topic hashes are computed at that point, so hot paths
+look them up instead of hashing signatures per call:
+
+    abi("SLHNFT")                     # ABI list for web3 contract objects
+    selector("ownerOf(uint256)")      # 4 bytes
+    for logs in decode_receipts(receipts, address=NFT, names=("Transfer",)):
+        ...                           # one list of DecodedLog per receipt
+
+Logs are decoded as they come: hex strings from raw JSON-RPC receipts or
+HexBytes from web3, without normalizing whole receipts first. Static words
+(address, int/uint, bool, bytesN) are sliced straight out of topics and data;
+only dynamic data goes through eth_abi. Addresses come back lower-case.
+ERC-20/721 ``Transfer`` and ``Approval`` and ``ApprovalForAll`` are always
+known; ERC-721 Transfer (tokenId indexed, 4 topics) and ERC-20 Transfer
+(value in data, 3 topics) share a topic hash and are told apart by topic count.
+"""
+import json, logging, os, pathlib, threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from eth_hash.auto import keccak
+
+logger = logging.getLogger("slh.abi")
+
+ABI_DIR = pathlib.Path(os.environ.get("ABI_DIR") or pathlib.Path(__file__).resolve().parents[1] / "abi")
+
+
+def _ev(name, *inputs):
+    return {"type": "event", "name": name, "anonymous": False,
+            "inputs": [{"name": n, "type": t, "indexed": i} for n, t, i in inputs]}
+
+STANDARD_EVENTS = [
+    _ev("Transfer", ("from", "address", True), ("to", "address", True), ("tokenId", "uint256", True)),
+    _ev("Transfer", ("from", "address", True), ("to", "address", True), ("value", "uint256", False)),
+    _ev("Approval", ("owner", "address", True), ("approved", "address", True), ("tokenId", "uint256", True)),
+    _ev("Approval", ("owner", "address", True), ("spender", "address", True), ("value", "uint256", False)),
+    _ev("ApprovalForAll", ("owner", "address", True), ("operator", "address", True), ("approved", "bool", False)),
+]
+
+
+def _canonical(p: dict) -> str:
+    t = p["type"]
+    if t.startswith("tuple"):
+        return "(" + ",".join(_canonical(c) for c in p.get("components") or ()) + ")" + t[5:]
+    return t
+
+def signature(entry: dict) -> str:
+    """``name(type,...)`` of an ABI function/event entry."""
+    return f"{entry['name']}({','.join(_canonical(p) for p in entry.get('inputs') or ())})"
+
+def topic(sig: str) -> bytes:
+    return keccak(sig.encode())
+
+def _selector(sig: str) -> bytes:
+    return keccak(sig.encode())[:4]
+
+
+class EventSpec(NamedTuple):
+    name: str
+    signature: str
+    topic: bytes
+    indexed: Tuple[Tuple[str, str], ...]  # (name, type) for topics[1:]
+    data: Tuple[Tuple[str, str], ...]     # (name, type) for the data section
+    static: bool                          # data is all 32-byte words, no eth_abi needed
+
+
+class DecodedLog(NamedTuple):
+    name: str
+    address: str
+    args: dict
+    tx_hash: Optional[str]
+    block: Optional[int]
+    log_index: Optional[int]
+
+
+def _static(t: str) -> bool:
+    return "[" not in t and (t in ("address", "bool") or t.startswith(("uint", "int"))
+                             or (t.startswith("bytes") and t != "bytes"))
+
+def _word(t: str, w: bytes):
+    if t == "address":
+        return "0x" + w[12:].hex()
+    if t.startswith("uint"):
+        return int.from_bytes(w, "big")
+    if t.startswith("int"):
+        return int.from_bytes(w, "big", signed=True)
+    if t == "bool":
+        return w[-1] != 0
+    if t.startswith("bytes") and t != "bytes":
+        return w[:int(t[5:])]
+    return w  # indexed dynamic value: the topic only holds its hash
+
+def _hexword(t: str, h: str):
+    if t == "address":
+        return "0x" + h[-40:].lower()
+    if t.startswith("uint"):
+        return int(h, 16)
+    return _word(t, bytes.fromhex(h[2:] if h[:2] in ("0x", "0X") else h))
+
+def _value(t: str, v):
+    return _hexword(t, v) if isinstance(v, str) else _word(t, bytes(v))
+
+def _hex(v) -> Optional[str]:
+    if v is None:
+        return None
+    if isinstance(v, str):
+        return v.lower()
+    return "0x" + bytes(v).hex()
+
+def _int(v) -> Optional[int]:
+    if v is None:
+        return None
+    return int(v, 16) if isinstance(v, str) else int(v)
+
+
+class AbiRegistry:
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.abis: Dict[str, list] = {}
+        self.selectors: Dict[str, bytes] = {}  # "name(types)" -> 4-byte selector
+        # topic -> {topic count: spec}; keyed by bytes (HexBytes hashes the same) and by "0x…" hex
+        self.events: Dict[object, Dict[int, EventSpec]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for e in STANDARD_EVENTS:  # first, so decoded arg names do not depend on which ABIs are on disk
+                self._add_event(e)
+            for f in sorted(self.path.glob("*.json")):
+                try:
+                    with open(f, "r", encoding="utf-8-sig") as fh:
+                        data = json.load(fh)
+                except Exception as e:
+                    logger.warning("[ABI] %s unreadable: %s", f.name, e)
+                    continue
+                self.register(f.stem, data.get("abi", []) if isinstance(data, dict) else data)
+            self._loaded = True
+            logger.debug("[ABI] %s ABI(s), %s selector(s), %s event topic(s) from %s",
+                         len(self.abis), len(self.selectors), len(self.events) // 2, self.path)
+
+    def register(self, name: str, entries: list):
+        self.abis[name] = entries
+        for e in entries:
+            if e.get("type") == "function":
+                sig = signature(e)
+                self.selectors.setdefault(sig, _selector(sig))
+            elif e.get("type") == "event" and not e.get("anonymous"):
+                self._add_event(e)
+
+    def _add_event(self, e: dict):
+        sig = signature(e)
+        ins = e.get("inputs") or ()
+        indexed = tuple((p["name"], _canonical(p)) for p in ins if p.get("indexed"))
+        data = tuple((p["name"], _canonical(p)) for p in ins if not p.get("indexed"))
+        spec = EventSpec(e["name"], sig, topic(sig), indexed, data, all(_static(t) for _, t in data))
+        by_count = self.events.setdefault(spec.topic, {})
+        self.events["0x" + spec.topic.hex()] = by_count
+        by_count.setdefault(1 + len(indexed), spec)
+
+    def abi(self, name: str) -> list:
+        self.load()
+        try:
+            return self.abis[name]
+        except KeyError:
+            raise KeyError(f"no ABI named {name!r} in {self.path}") from None
+
+    def selector(self, sig: str) -> bytes:
+        self.load()
+        sel = self.selectors.get(sig)
+        if sel is None:
+            sel = self.selectors[sig] = _selector(sig)
+        return sel
+
+    def spec(self, topics: Sequence) -> Optional[EventSpec]:
+        by_count = self.events.get(topics[0])
+        if by_count is None and isinstance(topics[0], str):
+            by_count = self.events.get(topics[0].lower())
+        return by_count and by_count.get(len(topics))
+
+    def decode_log(self, lg, address: Optional[str] = None, names: Optional[Iterable[str]] = None) -> Optional[DecodedLog]:
+        """``address`` (lower-case) and ``names`` filter before anything is decoded."""
+        topics = lg.get("topics")
+        if not topics:
+            return None
+        addr = lg.get("address") or ""
+        if address is not None and addr.lower() != address:
+            return None
+        spec = self.spec(topics)
+        if spec is None or (names is not None and spec.name not in names):
+            return None
+        args = {n: _value(t, v) for (n, t), v in zip(spec.indexed, topics[1:])}
+        if spec.data:
+            args.update(self._data(spec, lg.get("data") or b""))
+        return DecodedLog(spec.name, addr.lower(), args, _hex(lg.get("transactionHash")),
+                          _int(lg.get("blockNumber")), _int(lg.get("logIndex")))
+
+    @staticmethod
+    def _data(spec: EventSpec, data) -> dict:
+        if isinstance(data, str):
+            if spec.static:
+                return {n: _hexword(t, data[2 + 64 * i:66 + 64 * i]) for i, (n, t) in enumerate(spec.data)}
+            data = bytes.fromhex(data[2:])
+        else:
+            data = bytes(data)
+        if spec.static:
+            return {n: _word(t, data[32 * i:32 * i + 32]) for i, (n, t) in enumerate(spec.data)}
+        from eth_abi import decode  # dynamic data only
+        return dict(zip((n for n, _ in spec.data), decode([t for _, t in spec.data], data)))
+
+    def decode_receipts(self, receipts: Iterable, address: Optional[str] = None,
+                        names: Optional[Iterable[str]] = None) -> List[List[DecodedLog]]:
+        """One list of decoded logs per receipt (empty for a missing receipt or no known events)."""
+        self.load()
+        address = address.lower() if address else None
+        names = frozenset(names) if names is not None else None
+        out = []
+        for rc in receipts:
+            evs = []
+            for lg in (rc.get("logs") or ()) if rc else ():
+                ev = self.decode_log(lg, address, names)
+                if ev is not None:
+                    evs.append(ev)
+            out.append(evs)
+        return out
+
+
+REGISTRY = AbiRegistry(ABI_DIR)
+
+TRANSFER = topic("Transfer(address,address,uint256)")
+TRANSFER_HEX = "0x" + TRANSFER.hex()
+
+
+def abi(name: str) -> list:
+    return REGISTRY.abi(name)
+
+def selector(sig: str) -> bytes:
+    return REGISTRY.selector(sig)
+
+def decode_log(lg, address: Optional[str] = None, names: Optional[Iterable[str]] = None) -> Optional[DecodedLog]:
+    REGISTRY.load()
+    return REGISTRY.decode_log(lg, address.lower() if address else None,
+                               frozenset(names) if names is not None else None)
+
+def decode_receipts(receipts: Iterable, address: Optional[str] = None,
+                    names: Optional[Iterable[str]] = None) -> List[List[DecodedLog]]:
+    return REGISTRY.decode_receipts(receipts, address, names)
+
+def token_ids(receipts: Iterable, contract: str) -> List[Optional[int]]:
+    """tokenId of the first ERC-721 Transfer emitted by ``contract`` in each receipt (None if there is none)."""
+    return [next((ev.args["tokenId"] for ev in evs if "tokenId" in ev.args), None)
+            for evs in REGISTRY.decode_receipts(receipts, contract, ("Transfer",))]
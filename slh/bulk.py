@@ -0,0 +1,143 @@
+"""Bulk ERC-721 reads (``ownerOf`` / ``tokenURI``) for collection audits.
+
+Token ids are split into chunks; each chunk is one Multicall3 ``aggregate3``
+``eth_call`` (failures allowed per token), or, where Multicall3 is not
+deployed, one JSON-RPC batch of plain ``eth_call``s. Up to ``concurrency``
+chunks are in flight; rows come back in token order. Pass ``rpc`` to reuse
+a long-lived ``AsyncRPC`` connection pool instead of opening one per read.
+"""
+import asyncio, logging
+from typing import AsyncIterator, Iterable, List, Optional, Sequence, Tuple
+
+from eth_abi import decode, encode
+from web3 import Web3
+
+from slh import abi
+from slh.rpc import AsyncRPC, fastest_url, mark_failed
+
+logger = logging.getLogger("slh.bulk")
+
+MULTICALL3 = "0xcA11bde05977b3631167028862bE2a173976CA11"  # same address on BSC mainnet/testnet
+
+SEL_OWNER_OF = abi.selector("ownerOf(uint256)")
+SEL_TOKEN_URI = abi.selector("tokenURI(uint256)")
+SEL_AGGREGATE3 = abi.selector("aggregate3((address,bool,bytes)[])")
+
+FIELDS = {"owner": (SEL_OWNER_OF, "address"), "uri": (SEL_TOKEN_URI, "string")}
+
+
+def parse_range(spec: str) -> List[int]:
+    """``1-5000`` / ``1,2,10-20`` → token ids."""
+    out: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        out.extend(range(int(lo), int(hi or lo) + 1))
+    return out
+
+
+def _decode(kind: str, data: bytes):
+    v = decode([kind], data)[0]
+    return Web3.to_checksum_address(v) if kind == "address" else v
+
+
+class BulkReader:
+    def __init__(self, rpc_url: str, contract: str, fields: Sequence[str] = ("owner", "uri"),
+                 chunk: int = 200, concurrency: int = 4, mode: str = "auto",
+                 multicall: str = MULTICALL3, http_timeout: float = 30.0, rpc: Optional[AsyncRPC] = None):
+        if mode not in ("auto", "multicall", "batch"):
+            raise ValueError(f"bad mode: {mode}")
+        self.rpc_url = rpc_url
+        self.contract = Web3.to_checksum_address(contract)
+        self.fields = [f for f in fields if f in FIELDS]
+        self.chunk = max(1, chunk)
+        self.concurrency = max(1, concurrency)
+        self.mode = mode
+        self.multicall = Web3.to_checksum_address(multicall)
+        self.rpc_calls = 0
+        self._own_rpc = rpc is None
+        self.rpc = rpc or AsyncRPC(rpc_url, http_timeout, max_connections=self.concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._own_rpc:
+            await self.rpc.close()
+
+    async def read(self, token_ids: Iterable[int]) -> AsyncIterator[dict]:
+        """Yield ``{"token_id", "owner", "uri", "error"}`` per token, in input order."""
+        ids = list(token_ids)
+        chunks = [ids[i:i + self.chunk] for i in range(0, len(ids), self.chunk)]
+        if self.mode == "auto" and chunks:
+            self.mode = "multicall" if await self._has_multicall() else "batch"
+            logger.info("[BULK] mode=%s chunk=%s concurrency=%s tokens=%s", self.mode, self.chunk, self.concurrency, len(ids))
+        for w in range(0, len(chunks), self.concurrency):
+            window = chunks[w:w + self.concurrency]
+            for rows in await asyncio.gather(*(self._read_chunk(c) for c in window)):
+                for row in rows:
+                    yield row
+
+    # ---------- internals ----------
+    def _calls(self, token_ids: List[int]) -> List[Tuple[int, str, bytes]]:
+        return [(tid, f, FIELDS[f][0] + encode(["uint256"], [tid])) for tid in token_ids for f in self.fields]
+
+    async def _read_chunk(self, token_ids: List[int]) -> List[dict]:
+        calls = self._calls(token_ids)
+        url = fastest_url(self.rpc_url)
+        try:
+            if self.mode == "multicall":
+                results = await self._multicall(url, [c[2] for c in calls])
+            else:
+                results = await self._batch(url, [c[2] for c in calls])
+        except Exception as e:
+            mark_failed(url, e)
+            logger.warning("[BULK] chunk %s-%s failed: %s", token_ids[0], token_ids[-1], e)
+            return [{"token_id": t, **{f: None for f in self.fields}, "error": str(e)} for t in token_ids]
+        rows = {t: {"token_id": t, **{f: None for f in self.fields}, "error": None} for t in token_ids}
+        for (tid, field, _), (ok, data) in zip(calls, results):
+            row = rows[tid]
+            if not ok:
+                row["error"] = row["error"] or f"{field}: {data or 'reverted'}"
+                continue
+            try:
+                row[field] = _decode(FIELDS[field][1], data)
+            except Exception as e:
+                row["error"] = row["error"] or f"{field}: undecodable ({e})"
+        return [rows[t] for t in token_ids]
+
+    async def _post(self, url: str, body):
+        self.rpc_calls += 1
+        return await self.rpc.post(url, body, f"batch:{body[0]['method']}" if isinstance(body, list) else body["method"])
+
+    def _req(self, to: str, data: bytes) -> dict:
+        return self.rpc.request("eth_call", [{"to": to, "data": "0x" + data.hex()}, "latest"])
+
+    async def _has_multicall(self) -> bool:
+        url = fastest_url(self.rpc_url)
+        body = await self._post(url, self.rpc.request("eth_getCode", [self.multicall, "latest"]))
+        return bool(body.get("result")) and body["result"] not in ("0x", "0x0")
+
+    async def _multicall(self, url: str, datas: List[bytes]) -> List[Tuple[bool, bytes]]:
+        payload = SEL_AGGREGATE3 + encode(["(address,bool,bytes)[]"], [[(self.contract, True, d) for d in datas]])
+        body = await self._post(url, self._req(self.multicall, payload))
+        if body.get("error"):
+            raise RuntimeError(f"aggregate3: {body['error']}")
+        return [(ok, bytes(ret)) for ok, ret in decode(["(bool,bytes)[]"], bytes.fromhex(body["result"][2:]))[0]]
+
+    async def _batch(self, url: str, datas: List[bytes]) -> List[Tuple[bool, object]]:
+        reqs = [self._req(self.contract, d) for d in datas]
+        body = await self._post(url, reqs)
+        if not isinstance(body, list):
+            raise RuntimeError(f"batch refused: {body.get('error') if isinstance(body, dict) else body}")
+        by_id = {it.get("id"): it for it in body}
+        out = []
+        for q in reqs:
+            it = by_id.get(q["id"]) or {}
+            if it.get("error") or it.get("result") in (None, "0x"):
+                out.append((False, (it.get("error") or {}).get("message")))
+            else:
+                out.append((True, bytes.fromhex(it["result"][2:])))
+        return out
@@ -0,0 +1,353 @@
+"""Local stand-in JSON-RPC server for failover drills and benchmarks.
+
+Not an EVM: it accepts signed EIP-1559 transactions, tracks per-sender
+nonces, mines on a fixed block time and emits an ERC-721 ``Transfer`` log
+for every transaction sent to ``nft_contract``. Latency and errors can be
+injected per server so several instances make a flaky RPC fleet, and
+``Chain.reorg(n)`` replaces the last n blocks to exercise reorg handling.
+
+    python -m slh.devnet --port 8545 --latency 0.2 --error-rate 0.1
+"""
+import argparse, json, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from eth_account import Account
+from eth_account._utils.typed_transactions import TypedTransaction
+from eth_abi import decode, encode
+from hexbytes import HexBytes
+from web3 import Web3
+
+from slh import abi
+from slh.receipts import TRANSFER_TOPIC
+
+ZERO_TOPIC = "0x" + "00" * 32
+MULTICALL3 = "0xca11bde05977b3631167028862be2a173976ca11"
+SEL_SAFE_MINT_URI = abi.selector("safeMint(address,string)")
+SEL_OWNER_OF = abi.selector("ownerOf(uint256)")
+SEL_TOKEN_URI = abi.selector("tokenURI(uint256)")
+SEL_AGGREGATE3 = abi.selector("aggregate3((address,bool,bytes)[])")
+
+
+def _topic_addr(addr: str) -> str:
+    return "0x" + "00" * 12 + addr.lower()[2:]
+
+
+class Chain:
+    """Minimal account/nonce/receipt state shared by one or more stand-in servers."""
+
+    def __init__(self, chain_id: int = 97, block_time: float = 3.0, nft_contract: Optional[str] = None,
+                 min_tip: int = 0):
+        self.chain_id = chain_id
+        self.min_tip = min_tip
+        self.block_time = block_time
+        self.nft_contract = (nft_contract or "").lower()
+        self.lock = threading.Lock()
+        self.block = 1
+        self.nonces: Dict[str, int] = {}
+        self.mempool: List[dict] = []
+        self.queued: Dict[str, Dict[int, dict]] = {}
+        self.known: set = set()
+        self.receipts: Dict[str, dict] = {}
+        self.logs: Dict[int, List[dict]] = {}
+        self.fork = 0
+        self.next_token_id = 1
+        self.tokens: Dict[int, dict] = {}  # token id -> {"owner", "uri", "block"}
+        self._stop = threading.Event()
+        self._miner: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.block_time > 0 and self._miner is None:
+            self._miner = threading.Thread(target=self._mine_loop, name="devnet-miner", daemon=True)
+            self._miner.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _mine_loop(self):
+        while not self._stop.wait(self.block_time):
+            self.mine()
+
+    def block_hash(self, n: int) -> str:
+        return Web3.keccak(text=f"devnet:{self.chain_id}:{self.fork}:{n}").hex()
+
+    def mine(self):
+        with self.lock:
+            self.block += 1
+            txs, self.mempool = self.mempool, []
+            pending, stuck = [], set()
+            for tx in txs:
+                if tx["tip"] < self.min_tip or tx["from"] in stuck:
+                    stuck.add(tx["from"])  # later nonces of that sender wait behind it
+                    self.mempool.append(tx)
+                else:
+                    pending.append(tx)
+            bh = self.block_hash(self.block)
+            cum, logs = 0, []
+            for i, tx in enumerate(pending):
+                cum += tx["gas_used"]
+                rc = {"transactionHash": tx["hash"], "blockNumber": hex(self.block), "blockHash": bh,
+                      "transactionIndex": hex(i), "status": "0x1", "gasUsed": hex(tx["gas_used"]),
+                      "cumulativeGasUsed": hex(cum), "from": tx["from"], "to": tx["to"], "logs": []}
+                if tx["to"] and tx["to"].lower() == self.nft_contract:
+                    tid = self.next_token_id
+                    self.next_token_id += 1
+                    lg = {"address": self.nft_contract, "logIndex": hex(len(logs)), "blockNumber": hex(self.block),
+                          "blockHash": bh, "transactionHash": tx["hash"], "transactionIndex": hex(i),
+                          "topics": [TRANSFER_TOPIC, ZERO_TOPIC, _topic_addr(tx["mint_to"]), "0x%064x" % tid],
+                          "data": "0x", "removed": False}
+                    rc["logs"].append(lg)
+                    logs.append(lg)
+                    self.tokens[tid] = {"owner": tx["mint_to"], "uri": tx["uri"], "block": self.block}
+                self.receipts[tx["hash"]] = rc
+                self.known.discard(tx["hash"])
+            if logs:
+                self.logs[self.block] = logs
+
+    def reorg(self, depth: int):
+        """Replace the last ``depth`` blocks with empty ones (their txs and logs disappear)."""
+        with self.lock:
+            first = self.block - depth + 1
+            for n in range(first, self.block + 1):
+                for lg in self.logs.pop(n, ()):
+                    self.receipts.pop(lg["transactionHash"], None)
+            for h in [h for h, rc in self.receipts.items() if int(rc["blockNumber"], 16) >= first]:
+                del self.receipts[h]
+            for tid in [t for t, tok in self.tokens.items() if tok["block"] >= first]:
+                del self.tokens[tid]
+            self.fork += 1
+
+    def get_logs(self, flt: dict) -> List[dict]:
+        lo = _blk(flt.get("fromBlock"), self.block)
+        hi = _blk(flt.get("toBlock"), self.block)
+        addrs = flt.get("address")
+        addrs = {a.lower() for a in ([addrs] if isinstance(addrs, str) else addrs or [])}
+        topic0 = (flt.get("topics") or [None])[0]
+        topic0 = {t.lower() for t in ([topic0] if isinstance(topic0, str) else topic0 or [])}
+        out = []
+        with self.lock:
+            for n in range(lo, hi + 1):
+                for lg in self.logs.get(n, ()):
+                    if (not addrs or lg["address"] in addrs) and (not topic0 or lg["topics"][0] in topic0):
+                        out.append(lg)
+        return out
+
+    def send_raw(self, raw_hex: str) -> str:
+        raw = bytes.fromhex(raw_hex[2:] if raw_hex.startswith("0x") else raw_hex)
+        tx = TypedTransaction.from_bytes(HexBytes(raw)).as_dict()
+        sender = Account.recover_transaction(raw).lower()
+        h = Web3.keccak(raw).hex()
+        if not h.startswith("0x"):
+            h = "0x" + h
+        to = Web3.to_hex(tx["to"]) if tx.get("to") else None
+        data = bytes(tx.get("data") or b"")
+        entry = {"hash": h, "from": sender, "to": to, "gas_used": min(int(tx["gas"]), 150000),
+                 "mint_to": "0x" + data[16:36].hex() if len(data) >= 36 else sender, "uri": "",
+                 "nonce": tx["nonce"], "tip": int(tx.get("maxPriorityFeePerGas", tx.get("gasPrice", 0)))}
+        if data[:4] == SEL_SAFE_MINT_URI:
+            entry["mint_to"], entry["uri"] = decode(["address", "string"], data[4:])
+        with self.lock:
+            queued = self.queued.setdefault(sender, {})
+            if h in self.receipts or h in self.known:
+                raise _RPCError(-32000, "already known")
+            expected = self.nonces.get(sender, 0)
+            if tx["nonce"] < expected:
+                old = next((i for i, t in enumerate(self.mempool) if t["from"] == sender and t["nonce"] == tx["nonce"]), None)
+                if old is None:
+                    raise _RPCError(-32000, "nonce too low")
+                if entry["tip"] * 10 < self.mempool[old]["tip"] * 11:
+                    raise _RPCError(-32000, "replacement transaction underpriced")
+                self.known.discard(self.mempool[old]["hash"])
+                self.known.add(h)
+                self.mempool[old] = entry
+                return h
+            self.known.add(h)
+            queued[tx["nonce"]] = entry
+            # like geth: future nonces wait in the queue until the gap is filled
+            while expected in queued:
+                self.mempool.append(queued.pop(expected))
+                expected += 1
+            self.nonces[sender] = expected
+        if self.block_time <= 0:
+            self.mine()  # instant-seal mode
+        return h
+
+    def call(self, method: str, params: list):
+        if method == "eth_chainId":
+            return hex(self.chain_id)
+        if method == "net_version":
+            return str(self.chain_id)
+        if method == "web3_clientVersion":
+            return "slh-devnet/0"
+        if method == "eth_blockNumber":
+            return hex(self.block)
+        if method == "eth_getTransactionCount":
+            addr = params[0].lower()
+            with self.lock:
+                n = self.nonces.get(addr, 0)
+                if len(params) < 2 or params[1] != "pending":
+                    n -= sum(1 for t in self.mempool if t["from"] == addr)
+            return hex(n)
+        if method == "eth_sendRawTransaction":
+            return self.send_raw(params[0])
+        if method == "eth_getTransactionByHash":
+            h = params[0].lower()
+            with self.lock:
+                rc = self.receipts.get(h)
+                if rc is not None:
+                    return {"hash": h, "from": rc["from"], "to": rc["to"], "blockNumber": rc["blockNumber"],
+                            "blockHash": rc["blockHash"], "transactionIndex": rc["transactionIndex"]}
+                waiting = self.mempool + [t for q in self.queued.values() for t in q.values()]
+                tx = next((t for t in waiting if t["hash"] == h), None)
+            return tx and {"hash": h, "from": tx["from"], "to": tx["to"], "nonce": hex(tx["nonce"]), "blockNumber": None}
+        if method == "eth_getTransactionReceipt":
+            h = params[0].lower()
+            return self.receipts.get(h if h.startswith("0x") else "0x" + h)
+        if method in ("eth_gasPrice", "eth_maxPriorityFeePerGas"):
+            return hex(max(self.min_tip, Web3.to_wei(1, "gwei")))
+        if method == "eth_feeHistory":
+            n, newest = int(params[0], 16) if isinstance(params[0], str) else int(params[0]), _blk(params[1], self.block)
+            n = max(1, min(n, newest))
+            tip = max(self.min_tip, Web3.to_wei(1, "gwei"))
+            pcts = params[2] if len(params) > 2 else []
+            return {"oldestBlock": hex(newest - n + 1), "baseFeePerGas": ["0x0"] * (n + 1),
+                    "gasUsedRatio": [0.5] * n, "reward": [[hex(tip)] * len(pcts) for _ in range(n)]}
+        if method == "eth_estimateGas":
+            return hex(120000)
+        if method == "eth_getBlockByNumber":
+            n = _blk(params[0] if params else "latest", self.block)
+            if n > self.block:
+                return None
+            return {"number": hex(n), "hash": self.block_hash(n), "parentHash": self.block_hash(n - 1),
+                    "baseFeePerGas": "0x0", "timestamp": hex(int(time.time())), "transactions": []}
+        if method == "eth_getLogs":
+            return self.get_logs(params[0] if params else {})
+        if method == "eth_getCode":
+            return "0x00" if params[0].lower() in (MULTICALL3, self.nft_contract) else "0x"
+        if method == "eth_call":
+            tx = params[0]
+            ok, out = self.eth_call((tx.get("to") or "").lower(), bytes.fromhex((tx.get("data") or tx.get("input") or "0x")[2:]))
+            if not ok:
+                raise _RPCError(3, "execution reverted")
+            return "0x" + out.hex()
+        raise _RPCError(-32601, f"method not supported: {method}")
+
+    def eth_call(self, to: str, data: bytes):
+        """(success, return data) for the NFT views and Multicall3 ``aggregate3``."""
+        if to == MULTICALL3 and data[:4] == SEL_AGGREGATE3:
+            res = []
+            for target, allow_failure, cd in decode(["(address,bool,bytes)[]"], data[4:])[0]:
+                ok, out = self.eth_call(target.lower(), bytes(cd))
+                if not ok and not allow_failure:
+                    return False, b""
+                res.append((ok, out))
+            return True, encode(["(bool,bytes)[]"], [res])
+        if to != self.nft_contract or len(data) < 36:
+            return True, b""
+        tok = self.tokens.get(int.from_bytes(data[4:36], "big"))
+        if tok is None:
+            return False, b""
+        if data[:4] == SEL_OWNER_OF:
+            return True, encode(["address"], [tok["owner"]])
+        if data[:4] == SEL_TOKEN_URI:
+            return True, encode(["string"], [tok["uri"]])
+        return False, b""
+
+
+def _blk(tag, latest: int) -> int:
+    if tag in (None, "latest", "pending", "safe", "finalized"):
+        return latest
+    if tag == "earliest":
+        return 0
+    return int(tag, 16) if isinstance(tag, str) else int(tag)
+
+
+class _RPCError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code, self.message = code, message
+
+
+class StandInRPC:
+    """One HTTP JSON-RPC endpoint in front of a Chain, with injectable latency/errors."""
+
+    def __init__(self, chain: Chain, host: str = "127.0.0.1", port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, http_error: bool = True):
+        self.chain = chain
+        self.latency, self.jitter, self.error_rate, self.http_error = latency, jitter, error_rate, http_error
+        self.requests = 0
+        self.methods: Dict[str, int] = {}
+        srv = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+                srv.requests += 1
+                delay = srv.latency + (random.random() * srv.jitter if srv.jitter else 0.0)
+                if delay:
+                    time.sleep(delay)
+                if srv.error_rate and random.random() < srv.error_rate:
+                    if srv.http_error:
+                        return self._reply(503, {"error": "injected"})
+                    return self._reply(200, {"jsonrpc": "2.0", "id": None, "error": {"code": -32005, "message": "rate limit (injected)"}})
+                out = [srv._one(q) for q in body] if isinstance(body, list) else srv._one(body)
+                self._reply(200, out)
+
+            def _reply(self, code, obj):
+                b = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(b)))
+                self.end_headers()
+                self.wfile.write(b)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_port}"
+        self._thread: Optional[threading.Thread] = None
+
+    def _one(self, q: dict) -> dict:
+        method = q.get("method", "")
+        self.methods[method] = self.methods.get(method, 0) + 1
+        try:
+            return {"jsonrpc": "2.0", "id": q.get("id"), "result": self.chain.call(method, q.get("params") or [])}
+        except _RPCError as e:
+            return {"jsonrpc": "2.0", "id": q.get("id"), "error": {"code": e.code, "message": e.message}}
+        except Exception as e:
+            return {"jsonrpc": "2.0", "id": q.get("id"), "error": {"code": -32603, "message": f"internal error: {e}"}}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=f"devnet-{self.httpd.server_port}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SLH stand-in JSON-RPC node")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8545)
+    ap.add_argument("--chain-id", type=int, default=97)
+    ap.add_argument("--block-time", type=float, default=3.0)
+    ap.add_argument("--nft-contract", default="0x8AD1de67648dB44B1b1D0E3475485910CedDe90b")
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--min-tip-gwei", type=float, default=0.0, help="txs tipping less stay pending")
+    a = ap.parse_args()
+    chain = Chain(a.chain_id, a.block_time, a.nft_contract, Web3.to_wei(a.min_tip_gwei, "gwei")).start()
+    srv = StandInRPC(chain, a.host, a.port, a.latency, a.jitter, a.error_rate)
+    print(f"stand-in RPC on {srv.url} (chain {a.chain_id}, block {a.block_time}s)")
+    srv.httpd.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Fixed-capacity event ring with wallet / type / tx-hash indexes.
+
+Events live in a preallocated slot array; the oldest one is overwritten when
+the ring is full, and its index entries are dropped in O(1) (it is always the
+leftmost entry of each index deque). Queries walk the smallest matching index
+newest-first, so ``wallet=0x… type=adm_sell`` costs O(k) for k matches.
+
+``scan_logs`` serves history that already left the ring from the JSON lines
+in the on-disk session logs (plain or gzipped segments). It walks the files
+newest first, reading plain ones backwards in blocks, and stops at ``limit``
+matches, so its cost follows the answer and not the size of the log folder.
+"""
+import calendar, glob, gzip, json, os, re, time
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional
+
+FIELDS = ("ts", "type", "wallet", "token_uri", "mint_tx", "sela_tx", "note")
+
+
+class Event:
+    __slots__ = ("seq",) + FIELDS + ("extra",)
+
+    def __init__(self, seq: int, ev: dict):
+        self.seq = seq
+        for f in FIELDS:
+            setattr(self, f, ev.get(f))
+        extra = {k: v for k, v in ev.items() if k not in FIELDS}
+        self.extra = extra or None
+
+    def get(self, key: str, default=None):
+        v = getattr(self, key, None) if key in FIELDS else (self.extra or {}).get(key)
+        return default if v is None else v
+
+    def as_dict(self) -> dict:
+        d = {f: getattr(self, f) for f in FIELDS if getattr(self, f) is not None}
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+
+def _keys(ev) -> List[tuple]:
+    keys = []
+    if ev.get("wallet"):
+        keys.append(("wallet", str(ev.get("wallet")).lower()))
+    if ev.get("type"):
+        keys.append(("type", str(ev.get("type"))))
+    for f in ("mint_tx", "sela_tx"):
+        tx = ev.get(f)
+        if tx and tx != "-":
+            keys.append(("tx", str(tx).lower()))
+    return keys
+
+
+def matches(ev, wallet: Optional[str] = None, type: Optional[str] = None,
+            tx: Optional[str] = None, since: Optional[int] = None) -> bool:
+    """Filter predicate shared by ring queries and the log scan (``ev`` is an Event or a dict)."""
+    if wallet and str(ev.get("wallet") or "").lower() != wallet.lower():
+        return False
+    if type and ev.get("type") != type:
+        return False
+    if tx and tx.lower() not in (str(ev.get("mint_tx") or "").lower(), str(ev.get("sela_tx") or "").lower()):
+        return False
+    if since is not None and (ev.get("ts") or 0) < since:
+        return False
+    return True
+
+
+class EventRing:
+    def __init__(self, capacity: int = 800):
+        self.capacity = capacity
+        self._slots: List[Optional[Event]] = [None] * capacity
+        self._seq = 0
+        self._index: Dict[tuple, deque] = {}
+
+    def __len__(self) -> int:
+        return min(self._seq, self.capacity)
+
+    @property
+    def evicted(self) -> int:
+        return max(0, self._seq - self.capacity)
+
+    def push(self, ev: dict) -> Event:
+        i = self._seq % self.capacity
+        old = self._slots[i]
+        if old is not None:
+            for k in _keys(old):
+                dq = self._index.get(k)
+                if dq and dq[0] == old.seq:
+                    dq.popleft()
+                    if not dq:
+                        del self._index[k]
+        rec = Event(self._seq, ev)
+        self._slots[i] = rec
+        for k in _keys(rec):
+            self._index.setdefault(k, deque()).append(rec.seq)
+        self._seq += 1
+        return rec
+
+    def _at(self, seq: int) -> Optional[Event]:
+        rec = self._slots[seq % self.capacity]
+        return rec if rec is not None and rec.seq == seq else None
+
+    def __iter__(self) -> Iterator[Event]:
+        """Oldest → newest."""
+        for seq in range(self.evicted, self._seq):
+            yield self._at(seq)
+
+    def query(self, wallet: Optional[str] = None, type: Optional[str] = None, tx: Optional[str] = None,
+              since: Optional[int] = None, limit: int = 20) -> List[Event]:
+        """Newest-first matches, at most ``limit``."""
+        cands = [self._index.get(k, ()) for k in
+                 ((("wallet", wallet.lower()),) if wallet else ()) +
+                 ((("type", type),) if type else ()) +
+                 ((("tx", tx.lower()),) if tx else ())]
+        seqs = reversed(min(cands, key=len)) if cands else range(self._seq - 1, self.evicted - 1, -1)
+        out: List[Event] = []
+        for seq in seqs:
+            rec = self._at(seq)
+            if rec is None:
+                continue
+            if since is not None and (rec.ts or 0) < since:
+                break
+            if matches(rec, wallet, type, tx):
+                out.append(rec)
+                if len(out) >= limit:
+                    break
+        return out
+
+
+def _lines_reversed(path: str, block: int = 64 * 1024) -> Iterator[str]:
+    """Lines of ``path``, last first. Plain files are read backwards in blocks; a gzipped segment
+    (bounded by the rotation size) is read whole."""
+    if path.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8", errors="replace") as f:
+            lines = f.readlines()
+        yield from reversed(lines)
+        return
+    with open(path, "rb") as f:
+        pos, tail = f.seek(0, os.SEEK_END), b""
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            parts = (f.read(step) + tail).split(b"\n")
+            tail = parts[0]  # may continue in the previous block
+            for ln in reversed(parts[1:]):
+                yield ln.decode("utf-8", "replace")
+        yield tail.decode("utf-8", "replace")
+
+
+def _segment_no(path: str) -> int:
+    m = re.search(r"\.(\d+)\.log(?:\.gz)?$", path)
+    return int(m.group(1)) if m else 0
+
+def _age(path: str) -> tuple:
+    try:
+        return os.path.getmtime(path), _segment_no(path)
+    except OSError:
+        return 0.0, 0
+
+
+def scan_logs(directory: str, limit: int, pred: Callable[[dict], bool], pattern: str = "session-*.log*",
+              skip: Optional[Callable[[str, dict], bool]] = None) -> List[dict]:
+    """Newest-first events from session log files that satisfy ``pred``, at most ``limit``.
+
+    ``skip(path, ev)`` drops lines that are still served from memory. Files are walked newest first
+    and older ones are not opened once ``limit`` events are found.
+    """
+    out: List[dict] = []
+    if limit <= 0:
+        return out
+    for path in sorted(glob.glob(os.path.join(directory, pattern)), key=_age, reverse=True):
+        try:
+            for ln in _lines_reversed(path):
+                if not ln.startswith("{"):
+                    continue
+                try:
+                    ev = json.loads(ln)
+                except ValueError:
+                    continue
+                if not isinstance(ev, dict) or "ts" not in ev or "type" not in ev:
+                    continue
+                if skip is not None and skip(path, ev):
+                    continue
+                if pred(ev):
+                    out.append(ev)
+                    if len(out) >= limit:
+                        return out
+        except (OSError, EOFError):
+            continue  # rotated away, or a segment still being compressed
+    return out
+
+
+_REL = re.compile(r"^(\d+)([smhd])$")
+_UNIT = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def parse_since(v: str, now: Optional[float] = None) -> int:
+    """``1697000000`` | ``30m`` / ``2h`` / ``7d`` (ago) | ``2025-10-17`` | ``2025-10-17T12:00`` (UTC)."""
+    v = v.strip()
+    if v.isdigit():
+        return int(v)
+    m = _REL.match(v)
+    if m:
+        return int((now if now is not None else time.time()) - int(m.group(1)) * _UNIT[m.group(2)])
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return calendar.timegm(time.strptime(v, fmt))
+        except ValueError:
+            pass
+    raise ValueError(f"bad since: {v}")
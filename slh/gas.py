@@ -0,0 +1,176 @@
+"""Fee and gas-limit oracle.
+
+A background task follows the head and reads ``eth_feeHistory`` for the
+blocks it has not seen yet, keeping per-block priority-fee percentiles for
+the last ``blocks`` blocks. ``fees()`` answers from that snapshot with no RPC:
+
+* tip      = median over the window of the speed's percentile (slow p10,
+             standard p50, fast p90), floored at ``min_tip``;
+* max fee  = ``base_multiplier`` x next base fee + tip, capped at ``max_fee``.
+
+Gas limits are estimated once per call shape (target, selector, calldata
+length) and cached with a safety margin. ``bump()`` prices a same-nonce
+replacement for a stuck transaction.
+"""
+import asyncio, logging, math, os, statistics
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+from web3 import Web3
+
+from slh.treasury import fee_fields
+
+logger = logging.getLogger("slh.gas")
+
+PERCENTILES = {"slow": 10, "standard": 50, "fast": 90}
+BUMP = 1.125  # nodes require >= +10% on both fee fields to accept a replacement
+
+
+class FeeSnapshot(NamedTuple):
+    block: int
+    base_fee: int          # base fee of the next block
+    tips: Dict[str, int]   # speed -> priority fee (wei)
+
+
+class GasOracle:
+    def __init__(self, call: Callable[[str, list], Awaitable], speed: str = "standard", blocks: int = 20,
+                 poll_interval: float = 3.0, base_multiplier: float = 2.0, min_tip: int = 0,
+                 max_fee: Optional[int] = None, estimate_margin: float = 1.2, max_shapes: int = 1024):
+        if speed not in PERCENTILES:
+            raise ValueError(f"bad speed: {speed}")
+        self._call = call
+        self.speed = speed
+        self.blocks = max(1, blocks)
+        self.poll_interval = poll_interval
+        self.base_multiplier = base_multiplier
+        self.min_tip = min_tip
+        self.max_fee = max_fee
+        self.estimate_margin = estimate_margin
+        self.max_shapes = max_shapes
+        self.snapshot: Optional[FeeSnapshot] = None
+        self._rewards: Dict[int, list] = {}  # block -> [p10, p50, p90]
+        self._estimates: "OrderedDict[tuple, int]" = OrderedDict()
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- fees ----------
+    def fees(self, speed: Optional[str] = None) -> dict:
+        """EIP-1559 fee fields from the last snapshot (static MAX_FEE_GWEI/MAX_PRIO_FEE_GWEI until warm)."""
+        snap = self.snapshot
+        if snap is None:
+            return fee_fields(Web3)
+        tip = max(snap.tips[speed or self.speed], self.min_tip)
+        max_fee = int(snap.base_fee * self.base_multiplier) + tip
+        if self.max_fee is not None and max_fee > self.max_fee:
+            max_fee = self.max_fee
+            tip = min(tip, max_fee)
+        return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": tip}
+
+    async def current(self, speed: Optional[str] = None) -> dict:
+        self._ensure_task()
+        if self.snapshot is None:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("[GAS] fee history unavailable, static fees | %s", e)
+        return self.fees(speed)
+
+    def bump(self, old: dict) -> Optional[dict]:
+        """Replacement fees for a stuck tx (>= +12.5% and at least the current quote); None once over the cap."""
+        cur = self.fees("fast")
+        tip = max(math.ceil(old["maxPriorityFeePerGas"] * BUMP), cur["maxPriorityFeePerGas"])
+        max_fee = max(math.ceil(old["maxFeePerGas"] * BUMP), cur["maxFeePerGas"], tip)
+        if self.max_fee is not None and max_fee > self.max_fee:
+            return None
+        return {"maxFeePerGas": max_fee, "maxPriorityFeePerGas": tip}
+
+    async def refresh(self) -> FeeSnapshot:
+        head = int(await self._call("eth_blockNumber", []), 16)
+        snap = self.snapshot
+        if snap is not None and head <= snap.block:
+            return snap
+        n = min(self.blocks, head - snap.block) if snap is not None else self.blocks
+        fh = await self._call("eth_feeHistory", [hex(n), hex(head), sorted(PERCENTILES.values())])
+        oldest = int(fh["oldestBlock"], 16)
+        for i, rw in enumerate(fh.get("reward") or ()):
+            if (fh.get("gasUsedRatio") or [1])[i] > 0:  # empty blocks report 0 tips
+                self._rewards[oldest + i] = [int(x, 16) for x in rw]
+        for b in [b for b in self._rewards if b <= head - self.blocks]:
+            del self._rewards[b]
+        cols = list(zip(*self._rewards.values())) if self._rewards else [(0,)] * len(PERCENTILES)
+        tips = {speed: int(statistics.median(cols[k])) for k, speed in enumerate(PERCENTILES)}
+        self.snapshot = FeeSnapshot(head, int(fh["baseFeePerGas"][-1], 16), tips)
+        logger.debug("[GAS] block=%s base=%s tips=%s", head, self.snapshot.base_fee, tips)
+        return self.snapshot
+
+    # ---------- gas limits ----------
+    async def estimate(self, tx: dict, sender: str) -> int:
+        """Gas limit for ``tx`` (to/data), estimated once per call shape."""
+        data = tx.get("data") or "0x"
+        if isinstance(data, (bytes, bytearray)):
+            data = Web3.to_hex(data)
+        key = (str(tx.get("to", "")).lower(), data[:10], (len(data) - 2 + 63) // 64)
+        limit = self._estimates.get(key)
+        if limit is not None:
+            self._estimates.move_to_end(key)
+            return limit
+        fut = self._inflight.get(key)
+        if fut is not None:
+            return await asyncio.shield(fut)
+        fut = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            est = int(await self._call("eth_estimateGas", [{"from": sender, "to": tx.get("to"), "data": data,
+                                                             "value": hex(int(tx.get("value") or 0))}]), 16)
+            limit = int(est * self.estimate_margin)
+            self._estimates[key] = limit
+            while len(self._estimates) > self.max_shapes:
+                self._estimates.popitem(last=False)
+            logger.info("[GAS] estimate to=%s sel=%s est=%s limit=%s", key[0], key[1], est, limit)
+            fut.set_result(limit)
+            return limit
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # retrieved here; followers re-raise it
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    # ---------- lifecycle ----------
+    def _ensure_task(self):
+        if self.poll_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="gas-oracle")
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("[GAS] fee history refresh failed | %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def oracle_from_env(call: Callable[[str, list], Awaitable]) -> Optional[GasOracle]:
+    """GAS_ORACLE=0 keeps the static MAX_FEE_GWEI/MAX_PRIO_FEE_GWEI fees and fixed gas limits."""
+    if os.environ.get("GAS_ORACLE", "1").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    cap = os.environ.get("GAS_MAX_FEE_GWEI", "50")
+    return GasOracle(
+        call,
+        speed=os.environ.get("GAS_SPEED", "standard"),
+        blocks=int(os.environ.get("GAS_HISTORY_BLOCKS", "20")),
+        poll_interval=float(os.environ.get("GAS_POLL_SECONDS", "3")),
+        min_tip=Web3.to_wei(os.environ.get("GAS_MIN_TIP_GWEI", "1"), "gwei"),
+        max_fee=Web3.to_wei(cap, "gwei") if cap else None,
+        estimate_margin=float(os.environ.get("GAS_ESTIMATE_MARGIN", "1.2")),
+    )
@@ -0,0 +1,166 @@
+"""Idempotency-Key store for the write routes (SQLite, WAL mode).
+
+A key is claimed once with the hash of its request (route + body). While the
+first request runs the key is ``pending``; once a transaction is accepted the
+response is stored and every retry with the same key gets it back instead of
+a second transaction. A send that fails before any node accepted it
+releases the key, so the client can simply try again.
+
+    rec = store.begin(key, request_hash("/v1/chain/mint-demo", body))
+    if rec is None:            # first time: do the work
+        store.attempt(key, nonce, tx_hash)   # before each broadcast
+        store.complete(key, response)
+    elif rec["state"] == "done":
+        return rec["response"]
+    elif rec["state"] == "stale":          # owner died mid-send: the key is ours now
+        ...                                # look up rec["txs"] on chain before sending again
+
+A pending claim holds a lease (``lease`` seconds, renewed by ``attempt``). A
+claim whose lease ran out belongs to a process that crashed or was redeployed
+between ``begin`` and ``complete``; the next ``begin`` takes it over and gets
+the (nonce, tx hash) of every transaction the dead owner signed.
+
+Keys expire after ``ttl`` seconds (``IDEMPOTENCY_TTL_HOURS``, default 24).
+"""
+import hashlib, json, logging, os, sqlite3, threading, time
+from typing import Optional
+
+logger = logging.getLogger("slh.idempotency")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key           TEXT PRIMARY KEY,
+    request_hash  TEXT NOT NULL,
+    state         TEXT NOT NULL DEFAULT 'pending',
+    response      TEXT,
+    created_at    INTEGER NOT NULL,
+    updated_at    INTEGER NOT NULL,
+    lease_until   INTEGER NOT NULL DEFAULT 0,
+    txs           TEXT
+);
+CREATE INDEX IF NOT EXISTS idempotency_created ON idempotency(created_at);
+"""
+_COLUMNS = {"lease_until": "INTEGER NOT NULL DEFAULT 0", "txs": "TEXT"}  # added to stores created before leases
+
+_PURGE_EVERY = 60.0
+
+
+class KeyReused(ValueError):
+    """The key was already used for a different request."""
+
+
+def request_hash(route: str, body) -> str:
+    payload = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{route}\n{payload}".encode()).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, path: str, ttl: float = 86400.0, lease: float = 60.0):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._purged = 0.0
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+        have = {r["name"] for r in self._db.execute("PRAGMA table_info(idempotency)")}
+        for col, decl in _COLUMNS.items():
+            if col not in have:
+                self._db.execute(f"ALTER TABLE idempotency ADD COLUMN {col} {decl}")
+
+    def begin(self, key: str, req_hash: str) -> Optional[dict]:
+        """Claim ``key``: None if it is new, else ``{"state", "response", "txs", "retry_after"}``.
+
+        ``state`` is ``done``, ``pending`` (another request holds the lease for
+        ``retry_after`` more seconds) or ``stale`` (its lease ran out and the
+        claim now belongs to the caller, which must resolve ``txs`` first).
+        """
+        now = int(time.time())
+        lease_until = now + int(self.lease)
+        with self._lock:
+            self._purge_locked(now)
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO idempotency(key,request_hash,created_at,updated_at,lease_until) VALUES (?,?,?,?,?)",
+                (key, req_hash, now, now, lease_until))
+            if cur.rowcount == 1:
+                return None
+            row = self._db.execute("SELECT request_hash, state, response, lease_until, txs FROM idempotency WHERE key=?",
+                                   (key,)).fetchone()
+            if row["request_hash"] != req_hash:
+                raise KeyReused(key)
+            state, held_until = row["state"], row["lease_until"]
+            if state == "pending" and held_until <= now:
+                # conditional on the old lease: of several processes retrying at once, one takes over
+                cur = self._db.execute("UPDATE idempotency SET lease_until=?, updated_at=? WHERE key=? AND state='pending'"
+                                       " AND lease_until=?", (lease_until, now, key, held_until))
+                if cur.rowcount == 1:
+                    state = "stale"
+                    logger.warning("[IDEM] taking over %s: its lease ran out", key)
+                else:
+                    held_until = lease_until
+        return {"state": state, "response": json.loads(row["response"]) if row["response"] else None,
+                "txs": [tuple(t) for t in json.loads(row["txs"] or "[]")],
+                "retry_after": max(1, held_until - now) if state == "pending" else 0}
+
+    def attempt(self, key: str, nonce: int, tx_hash: str):
+        """Record a signed tx before it is broadcast, and renew the lease."""
+        now = int(time.time())
+        with self._lock:
+            row = self._db.execute("SELECT txs FROM idempotency WHERE key=? AND state='pending'", (key,)).fetchone()
+            if row is None:
+                return
+            txs = json.loads(row["txs"] or "[]") + [[nonce, tx_hash]]
+            self._db.execute("UPDATE idempotency SET txs=?, lease_until=?, updated_at=? WHERE key=?",
+                             (json.dumps(txs), now + int(self.lease), now, key))
+
+    def complete(self, key: str, response: dict):
+        """Store (or refresh, e.g. once the receipt is in) the response replayed for ``key``."""
+        with self._lock:
+            self._db.execute("UPDATE idempotency SET state='done', response=?, updated_at=? WHERE key=?",
+                             (json.dumps(response, ensure_ascii=False), int(time.time()), key))
+
+    def release(self, key: str):
+        """Give up a pending claim (e.g. the send failed).
+
+        Forgotten if nothing was signed; otherwise the lease is dropped, so the next
+        request takes it over and checks the recorded txs before sending again.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM idempotency WHERE key=? AND state='pending' AND txs IS NULL", (key,))
+            self._db.execute("UPDATE idempotency SET lease_until=0 WHERE key=? AND state='pending'", (key,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM idempotency GROUP BY state").fetchall()
+        return {s: n for s, n in rows}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _purge_locked(self, now: int):
+        if now - self._purged < _PURGE_EVERY:
+            return
+        self._purged = now
+        n = self._db.execute("DELETE FROM idempotency WHERE created_at < ?", (now - int(self.ttl),)).rowcount
+        if n:
+            logger.info("[IDEM] purged %s expired key(s)", n)
+
+
+def store_from_env() -> Optional[IdempotencyStore]:
+    """IDEMPOTENCY_DB (default idempotency.sqlite); empty or 0 turns Idempotency-Key handling off.
+
+    IDEMPOTENCY_LEASE_SECONDS=60: how long a pending claim survives without progress before a retry takes it over.
+    """
+    path = os.environ.get("IDEMPOTENCY_DB", "idempotency.sqlite").strip()
+    if path.lower() in ("", "0", "off", "false", "no"):
+        return None
+    return IdempotencyStore(path, ttl=float(os.environ.get("IDEMPOTENCY_TTL_HOURS", "24")) * 3600,
+                            lease=float(os.environ.get("IDEMPOTENCY_LEASE_SECONDS", "60")))
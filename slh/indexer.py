@@ -0,0 +1,299 @@
+"""Incremental ERC-721 ``Transfer`` indexer with a local SQLite ownership store.
+
+Scans ``Transfer(address,address,uint256)`` logs of one contract with chunked
+``eth_getLogs`` and keeps every transfer plus a derived tokenId → owner /
+mint tx / block table. Each pass re-scans the last ``confirmations`` blocks
+(rewinding further if the checkpoint block hash changed), so reorged-out
+transfers are replaced by the canonical ones.
+
+    python -m slh.indexer sync
+    python -m slh.indexer owner 17
+    python -m slh.indexer wallet 0x…
+"""
+import argparse, json, logging, os, sqlite3, threading, time
+from typing import List, Optional, Tuple
+
+from web3 import Web3
+
+from slh import abi
+from slh.receipts import TRANSFER_TOPIC
+from slh.viewcache import invalidate_token
+
+logger = logging.getLogger("slh.indexer")
+
+ZERO_ADDR = "0x" + "00" * 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transfers (
+    contract   TEXT NOT NULL,
+    block      INTEGER NOT NULL,
+    log_index  INTEGER NOT NULL,
+    tx         TEXT NOT NULL,
+    token_id   INTEGER NOT NULL,
+    from_addr  TEXT NOT NULL,
+    to_addr    TEXT NOT NULL,
+    PRIMARY KEY (contract, block, log_index)
+);
+CREATE INDEX IF NOT EXISTS transfers_token ON transfers(contract, token_id);
+CREATE INDEX IF NOT EXISTS transfers_to ON transfers(contract, to_addr);
+CREATE INDEX IF NOT EXISTS transfers_tx ON transfers(tx);
+CREATE TABLE IF NOT EXISTS tokens (
+    contract    TEXT NOT NULL,
+    token_id    INTEGER NOT NULL,
+    owner       TEXT NOT NULL,
+    mint_tx     TEXT,
+    mint_block  INTEGER,
+    last_tx     TEXT NOT NULL,
+    last_block  INTEGER NOT NULL,
+    PRIMARY KEY (contract, token_id)
+);
+CREATE INDEX IF NOT EXISTS tokens_owner ON tokens(contract, owner);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    contract    TEXT PRIMARY KEY,
+    block       INTEGER NOT NULL,
+    block_hash  TEXT,
+    updated_at  INTEGER NOT NULL
+);
+"""
+
+# RPC complaints that mean "ask for a smaller block range"
+_RANGE_ERRORS = ("limit", "range", "too many", "exceed", "timeout", "response size")
+
+
+class TransferIndex:
+    """SQLite store (WAL) shared by the indexer thread and readers."""
+
+    def __init__(self, path: str):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def checkpoint(self, contract: str) -> Optional[Tuple[int, Optional[str]]]:
+        with self._lock:
+            row = self._db.execute("SELECT block, block_hash FROM checkpoints WHERE contract=?",
+                                   (contract.lower(),)).fetchone()
+        return (row["block"], row["block_hash"]) if row else None
+
+    def apply(self, contract: str, from_block: int, to_block: int, to_hash: Optional[str], logs: List[tuple]):
+        """Replace transfers in [from_block, ∞) with ``logs`` and move the checkpoint to ``to_block``.
+
+        ``logs`` items: (block, log_index, tx, token_id, from_addr, to_addr). Returns the
+        tokenIds whose ownership may have changed (new and rewound transfers).
+        """
+        c = contract.lower()
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                touched = {r[0] for r in db.execute(
+                    "SELECT DISTINCT token_id FROM transfers WHERE contract=? AND block>=?", (c, from_block))}
+                db.execute("DELETE FROM transfers WHERE contract=? AND block>=?", (c, from_block))
+                db.executemany("INSERT OR REPLACE INTO transfers VALUES (?,?,?,?,?,?,?)",
+                               [(c,) + tuple(lg) for lg in logs])
+                touched.update(lg[3] for lg in logs)
+                for tid in touched:
+                    self._refresh_token(c, tid)
+                db.execute("INSERT OR REPLACE INTO checkpoints VALUES (?,?,?,?)",
+                           (c, to_block, to_hash, int(time.time())))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return touched
+
+    def _refresh_token(self, c: str, tid: int):
+        db = self._db
+        last = db.execute("SELECT * FROM transfers WHERE contract=? AND token_id=? ORDER BY block DESC, log_index DESC LIMIT 1",
+                          (c, tid)).fetchone()
+        if last is None:
+            db.execute("DELETE FROM tokens WHERE contract=? AND token_id=?", (c, tid))
+            return
+        mint = db.execute("SELECT tx, block FROM transfers WHERE contract=? AND token_id=? AND from_addr=? "
+                          "ORDER BY block, log_index LIMIT 1", (c, tid, ZERO_ADDR)).fetchone()
+        db.execute("INSERT OR REPLACE INTO tokens VALUES (?,?,?,?,?,?,?)",
+                   (c, tid, last["to_addr"], mint["tx"] if mint else None, mint["block"] if mint else None,
+                    last["tx"], last["block"]))
+
+    # ---------- queries ----------
+    def _rows(self, sql: str, args: tuple) -> List[dict]:
+        with self._lock:
+            return [dict(r) for r in self._db.execute(sql, args).fetchall()]
+
+    def token(self, contract: str, token_id: int) -> Optional[dict]:
+        rows = self._rows("SELECT * FROM tokens WHERE contract=? AND token_id=?", (contract.lower(), token_id))
+        return rows[0] if rows else None
+
+    def token_by_tx(self, contract: str, tx: str) -> Optional[dict]:
+        """Token minted (or last moved) by transaction ``tx``."""
+        rows = self._rows("SELECT token_id FROM transfers WHERE contract=? AND tx=? ORDER BY log_index LIMIT 1",
+                          (contract.lower(), _norm_tx(tx)))
+        return self.token(contract, rows[0]["token_id"]) if rows else None
+
+    def tokens_of(self, contract: str, wallet: str) -> List[dict]:
+        """Tokens currently owned by ``wallet``."""
+        return self._rows("SELECT * FROM tokens WHERE contract=? AND owner=? ORDER BY token_id",
+                          (contract.lower(), wallet.lower()))
+
+    def received_by(self, contract: str, wallet: str) -> List[dict]:
+        """Every transfer ``wallet`` ever received (mints included), oldest first."""
+        return self._rows("SELECT * FROM transfers WHERE contract=? AND to_addr=? ORDER BY block, log_index",
+                          (contract.lower(), wallet.lower()))
+
+    def stats(self, contract: str) -> dict:
+        c = contract.lower()
+        with self._lock:
+            tokens = self._db.execute("SELECT COUNT(*) FROM tokens WHERE contract=?", (c,)).fetchone()[0]
+            transfers = self._db.execute("SELECT COUNT(*) FROM transfers WHERE contract=?", (c,)).fetchone()[0]
+        cp = self.checkpoint(c)
+        return {"tokens": tokens, "transfers": transfers, "block": cp[0] if cp else None}
+
+
+def _norm_tx(tx: str) -> str:
+    tx = tx.lower()
+    return tx if tx.startswith("0x") else "0x" + tx
+
+def _parse_log(lg) -> Optional[tuple]:
+    ev = abi.decode_log(lg, names=("Transfer",))
+    if ev is None or "tokenId" not in ev.args:  # ERC-20 Transfer has the amount in data, not an indexed tokenId
+        return None
+    a = ev.args
+    return ev.block, ev.log_index, ev.tx_hash, a["tokenId"], a["from"], a["to"]
+
+
+class TransferIndexer:
+    def __init__(self, w3: Web3, contract: str, index: TransferIndex, start_block: Optional[int] = None,
+                 chunk: int = 5000, confirmations: int = 12):
+        self.w3 = w3
+        self.contract = Web3.to_checksum_address(contract)
+        self.index = index
+        self.start_block = start_block
+        self.chunk = chunk
+        self.confirmations = max(1, confirmations)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _block_hash(self, n: int) -> Optional[str]:
+        blk = self.w3.eth.get_block(n)
+        return Web3.to_hex(blk["hash"]).lower() if blk and blk.get("hash") is not None else None
+
+    def _resume_from(self, head: int) -> int:
+        cp = self.index.checkpoint(self.contract)
+        floor = self.start_block or 0
+        if cp is None:
+            if self.start_block is None:
+                logger.warning("[INDEX] no NFT_INDEX_START_BLOCK; indexing forward from head %s", head)
+                return head
+            return self.start_block
+        last, h = cp
+        rewind = self.confirmations
+        if h is not None and last <= head and self._block_hash(last) != h:
+            rewind = 4 * self.confirmations
+            logger.warning("[INDEX] reorg detected at block %s; rewinding %s blocks", last, rewind)
+        return max(floor, min(last, head) - rewind + 1)
+
+    def _get_logs(self, lo: int, hi: int) -> list:
+        return self.w3.eth.get_logs({"address": self.contract, "fromBlock": lo, "toBlock": hi,
+                                     "topics": [TRANSFER_TOPIC]})
+
+    def sync_once(self) -> int:
+        """Index up to the current head; returns the number of transfers written."""
+        head = self.w3.eth.block_number
+        lo = self._resume_from(head)
+        written, step = 0, self.chunk
+        while lo <= head:
+            hi = min(head, lo + step - 1)
+            try:
+                raw = self._get_logs(lo, hi)
+            except Exception as e:
+                if step > 1 and any(s in str(e).lower() for s in _RANGE_ERRORS):
+                    step = max(1, step // 2)
+                    logger.info("[INDEX] getLogs %s-%s refused (%s); chunk -> %s", lo, hi, e, step)
+                    continue
+                raise
+            logs = [p for p in (_parse_log(lg) for lg in raw) if p is not None]
+            touched = self.index.apply(self.contract, lo, hi, self._block_hash(hi), logs)
+            wallets = {a for lg in logs for a in lg[4:6]}
+            for tid in touched:
+                invalidate_token(self.contract, tid, *wallets)
+            written += len(logs)
+            lo = hi + 1
+        if written:
+            logger.info("[INDEX] synced to block %s | %s transfer(s)", head, written)
+        return written
+
+    # ---------- background ----------
+    def start(self, interval: float = 15.0):
+        if self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="nft-indexer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except Exception as e:
+                logger.warning("[INDEX] sync failed: %s", e)
+            self._stop.wait(interval)
+
+
+# ---------- env wiring ----------
+_INDEXER: Optional[TransferIndexer] = None
+_INDEXER_LOCK = threading.Lock()
+
+def indexer_from_env(w3: Web3, start: bool = True) -> Optional[TransferIndexer]:
+    """Process-wide indexer for ``NFT_CONTRACT``; None unless ``NFT_INDEX_DB`` is set."""
+    global _INDEXER
+    path = os.environ.get("NFT_INDEX_DB", "").strip()
+    if not path:
+        return None
+    with _INDEXER_LOCK:
+        if _INDEXER is None:
+            sb = os.environ.get("NFT_INDEX_START_BLOCK", "").strip()
+            _INDEXER = TransferIndexer(
+                w3, os.environ.get("NFT_CONTRACT", "0x8AD1de67648dB44B1b1D0E3475485910CedDe90b"),
+                TransferIndex(path),
+                start_block=int(sb) if sb else None,
+                chunk=int(os.environ.get("NFT_INDEX_CHUNK", "5000")),
+                confirmations=int(os.environ.get("NFT_INDEX_CONFIRMATIONS", "12")),
+            )
+        if start:
+            _INDEXER.start(float(os.environ.get("NFT_INDEX_INTERVAL", "15")))
+    return _INDEXER
+
+
+def main():
+    from slh.rpc import get_w3, rpc_spec_from_env
+    ap = argparse.ArgumentParser(description="SLH NFT Transfer indexer")
+    ap.add_argument("cmd", choices=["sync", "owner", "wallet", "tx", "stats"])
+    ap.add_argument("arg", nargs="?")
+    a = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s | %(message)s")
+    os.environ.setdefault("NFT_INDEX_DB", "nft_index.sqlite")
+    ix = indexer_from_env(get_w3(rpc_spec_from_env("https://bsc-testnet-rpc.publicnode.com")), start=False)
+    if a.cmd == "sync":
+        ix.sync_once()
+        out = ix.index.stats(ix.contract)
+    elif a.cmd == "owner":
+        out = ix.index.token(ix.contract, int(a.arg))
+    elif a.cmd == "wallet":
+        out = {"owned": ix.index.tokens_of(ix.contract, a.arg), "received": ix.index.received_by(ix.contract, a.arg)}
+    elif a.cmd == "tx":
+        out = ix.index.token_by_tx(ix.contract, a.arg)
+    else:
+        out = ix.index.stats(ix.contract)
+    print(json.dumps(out, indent=2))
+
+if __name__ == "__main__":
+    main()
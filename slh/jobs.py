@@ -0,0 +1,202 @@
+"""Durable mint + SELA grant job queue (SQLite, WAL mode).
+
+Job states:
+    queued      accepted, nothing submitted yet
+    mint_sent   mint transaction accepted by a node (``mint_tx`` known), receipt not seen yet
+    minted      mint receipt with status 1; only now is the SELA grant sent
+    grant_sent  SELA grant accepted by a node (``sela_tx`` known), receipt not seen yet
+    confirmed   grant receipt with status 1, job closed (the Telegram notice is best-effort)
+    failed      a tx reverted or timed out (``JobFailed``), or gave up after ``max_attempts``
+
+Each (wallet, tokenURI) pair has one idempotency key, so a repeated request
+returns the existing job instead of minting twice. Open jobs are picked up
+again on boot and resume from the step they reached.
+"""
+import asyncio, logging, os, sqlite3, threading, time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger("slh.jobs")
+
+OPEN_STATES = ("queued", "mint_sent", "minted", "grant_sent")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    key         TEXT NOT NULL UNIQUE,
+    kind        TEXT NOT NULL,
+    wallet      TEXT NOT NULL,
+    token_uri   TEXT,
+    amount      TEXT,
+    note        TEXT,
+    chat_id     INTEGER,
+    update_id   INTEGER,
+    state       TEXT NOT NULL DEFAULT 'queued',
+    mint_tx     TEXT,
+    sela_tx     TEXT,
+    error       TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    created_at  INTEGER NOT NULL,
+    updated_at  INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state);
+CREATE INDEX IF NOT EXISTS jobs_wallet ON jobs(wallet);
+"""
+# names used before receipts were checked; both only ever meant "tx accepted"
+_RENAMED = {"signed": "mint_sent", "sent": "grant_sent"}
+
+
+class JobFailed(Exception):
+    """Permanent failure (reverted or timed-out tx): the job goes to ``failed`` without further attempts."""
+
+
+def job_key(wallet: str, token_uri: str) -> str:
+    return f"{wallet.lower()}|{token_uri}"
+
+
+class JobQueue:
+    def __init__(self, path: str):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+        for old, new in _RENAMED.items():
+            self._db.execute("UPDATE jobs SET state=? WHERE state=?", (new, old))
+
+    def enqueue(self, kind: str, wallet: str, token_uri: str, amount: str = "", note: str = "",
+                chat_id: Optional[int] = None, update_id: Optional[int] = None) -> Tuple[dict, bool]:
+        """Insert a job; returns (job, created).
+
+        A failed job with the same key is re-armed at the step its recorded txs imply, so a
+        mint or grant that already has a hash is never submitted again (its receipt is checked instead).
+        """
+        key, now = job_key(wallet, token_uri), int(time.time())
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO jobs(key,kind,wallet,token_uri,amount,note,chat_id,update_id,created_at,updated_at)"
+                " VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (key, kind, wallet, token_uri, amount, note, chat_id, update_id, now, now))
+            created = cur.rowcount == 1
+            if not created:
+                self._db.execute(
+                    "UPDATE jobs SET state=CASE WHEN COALESCE(mint_tx,'')='' THEN 'queued'"
+                    " WHEN COALESCE(sela_tx,'')='' THEN 'mint_sent' ELSE 'grant_sent' END,"
+                    " attempts=0, error=NULL, chat_id=?, updated_at=? WHERE key=? AND state='failed'",
+                    (chat_id, now, key))
+                created = self._db.execute("SELECT changes()").fetchone()[0] == 1
+            row = self._db.execute("SELECT * FROM jobs WHERE key=?", (key,)).fetchone()
+        return dict(row), created
+
+    def find(self, wallet: str, token_uri: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE key=?", (job_key(wallet, token_uri),)).fetchone()
+        return dict(row) if row else None
+
+    def get(self, job_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id: int, **fields) -> dict:
+        fields["updated_at"] = int(time.time())
+        cols = ", ".join(f"{k}=?" for k in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+            row = self._db.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return dict(row)
+
+    def open_jobs(self) -> List[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM jobs WHERE state IN ({','.join('?' * len(OPEN_STATES))}) ORDER BY id", OPEN_STATES).fetchall()
+        return [dict(r) for r in rows]
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {s: n for s, n in rows}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobRunner:
+    """Drains a JobQueue with bounded concurrency; retries with exponential backoff."""
+
+    def __init__(self, queue: JobQueue, handler: Callable[[dict], Awaitable[None]],
+                 on_failed: Optional[Callable[[dict, BaseException], Awaitable[None]]] = None,
+                 concurrency: int = 4, max_attempts: int = 5, backoff: float = 2.0):
+        self.queue = queue
+        self.handler = handler
+        self.on_failed = on_failed
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._inbox: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._active: set = set()
+
+    async def start(self):
+        self._inbox = asyncio.Queue()
+        resumed = self.queue.open_jobs()
+        for job in resumed:
+            self._inbox.put_nowait(job["id"])
+        if resumed:
+            logger.info("[JOBS] resuming %s open job(s)", len(resumed))
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._work(), name=f"job-worker-{i}") for i in range(self.concurrency)]
+
+    def submit(self, job_id: int):
+        self._inbox.put_nowait(job_id)
+
+    @property
+    def backlog(self) -> int:
+        return self._inbox.qsize() if self._inbox else 0
+
+    async def stop(self):
+        for t in self._workers:
+            t.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self):
+        while True:
+            jid = await self._inbox.get()
+            if jid in self._active:
+                continue
+            job = self.queue.get(jid)
+            if not job or job["state"] not in OPEN_STATES:
+                continue
+            self._active.add(jid)
+            try:
+                await self.handler(job)
+            except asyncio.CancelledError:
+                raise
+            except JobFailed as e:
+                self._fail(job, job["attempts"] + 1, e)
+            except Exception as e:
+                self._retry(job, e)
+            finally:
+                self._active.discard(jid)
+
+    def _retry(self, job: dict, err: BaseException):
+        attempts = job["attempts"] + 1
+        if attempts >= self.max_attempts:
+            return self._fail(job, attempts, err)
+        self.queue.update(job["id"], attempts=attempts, error=str(err))
+        wait = self.backoff * (2 ** (attempts - 1))
+        logger.warning("[JOBS] #%s attempt %s/%s failed: %s | retry in %.1fs", job["id"], attempts, self.max_attempts, err, wait)
+        asyncio.get_running_loop().call_later(wait, self.submit, job["id"])
+
+    def _fail(self, job: dict, attempts: int, err: BaseException):
+        job = self.queue.update(job["id"], state="failed", attempts=attempts, error=str(err))
+        logger.error("[JOBS] #%s failed after %s attempt(s): %s", job["id"], attempts, err)
+        if self.on_failed is not None:
+            asyncio.get_running_loop().create_task(self.on_failed(job, err))
@@ -0,0 +1,138 @@
+"""Buffered session log writer.
+
+``write()`` only enqueues the line; a dedicated thread batches lines, flushes
+them every ``flush_interval`` seconds or ``flush_lines`` lines, and rotates
+the file by size and UTC day. Closed segments are optionally gzipped.
+
+Segments are named ``<prefix>.log``, ``<prefix>.1.log``, ``<prefix>.2.log``…
+(``.gz`` once compressed), so ``<prefix>*.log*`` globs the whole session.
+"""
+import atexit, gzip, logging, os, queue, shutil, threading, time
+from typing import List, Optional
+
+logger = logging.getLogger("slh.logsink")
+
+_FLUSH = object()
+_STOP = object()
+
+
+class LogSink:
+    def __init__(self, directory: str, prefix: str, max_bytes: int = 10 * 1024 * 1024,
+                 flush_lines: int = 200, flush_interval: float = 1.0, gzip_closed: bool = True,
+                 max_queue: int = 100_000):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.gzip_closed = gzip_closed
+        self.dropped = 0
+        self.written = 0
+        self._q: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._seq = 0
+        self._day = time.strftime("%Y%m%d", time.gmtime())
+        self._fh = None
+        self._size = 0
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        name = f"{self.prefix}.log" if self._seq == 0 else f"{self.prefix}.{self._seq}.log"
+        return os.path.join(self.directory, name)
+
+    @property
+    def backlog(self) -> int:
+        """Lines queued for the writer thread."""
+        return self._q.qsize()
+
+    # ---------- producer side (any thread, never blocks) ----------
+    def write(self, line: str):
+        self._ensure_started()
+        try:
+            self._q.put_nowait(line.rstrip() + "\n")
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued so far is on disk."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._q.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        t = self._thread
+        if t is None or not t.is_alive():
+            return
+        self._q.put(_STOP)
+        t.join(timeout)
+
+    # ---------- writer thread ----------
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        buf: List[str] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if isinstance(item, str):
+                buf.append(item)
+                if len(buf) < self.flush_lines and time.monotonic() < deadline:
+                    continue
+            self._write(buf)
+            buf = []
+            deadline = time.monotonic() + self.flush_interval
+            if isinstance(item, tuple) and item[0] is _FLUSH:
+                item[1].set()
+            elif item is _STOP:
+                if self._fh is not None:
+                    self._fh.close()
+                    self._fh = None
+                return
+
+    def _write(self, lines: List[str]):
+        if not lines:
+            return
+        data = "".join(lines).encode("utf-8")
+        try:
+            self._maybe_rotate(len(data))
+            if self._fh is None:
+                self._fh = open(self.path, "ab")
+                self._size = self._fh.tell()
+            self._fh.write(data)
+            self._fh.flush()
+            self._size += len(data)
+            self.written += len(lines)
+        except Exception as e:
+            logger.error("[LOG] write failed (%s lines lost): %s", len(lines), e)
+
+    def _maybe_rotate(self, incoming: int):
+        day = time.strftime("%Y%m%d", time.gmtime())
+        if self._fh is None or (day == self._day and self._size + incoming <= self.max_bytes) or self._size == 0:
+            self._day = day
+            return
+        closed = self.path
+        self._fh.close()
+        self._fh = None
+        self._seq += 1
+        self._day = day
+        if self.gzip_closed:
+            try:
+                with open(closed, "rb") as src, gzip.open(closed + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(closed)
+            except Exception as e:
+                logger.error("[LOG] gzip of %s failed: %s", closed, e)
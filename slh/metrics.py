@@ -0,0 +1,292 @@
+"""Process-wide metrics rendered in the Prometheus text format.
+
+No client library: counters, gauges and histograms with label values, kept
+under one lock per metric so hot paths pay a dict lookup and an add.
+Metrics are get-or-create by name, so modules declare what they use:
+
+    RPC_SECONDS = histogram("slh_rpc_seconds", "JSON-RPC call latency", ("method",))
+    with RPC_SECONDS.labels("eth_call").time():
+        ...
+
+``render()`` produces the ``/metrics`` body; processes without an HTTP app
+(the bot) call ``serve_from_env()`` to expose it on ``METRICS_PORT``.
+"""
+import bisect, functools, logging, math, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger("slh.metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+GAS_BUCKETS = (21_000, 50_000, 100_000, 150_000, 200_000, 300_000, 500_000, 1_000_000)
+
+_REGISTRY: Dict[str, "_Metric"] = {}
+_REG_LOCK = threading.Lock()
+_SERVER: Optional[ThreadingHTTPServer] = None
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Child:
+    __slots__ = ("_m", "_key")
+
+    def __init__(self, metric: "_Metric", key: tuple):
+        self._m, self._key = metric, key
+
+    def inc(self, amount: float = 1.0):
+        self._m._add(self._key, amount)
+
+    def dec(self, amount: float = 1.0):
+        self._m._add(self._key, -amount)
+
+    def set(self, value: float):
+        self._m._set(self._key, value)
+
+    def observe(self, value: float):
+        self._m._observe(self._key, value)
+
+    @contextmanager
+    def time(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._m._observe(self._key, time.perf_counter() - t0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name, self.doc, self.labelnames = name, doc, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+        self._children: Dict[tuple, _Child] = {}
+        self._fn: Optional[Callable] = None
+
+    def labels(self, *values) -> _Child:
+        key = tuple(str(v) for v in values)
+        ch = self._children.get(key)
+        if ch is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            ch = self._children.setdefault(key, _Child(self, key))
+        return ch
+
+    # unlabelled shortcuts
+    def inc(self, amount: float = 1.0):
+        self._add((), amount)
+
+    def dec(self, amount: float = 1.0):
+        self._add((), -amount)
+
+    def set(self, value: float):
+        self._set((), value)
+
+    def observe(self, value: float):
+        self._observe((), value)
+
+    def time(self):
+        return self.labels().time()
+
+    def set_function(self, fn: Callable):
+        """Sample at render time; ``fn`` returns a number, or {label tuple: number} for labelled metrics."""
+        self._fn = fn
+        return self
+
+    def _add(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _set(self, key, value):
+        with self._lock:
+            self._values[key] = float(value)
+
+    def _observe(self, key, value):
+        raise TypeError(f"{self.name} is a {self.kind}")
+
+    def _labelstr(self, key: tuple, extra: str = "") -> str:
+        parts = [f'{n}="{_esc(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def _samples(self):
+        if self._fn is not None:
+            try:
+                got = self._fn()
+            except Exception as e:
+                logger.debug("[METRICS] %s sampler failed: %s", self.name, e)
+                got = None
+            if isinstance(got, dict):
+                return {tuple(str(x) for x in (k if isinstance(k, tuple) else (k,))): v for k, v in got.items()}
+            return {} if got is None else {(): got}
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key, v in sorted(self._samples().items()):
+            yield f"{self.name}{self._labelstr(key)} {_fmt(v)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def _observe(self, key, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            st = self._values.get(key)
+            if st is None:
+                st = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            st[0][i] += 1
+            st[1] += value
+            st[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.doc}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((k, ([*st[0]], st[1], st[2])) for k, st in self._values.items())
+        for key, (counts, total, n) in items:
+            cum = 0
+            for le, c in zip(self.buckets, counts):
+                cum += c
+                le_label = 'le="%s"' % _fmt(le)
+                yield f"{self.name}_bucket{self._labelstr(key, le_label)} {cum}"
+            yield f"{self.name}_sum{self._labelstr(key)} {_fmt(total)}"
+            yield f"{self.name}_count{self._labelstr(key)} {n}"
+
+
+def _get(cls, name, doc, labelnames, **kw):
+    with _REG_LOCK:
+        m = _REGISTRY.get(name)
+        if m is None:
+            m = _REGISTRY[name] = cls(name, doc, labelnames, **kw)
+        elif not isinstance(m, cls) or m.labelnames != tuple(labelnames):
+            raise ValueError(f"metric {name} already registered with another type/labels")
+        return m
+
+def counter(name: str, doc: str, labelnames: Sequence[str] = ()) -> Counter:
+    return _get(Counter, name, doc, labelnames)
+
+def gauge(name: str, doc: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return _get(Gauge, name, doc, labelnames)
+
+def histogram(name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return _get(Histogram, name, doc, labelnames, buckets=buckets)
+
+
+def render() -> str:
+    with _REG_LOCK:
+        metrics = list(_REGISTRY.values())
+    lines = []
+    for m in metrics:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ---------- shared metrics ----------
+RPC_SECONDS = histogram("slh_rpc_seconds", "JSON-RPC call latency by method", ("method",))
+RPC_ERRORS = counter("slh_rpc_errors_total", "JSON-RPC calls that failed (transport or node error)", ("method",))
+RETRIES = counter("slh_retries_total", "Retries, hedges and failovers by operation", ("op",))
+EXECUTOR_INFLIGHT = gauge("slh_executor_inflight", "Work items submitted and not finished", ("pool",))
+EXECUTOR_WORKERS = gauge("slh_executor_workers", "Worker threads allowed", ("pool",))
+
+TG_SECONDS = histogram("slh_tg_handler_seconds", "Telegram handler latency", ("handler",))
+TG_ERRORS = counter("slh_tg_handler_errors_total", "Telegram handlers that raised", ("handler",))
+
+
+def timed_handler(name: str, fn):
+    """Wrap a PTB callback so it feeds ``slh_tg_handler_seconds{handler=name}``."""
+    hist, errs = TG_SECONDS.labels(name), TG_ERRORS.labels(name)
+
+    @functools.wraps(fn)
+    async def run(update, context):
+        t0 = time.perf_counter()
+        try:
+            return await fn(update, context)
+        except Exception:
+            errs.inc()
+            raise
+        finally:
+            hist.observe(time.perf_counter() - t0)
+    return run
+
+
+class TrackedExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that reports in-flight work (running + queued) against its worker count."""
+
+    def __init__(self, pool: str, max_workers: Optional[int] = None, **kw):
+        super().__init__(max_workers=max_workers, thread_name_prefix=kw.pop("thread_name_prefix", pool), **kw)
+        self._inflight = EXECUTOR_INFLIGHT.labels(pool)
+        EXECUTOR_WORKERS.labels(pool).set(self._max_workers)
+
+    def submit(self, fn, /, *args, **kwargs):
+        self._inflight.inc()
+        fut = super().submit(fn, *args, **kwargs)
+        fut.add_done_callback(lambda _: self._inflight.dec())
+        return fut
+
+
+# ---------- standalone endpoint ----------
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve ``GET /metrics`` from a daemon thread (idempotent)."""
+    global _SERVER
+    if _SERVER is not None:
+        return _SERVER
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    _SERVER = ThreadingHTTPServer((host, port), Handler)
+    _SERVER.daemon_threads = True
+    threading.Thread(target=_SERVER.serve_forever, name="metrics", daemon=True).start()
+    logger.info("[METRICS] serving /metrics on %s:%s", host, port)
+    return _SERVER
+
+def serve_from_env() -> Optional[ThreadingHTTPServer]:
+    port = os.environ.get("METRICS_PORT", "").strip()
+    if not port:
+        return None
+    try:
+        return serve(int(port))
+    except OSError as e:
+        logger.error("[METRICS] cannot listen on %s: %s", port, e)
+        return None
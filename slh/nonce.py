@@ -0,0 +1,112 @@
+"""Process-wide nonce allocator for the treasury account.
+
+Nonces are handed out locally so many transactions can be in flight at once.
+The chain (pending pool included) is only consulted on first use, after a
+"nonce too low"-style rejection, or when a released nonce can no longer be
+reused.
+"""
+import heapq, logging, threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger("slh.nonce")
+
+_NONCE_ERRORS = (
+    "nonce too low",
+    "nonce has already been used",
+    "already known",
+    "known transaction",
+    "replacement transaction underpriced",
+    "invalid nonce",
+)
+
+def is_nonce_error(exc: BaseException) -> bool:
+    msg = str(exc).lower()
+    return any(s in msg for s in _NONCE_ERRORS)
+
+
+class NonceManager:
+    """Thread-safe local nonce counter for a single sender address.
+
+    Lifecycle of a nonce: ``reserve()`` -> ``sent()`` once the node accepted
+    the raw tx, or ``release()`` if it never left the process. Released
+    nonces are reused first so no gap is left behind.
+    """
+
+    def __init__(self, address: str, fetch: Callable[[str], int]):
+        self.address = address
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._next: Optional[int] = None
+        self._stale = True
+        self._reserved: Set[int] = set()
+        self._free: List[int] = []
+
+    def _resync_locked(self, chain: Optional[int] = None) -> None:
+        chain = int(self._fetch(self.address) if chain is None else chain)
+        self._free = [n for n in self._free if n >= chain]
+        heapq.heapify(self._free)
+        nxt = max([chain] + [n + 1 for n in self._reserved])
+        if self._next is not None and nxt != self._next:
+            logger.info("[NONCE] resync %s: local=%s chain=%s -> %s", self.address, self._next, chain, nxt)
+        self._next = nxt
+        self._stale = False
+
+    def resync(self, chain: Optional[int] = None) -> int:
+        """Resync from the chain; async callers pass the pending count they fetched themselves."""
+        with self._lock:
+            self._resync_locked(chain)
+            return self._next
+
+    @property
+    def stale(self) -> bool:
+        return self._stale or self._next is None
+
+    def reserve(self) -> int:
+        with self._lock:
+            if self._stale or self._next is None:
+                self._resync_locked()
+            if self._free:
+                n = heapq.heappop(self._free)
+            else:
+                n = self._next
+                self._next += 1
+            self._reserved.add(n)
+            return n
+
+    def sent(self, nonce: int) -> None:
+        with self._lock:
+            self._reserved.discard(nonce)
+
+    def release(self, nonce: int) -> None:
+        """Give back a nonce whose transaction was never broadcast."""
+        with self._lock:
+            self._reserved.discard(nonce)
+            if self._next is not None and nonce == self._next - 1:
+                self._next -= 1
+            else:
+                heapq.heappush(self._free, nonce)
+
+    def invalidate(self) -> None:
+        """Force a resync from the chain on the next reservation."""
+        with self._lock:
+            self._stale = True
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._reserved)
+
+
+_MANAGERS: Dict[Tuple[int, str], NonceManager] = {}
+_MANAGERS_LOCK = threading.Lock()
+
+def get_nonce_manager(chain_id: int, address: str, fetch: Callable[[str], int]) -> NonceManager:
+    key = (int(chain_id), address.lower())
+    with _MANAGERS_LOCK:
+        mgr = _MANAGERS.get(key)
+        if mgr is None:
+            mgr = _MANAGERS[key] = NonceManager(address, fetch)
+        return mgr
+
+def treasury_nonces(w3, address: str, chain_id: int) -> NonceManager:
+    """Nonce manager for ``address`` that resyncs via ``w3`` (pending pool included)."""
+    return get_nonce_manager(chain_id, address, lambda a: w3.eth.get_transaction_count(a, "pending"))
@@ -0,0 +1,290 @@
+"""Rate-limited outbound Telegram messages.
+
+Handlers enqueue and return; one dispatcher task sends under a global
+token bucket (Telegram allows ~30 msg/s per bot) and a per-chat one (~1/s in
+private chats, 20/min in groups), one call in flight per chat so each chat
+sees its messages in order, chats served round-robin.
+
+    OUTBOX = outbox_from_env(app.bot)
+    OUTBOX.reply(update, "⏳ ...")                        # interactive lane
+    fut = OUTBOX.send(chat_id, "...", lane=BULK)          # airdrop notices
+    OUTBOX.edit(chat_id, fut, "✅ ...")                   # edit what ``fut`` sent
+
+Two lanes: interactive replies always go first, and bulk sends leave
+``bulk_reserve`` tokens of the global bucket untouched, so a broadcast does
+not slow replies down. A 429 holds that chat for ``retry_after`` and pauses
+the bulk lane for as long; the message is retried, not dropped. Edits of the
+same message that are still queued are merged, only the latest text is sent.
+
+Each call returns a future with the API result (the Message); awaiting it is
+optional, failures are logged either way.
+"""
+import asyncio, logging, os, time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
+
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+from slh import metrics
+from slh.ratelimit import TokenBucketLimiter
+
+logger = logging.getLogger("slh.outbox")
+
+INTERACTIVE, BULK = 0, 1
+LANES = ("interactive", "bulk")
+
+OUTBOX_CALLS = metrics.counter("slh_tg_outbox_total", "Outbound Telegram calls by outcome", ("lane", "result"))
+OUTBOX_WAIT = metrics.histogram("slh_tg_outbox_wait_seconds", "Enqueue to delivered", ("lane",))
+OUTBOX_PENDING = metrics.gauge("slh_tg_outbox_pending", "Queued outbound Telegram calls", ("lane",))
+
+_GLOBAL = "*"
+
+
+class _Item:
+    __slots__ = ("chat_id", "method", "kw", "ref", "lane", "fut", "t0", "key", "tries")
+
+    def __init__(self, chat_id, method: str, kw: dict, ref, lane: int, fut: asyncio.Future, key=None):
+        self.chat_id, self.method, self.kw, self.ref, self.lane = chat_id, method, kw, ref, lane
+        self.fut, self.key, self.t0, self.tries = fut, key, time.monotonic(), 0
+
+
+def _retrieve(f: asyncio.Future):
+    if not f.cancelled():
+        f.exception()  # failures are logged by the dispatcher; nobody has to await
+
+def _is_group(chat_id) -> bool:
+    return not isinstance(chat_id, int) or chat_id < 0  # "@channel" names and negative group ids
+
+def _min(a: Optional[float], b: float) -> float:
+    return b if a is None else min(a, b)
+
+def _seconds(v) -> float:
+    return float(v.total_seconds() if hasattr(v, "total_seconds") else v)
+
+
+class Outbox:
+    def __init__(self, bot, rate: float = 25.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 group_per_min: float = 20.0, concurrency: int = 8, bulk_reserve: float = 5.0,
+                 max_pending: int = 10_000, retries: int = 3):
+        self.bot = bot
+        self.bulk_reserve = bulk_reserve
+        self.max_pending = max_pending
+        self.retries = retries
+        self._global = TokenBucketLimiter(rate, burst=rate)
+        self._chat = TokenBucketLimiter(chat_rate, burst=chat_burst)
+        self._group = TokenBucketLimiter(group_per_min / 60, burst=min(group_per_min, chat_burst))
+        self._queues: List["OrderedDict[object, Deque[_Item]]"] = [OrderedDict() for _ in LANES]
+        self._counts = [0] * len(LANES)
+        self._edits: Dict[tuple, _Item] = {}
+        self._busy = set()
+        self._hold: Dict[object, float] = {}
+        self._bulk_hold = 0.0
+        self._concurrency = concurrency
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight = set()
+        OUTBOX_PENDING.set_function(lambda: {(n,): c for n, c in zip(LANES, self._counts)})
+
+    # ---------- public ----------
+    @property
+    def pending(self) -> int:
+        return sum(self._counts) + len(self._inflight)
+
+    def call(self, chat_id, method: str, lane: int = INTERACTIVE, **kw) -> asyncio.Future:
+        """Any ``Bot`` method that takes ``chat_id`` (send_message, send_document, ...)."""
+        return self._put(chat_id, method, kw, None, lane)
+
+    def send(self, chat_id, text: str, lane: int = INTERACTIVE, **kw) -> asyncio.Future:
+        return self._put(chat_id, "send_message", dict(kw, text=text), None, lane)
+
+    def reply(self, update, text: str, lane: int = INTERACTIVE, **kw) -> asyncio.Future:
+        return self.send(update.effective_chat.id, text, lane, **kw)
+
+    def edit(self, chat_id, message, text: str, lane: int = INTERACTIVE, **kw) -> asyncio.Future:
+        """``message``: a Message, its id, or the future returned by ``send``."""
+        key = (chat_id, getattr(message, "message_id", message))
+        queued = self._edits.get(key)
+        if queued is not None:  # not sent yet: newest text and markup win
+            queued.kw = dict(kw, text=text)
+            OUTBOX_CALLS.labels(LANES[queued.lane], "coalesced").inc()
+            return queued.fut
+        return self._put(chat_id, "edit_message_text", dict(kw, text=text), message, lane, key)
+
+    async def close(self, timeout: float = 10.0):
+        """Deliver what is queued (up to ``timeout`` seconds), then stop."""
+        t_end = time.monotonic() + timeout
+        while self.pending and time.monotonic() < t_end:
+            await asyncio.sleep(0.05)
+        left = sum(self._counts)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for t in list(self._inflight):
+            t.cancel()
+        for chats in self._queues:
+            for q in chats.values():
+                for it in q:
+                    it.fut.cancel()
+            chats.clear()
+        self._counts = [0] * len(LANES)
+        self._edits.clear()
+        if left:
+            logger.warning("[TG] outbox closed with %s undelivered message(s)", left)
+
+    # ---------- queue ----------
+    def _put(self, chat_id, method, kw, ref, lane, key=None) -> asyncio.Future:
+        if lane == BULK and self._counts[BULK] >= self.max_pending:
+            raise asyncio.QueueFull(f"outbox bulk lane full ({self.max_pending})")
+        fut = asyncio.get_running_loop().create_future()
+        fut.add_done_callback(_retrieve)
+        it = _Item(chat_id, method, kw, ref, lane, fut, key)
+        if key is not None:
+            self._edits[key] = it
+        self._push(it)
+        return fut
+
+    def _push(self, it: _Item, front: bool = False):
+        chats = self._queues[it.lane]
+        q = chats.get(it.chat_id)
+        if q is None:
+            q = chats[it.chat_id] = deque()
+        q.appendleft(it) if front else q.append(it)
+        self._counts[it.lane] += 1
+        if self._task is None or self._task.done():
+            self._slots = self._slots or asyncio.Semaphore(self._concurrency)
+            self._wake = self._wake or asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="tg-outbox")
+        self._wake.set()
+
+    def _next(self, now: float):
+        """(item, 0) for the next call allowed to go out, else (None, seconds worth sleeping or None)."""
+        g = self._global.peek(_GLOBAL)
+        if g:
+            return None, g
+        wait = None
+        for lane, chats in enumerate(self._queues):
+            if lane == BULK:
+                g = max(self._bulk_hold - now, self._global.peek(_GLOBAL, 1 + self.bulk_reserve))
+                if g > 0:
+                    wait = _min(wait, g)
+                    break
+            for chat, q in chats.items():
+                if chat in self._busy:
+                    continue  # woken when its call finishes
+                ref = q[0].ref
+                if isinstance(ref, asyncio.Future) and not ref.done():
+                    continue  # edit of a message still queued in the other lane
+                w = self._hold.get(chat, 0.0) - now
+                limiter = self._group if _is_group(chat) else self._chat
+                if w <= 0:
+                    w = limiter.peek(chat)
+                if w > 0:
+                    wait = _min(wait, w)
+                    continue
+                limiter.allow(chat)
+                self._global.allow(_GLOBAL)
+                self._hold.pop(chat, None)
+                it = q.popleft()
+                if q:
+                    chats.move_to_end(chat)  # round-robin between chats
+                else:
+                    del chats[chat]
+                self._counts[lane] -= 1
+                if it.key is not None and self._edits.get(it.key) is it:
+                    del self._edits[it.key]
+                return it, 0
+        return None, wait
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            try:
+                while True:
+                    it, wait = self._next(time.monotonic())
+                    if it is not None:
+                        break
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), None if wait is None else max(wait, 0.005))
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._slots.release()
+                raise
+            self._busy.add(it.chat_id)
+            t = loop.create_task(self._deliver(it))
+            self._inflight.add(t)
+            t.add_done_callback(self._inflight.discard)
+
+    # ---------- delivery ----------
+    async def _deliver(self, it: _Item):
+        lane = LANES[it.lane]
+        try:
+            res = await self._invoke(it)
+        except RetryAfter as e:
+            secs = _seconds(e.retry_after)
+            until = time.monotonic() + secs
+            self._hold[it.chat_id] = until
+            self._bulk_hold = max(self._bulk_hold, until)
+            OUTBOX_CALLS.labels(lane, "retry_after").inc()
+            logger.warning("[TG] 429 | chat=%s %s | retry in %.0fs", it.chat_id, it.method, secs)
+            self._push(it, front=True)
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                self._done(it, "ok", None)
+            else:
+                self._fail(it, e)
+        except NetworkError as e:  # timeouts and transport errors; a timed-out send may still have arrived
+            it.tries += 1
+            if it.tries > self.retries:
+                self._fail(it, e)
+            else:
+                self._hold[it.chat_id] = time.monotonic() + min(2 ** it.tries, 30)
+                OUTBOX_CALLS.labels(lane, "retry").inc()
+                self._push(it, front=True)
+        except TelegramError as e:  # Forbidden (bot blocked), ChatMigrated, ...
+            self._fail(it, e)
+        except asyncio.CancelledError:
+            it.fut.cancel()
+            raise
+        except Exception as e:
+            self._fail(it, e)
+        else:
+            self._done(it, "ok", res)
+        finally:
+            self._busy.discard(it.chat_id)
+            self._slots.release()
+            self._wake.set()
+
+    async def _invoke(self, it: _Item):
+        kw = dict(it.kw)
+        if it.ref is not None:
+            ref = it.ref
+            if isinstance(ref, asyncio.Future):
+                ref = ref.result()  # done (see _next); if the send failed, so does the edit
+            kw["message_id"] = getattr(ref, "message_id", ref)
+        return await getattr(self.bot, it.method)(chat_id=it.chat_id, **kw)
+
+    def _done(self, it: _Item, result: str, value):
+        OUTBOX_CALLS.labels(LANES[it.lane], result).inc()
+        OUTBOX_WAIT.labels(LANES[it.lane]).observe(time.monotonic() - it.t0)
+        if not it.fut.done():
+            it.fut.set_result(value)
+
+    def _fail(self, it: _Item, err: BaseException):
+        OUTBOX_CALLS.labels(LANES[it.lane], "failed").inc()
+        logger.warning("[TG] %s failed | chat=%s | %s", it.method, it.chat_id, err)
+        if not it.fut.done():
+            it.fut.set_exception(err)
+
+
+def outbox_from_env(bot) -> Outbox:
+    """TG_GLOBAL_PER_SEC=25, TG_CHAT_PER_SEC=1, TG_CHAT_BURST=3, TG_GROUP_PER_MIN=20,
+    TG_SEND_CONCURRENCY=8, TG_BULK_RESERVE=5, TG_OUTBOX_MAX=10000 (bulk lane), TG_SEND_RETRIES=3."""
+    e = os.environ.get
+    return Outbox(bot, rate=float(e("TG_GLOBAL_PER_SEC", "25")), chat_rate=float(e("TG_CHAT_PER_SEC", "1")),
+                  chat_burst=float(e("TG_CHAT_BURST", "3")), group_per_min=float(e("TG_GROUP_PER_MIN", "20")),
+                  concurrency=int(e("TG_SEND_CONCURRENCY", "8")), bulk_reserve=float(e("TG_BULK_RESERVE", "5")),
+                  max_pending=int(e("TG_OUTBOX_MAX", "10000")), retries=int(e("TG_SEND_RETRIES", "3")))
@@ -0,0 +1,215 @@
+"""SQLite persistence for PTB ``user_data`` / ``chat_data`` (WAL mode).
+
+Unlike ``PicklePersistence`` nothing is rewritten wholesale: every entry of a
+user's (or chat's) dict is its own row, and on each persistence run only the
+entries that changed since the last write are upserted or deleted, all in one
+transaction. Nothing is loaded at startup either; a user's rows are read the
+first time one of their updates reaches a handler (PTB's
+``refresh_user_data`` hook), so boot time does not grow with the user count.
+
+    app = ApplicationBuilder().token(TOKEN).persistence(persistence_from_env()).build()
+
+Values are pickled, so anything ``user_data`` may hold survives a restart.
+``bot_data`` and callback data are not stored.
+"""
+import asyncio, logging, os, pickle, sqlite3, threading, time
+from typing import Dict, Optional, Set, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from slh import metrics
+
+logger = logging.getLogger("slh.persistence")
+
+PERSIST_SECONDS = metrics.histogram("slh_persist_write_seconds", "Bot state write transaction latency")
+PERSIST_ROWS = metrics.counter("slh_persist_rows_total", "Bot state rows written", ("op",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    kind        TEXT NOT NULL,
+    id          INTEGER NOT NULL,
+    key         BLOB NOT NULL,
+    value       BLOB NOT NULL,
+    updated_at  INTEGER NOT NULL,
+    PRIMARY KEY (kind, id, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS conversations (
+    name        TEXT NOT NULL,
+    key         BLOB NOT NULL,
+    state       BLOB NOT NULL,
+    PRIMARY KEY (name, key)
+) WITHOUT ROWID;
+"""
+
+_Owner = Tuple[str, int]  # ("user" | "chat", id)
+
+
+def _dump(v) -> bytes:
+    return pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class SQLitePersistence(BasePersistence):
+    def __init__(self, path: str, update_interval: float = 5.0):
+        super().__init__(store_data=PersistenceInput(bot_data=False, callback_data=False),
+                         update_interval=update_interval)
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+        self._snap: Dict[_Owner, Dict[bytes, bytes]] = {}  # what the DB holds for each loaded owner
+        self._pending: Dict[Tuple[str, int, bytes], Optional[bytes]] = {}  # None = delete the row
+        self._drops: Set[_Owner] = set()
+        self._convs: Dict[Tuple[str, bytes], Optional[bytes]] = {}
+        self._writer: Optional[asyncio.Future] = None
+        self._write_lock = asyncio.Lock()
+
+    # ---------- reads ----------
+    def _rows(self, owner: _Owner) -> Dict[bytes, bytes]:
+        with self._lock:
+            return dict(self._db.execute("SELECT key, value FROM state WHERE kind=? AND id=?", owner).fetchall())
+
+    async def _load(self, owner: _Owner, data: dict):
+        if owner in self._snap:
+            return
+        rows = await asyncio.to_thread(self._rows, owner)
+        if owner in self._snap:  # a concurrent update of the same owner got there first
+            return
+        self._snap[owner] = rows
+        for k, v in rows.items():
+            data.setdefault(pickle.loads(k), pickle.loads(v))
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {}  # loaded per user in refresh_user_data
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        await self._load(("user", user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        await self._load(("chat", chat_id), chat_data)
+
+    async def get_conversations(self, name: str) -> dict:
+        def read():
+            with self._lock:
+                return self._db.execute("SELECT key, state FROM conversations WHERE name=?", (name,)).fetchall()
+        return {pickle.loads(k): pickle.loads(s) for k, s in await asyncio.to_thread(read)}
+
+    # ---------- writes ----------
+    async def _stage(self, owner: _Owner, data: dict):
+        snap = self._snap.get(owner)
+        if snap is None:  # marked for update without ever being refreshed
+            snap = await asyncio.to_thread(self._rows, owner)
+        new = {_dump(k): _dump(v) for k, v in data.items()}
+        for k, v in new.items():
+            if snap.get(k) != v:
+                self._pending[(*owner, k)] = v
+        for k in snap.keys() - new.keys():
+            self._pending[(*owner, k)] = None
+        self._snap[owner] = new
+        await self._write_soon()
+
+    async def _drop(self, owner: _Owner):
+        self._snap[owner] = {}
+        self._pending = {k: v for k, v in self._pending.items() if k[:2] != owner}
+        self._drops.add(owner)
+        await self._write_soon()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await self._stage(("user", user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        await self._stage(("chat", chat_id), data)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self._drop(("user", user_id))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await self._drop(("chat", chat_id))
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        self._convs[(name, _dump(key))] = None if new_state is None else _dump(new_state)
+        await self._write_soon()
+
+    async def _write_soon(self):
+        """One transaction for everything staged in this loop turn (PTB gathers all updates of a run)."""
+        if self._writer is None:
+            self._writer = asyncio.ensure_future(self._write())
+        await asyncio.shield(self._writer)
+
+    async def _write(self):
+        self._writer = None
+        pending, drops, convs = self._pending, self._drops, self._convs
+        self._pending, self._drops, self._convs = {}, set(), {}
+        if not (pending or drops or convs):
+            return
+        async with self._write_lock:  # batches commit in the order they were staged
+            try:
+                await asyncio.to_thread(self._commit, pending, drops, convs)
+            except Exception as e:
+                logger.error("[STATE] write failed, will retry: %s", e)
+                # keep newer staged values; put the failed batch back under them
+                self._pending = {**pending, **self._pending}
+                self._drops |= drops
+                self._convs = {**convs, **self._convs}
+                raise
+
+    def _commit(self, pending, drops, convs):
+        now = int(time.time())
+        puts = [(kind, id_, k, v, now) for (kind, id_, k), v in pending.items() if v is not None]
+        dels = [(kind, id_, k) for (kind, id_, k), v in pending.items() if v is None]
+        with PERSIST_SECONDS.time(), self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("DELETE FROM state WHERE kind=? AND id=?", list(drops))
+                self._db.executemany(
+                    "INSERT INTO state(kind,id,key,value,updated_at) VALUES (?,?,?,?,?)"
+                    " ON CONFLICT(kind,id,key) DO UPDATE SET value=excluded.value, updated_at=excluded.updated_at", puts)
+                self._db.executemany("DELETE FROM state WHERE kind=? AND id=? AND key=?", dels)
+                self._db.executemany("DELETE FROM conversations WHERE name=? AND key=?",
+                                     [k for k, s in convs.items() if s is None])
+                self._db.executemany("INSERT OR REPLACE INTO conversations(name,key,state) VALUES (?,?,?)",
+                                     [(*k, s) for k, s in convs.items() if s is not None])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        PERSIST_ROWS.labels("upsert").inc(len(puts))
+        PERSIST_ROWS.labels("delete").inc(len(dels))
+        logger.debug("[STATE] wrote %s row(s), deleted %s, dropped %s owner(s)", len(puts), len(dels), len(drops))
+
+    async def flush(self) -> None:
+        if self._writer is not None:
+            await asyncio.shield(self._writer)
+        await self._write()
+
+    # ---------- not stored ----------
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+
+def persistence_from_env(default_path: str = "bot_state.sqlite") -> Optional[SQLitePersistence]:
+    """BOT_STATE_DB (empty or 0 keeps state in memory only), BOT_STATE_FLUSH_SECONDS=5."""
+    path = os.environ.get("BOT_STATE_DB", default_path).strip()
+    if path.lower() in ("", "0", "off", "false", "no"):
+        return None
+    return SQLitePersistence(path, update_interval=float(os.environ.get("BOT_STATE_FLUSH_SECONDS", "5")))
@@ -0,0 +1,80 @@
+"""Token-bucket limiter and in-flight request coalescing (asyncio, single process)."""
+import asyncio, time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TokenBucketLimiter:
+    """One bucket per key: ``burst`` tokens, refilled at ``rate`` tokens/second.
+
+    Past ``max_keys`` the least recently used buckets are forgotten, but only
+    once they have refilled completely (a fresh bucket is the same), so
+    rotating keys never resets a limit. Buckets still refilling are kept: the
+    map holds at most ``max_keys`` plus the keys seen within one refill period
+    (``burst / rate`` seconds).
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 50_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, list]" = OrderedDict()
+
+    def allow(self, key: Hashable, cost: float = 1.0) -> float:
+        """0.0 if the request may go ahead (token taken), else seconds until it would."""
+        now = time.monotonic()
+        b = self._buckets.get(key)
+        if b is None:
+            b = self._buckets[key] = [self.burst, now]
+        else:
+            b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+            b[1] = now
+            self._buckets.move_to_end(key)
+        self._trim(now)
+        if b[0] >= cost:
+            b[0] -= cost
+            return 0.0
+        return (cost - b[0]) / self.rate if self.rate > 0 else float("inf")
+
+    def peek(self, key: Hashable, cost: float = 1.0) -> float:
+        """Like ``allow`` but takes nothing: 0.0 if a token is available now, else seconds until one is."""
+        b = self._buckets.get(key)
+        if b is None:
+            return 0.0 if self.burst >= cost else float("inf")
+        tokens = min(self.burst, b[0] + (time.monotonic() - b[1]) * self.rate)
+        if tokens >= cost:
+            return 0.0
+        return (cost - tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def _trim(self, now: float):
+        # oldest first, stopping at the first bucket still refilling: amortised O(1) per call
+        while len(self._buckets) > self.max_keys:
+            tokens, t = next(iter(self._buckets.values()))
+            if tokens + (now - t) * self.rate < self.burst:
+                break
+            self._buckets.popitem(last=False)
+
+
+class Coalescer:
+    """Share one running task between concurrent requests with the same key."""
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def get(self, key: Hashable) -> Optional[asyncio.Task]:
+        t = self._tasks.get(key)
+        return t if t is not None and not t.done() else None
+
+    def submit(self, key: Hashable, factory: Callable[[], Awaitable],
+               spawn: Optional[Callable[[Awaitable], asyncio.Task]] = None) -> Tuple[asyncio.Task, bool]:
+        """(task, leader): starts ``factory()`` unless a task for ``key`` is already running."""
+        t = self.get(key)
+        if t is not None:
+            return t, False
+        t = (spawn or asyncio.get_running_loop().create_task)(factory())
+        self._tasks[key] = t
+        t.add_done_callback(lambda done: self._tasks.pop(key, None) if self._tasks.get(key) is done else None)
+        return t, True
@@ -0,0 +1,179 @@
+"""Background receipt watcher.
+
+One asyncio task tracks every pending tx hash, polls their receipts in a
+single JSON-RPC batch whenever a new block shows up, and resolves a future
+per transaction (tokenId already decoded). Senders no longer need to park a
+thread inside ``wait_for_transaction_receipt``.
+"""
+import asyncio, logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import httpx
+
+from slh import abi
+from slh.metrics import GAS_BUCKETS, histogram
+from slh.rpc import AsyncRPC, fastest_url
+from slh.viewcache import invalidate_token
+
+logger = logging.getLogger("slh.receipts")
+
+TRANSFER_TOPIC = abi.TRANSFER_HEX  # keccak("Transfer(address,address,uint256)")
+
+GAS_USED = histogram("slh_gas_used", "Gas used by confirmed transactions", (), buckets=GAS_BUCKETS)
+
+
+class TxResult(NamedTuple):
+    tx_hash: str
+    status: int
+    block: Optional[int]
+    gas_used: Optional[int]
+    token_id: Optional[int]
+
+
+def _int(v) -> Optional[int]:
+    if v is None:
+        return None
+    return int(v, 16) if isinstance(v, str) else int(v)
+
+def token_id_from_receipt(rc: dict, contract: str) -> Optional[int]:
+    """tokenId of the first ERC-721 Transfer emitted by ``contract`` in a receipt."""
+    return abi.token_ids([rc], contract)[0]
+
+
+class ReceiptWatcher:
+    """``rpc_url`` may be a comma-separated endpoint list; each poll uses the fastest healthy one."""
+
+    def __init__(self, rpc_url: str, contract: str, poll_interval: float = 1.0,
+                 timeout: float = 180.0, batch_size: int = 100, http_timeout: float = 30.0,
+                 rpc: Optional[AsyncRPC] = None):
+        self.rpc_url = rpc_url
+        self.contract = contract
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self._own_rpc = rpc is None
+        self.rpc = rpc or AsyncRPC(rpc_url, http_timeout)
+        self._pending: Dict[str, Tuple[asyncio.Future, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    # ---------- public ----------
+    def watch(self, tx_hash: str) -> asyncio.Future:
+        """Future resolved with a TxResult once ``tx_hash`` is mined."""
+        h = tx_hash.lower()
+        if not h.startswith("0x"):
+            h = "0x" + h
+        ent = self._pending.get(h)
+        if ent is not None:
+            return ent[0]
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending[h] = (fut, loop.time())
+        self._ensure_task()
+        self._wake.set()
+        return fut
+
+    async def wait(self, tx_hash: str) -> TxResult:
+        return await asyncio.shield(self.watch(tx_hash))
+
+    def forget(self, tx_hash: str):
+        """Stop tracking ``tx_hash`` (e.g. a replaced transaction that can no longer be mined)."""
+        h = tx_hash.lower()
+        fut, _ = self._pending.pop(h if h.startswith("0x") else "0x" + h, (None, 0))
+        if fut is not None and not fut.done():
+            fut.cancel()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for fut, _ in self._pending.values():
+            if not fut.done():
+                fut.cancel()
+        self._pending.clear()
+        if self._own_rpc:
+            await self.rpc.close()
+
+    # ---------- internals ----------
+    def _ensure_task(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="receipt-watcher")
+
+    async def _run(self):
+        last_block = -1
+        while True:
+            if not self._pending:
+                self._wake.clear()
+                await self._wake.wait()
+            url = fastest_url(self.rpc_url)
+            try:
+                blk = _int(await self._call(url, "eth_blockNumber", []))
+                if blk != last_block:
+                    last_block = blk
+                    await self._poll(url)
+                self._expire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # transport failures are already charged to the endpoint
+                logger.warning("[RECEIPT] poll failed | %s | %s", url, e)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _poll(self, url: str):
+        hashes = [h for h, (fut, _) in self._pending.items() if not fut.done()]
+        for i in range(0, len(hashes), self.batch_size):
+            chunk = hashes[i:i + self.batch_size]
+            receipts = await self._batch(url, [("eth_getTransactionReceipt", [h]) for h in chunk])
+            token_ids = abi.token_ids(receipts, self.contract)  # the whole batch in one pass
+            for h, rc, token_id in zip(chunk, receipts, token_ids):
+                if not rc:
+                    continue
+                fut, _ = self._pending.pop(h, (None, 0))
+                if fut is None or fut.done():
+                    continue
+                res = TxResult(
+                    tx_hash=h,
+                    status=_int(rc.get("status")),
+                    block=_int(rc.get("blockNumber")),
+                    gas_used=_int(rc.get("gasUsed")),
+                    token_id=token_id,
+                )
+                logger.info("[RECEIPT] status=%s block=%s gas=%s tokenId=%s tx=%s",
+                            res.status, res.block, res.gas_used, res.token_id, h)
+                if res.gas_used is not None:
+                    GAS_USED.observe(res.gas_used)
+                if res.token_id is not None:
+                    invalidate_token(self.contract, res.token_id)
+                fut.set_result(res)
+
+    def _expire(self):
+        now = asyncio.get_running_loop().time()
+        for h, (fut, t0) in list(self._pending.items()):
+            if fut.done():
+                del self._pending[h]
+            elif now - t0 > self.timeout:
+                del self._pending[h]
+                fut.set_exception(asyncio.TimeoutError(f"receipt timeout after {self.timeout:.0f}s: {h}"))
+
+    async def _call(self, url: str, method: str, params: list):
+        return await self.rpc.call(method, params, url)
+
+    async def _batch(self, url: str, calls: List[Tuple[str, list]]) -> list:
+        """JSON-RPC batch; falls back to concurrent single calls if the node refuses batches."""
+        reqs = [self.rpc.request(m, p) for m, p in calls]
+        try:
+            body = await self.rpc.post(url, reqs, f"batch:{calls[0][0]}" if calls else "batch")
+            if isinstance(body, list):
+                by_id = {it.get("id"): it.get("result") for it in body}
+                return [by_id.get(q["id"]) for q in reqs]
+        except httpx.HTTPError as e:
+            logger.debug("[RECEIPT] batch refused (%s), falling back", e)
+        return await asyncio.gather(*(self._call(url, m, p) for m, p in calls))
@@ -0,0 +1,409 @@
+"""Long-lived Web3 providers shared by the bot and the API.
+
+One Web3 instance per RPC spec (a comma-separated list of endpoint URLs,
+``BSC_RPC_URLS`` or ``BSC_RPC_URL``). Each endpoint owns a keep-alive
+``requests`` session and latency/error statistics:
+
+* reads go to the fastest healthy endpoint and are hedged to the runner-up
+  when the first answer is slow; transport errors fail over to the next one;
+* ``eth_sendRawTransaction`` is broadcast to several endpoints at once.
+
+Health comes from a background probe instead of an ``is_connected()``
+round-trip per request, and contract objects are cached per (address, ABI).
+
+``AsyncRPC`` is the event-loop counterpart: one pooled httpx client per
+process, routed with the same per-endpoint statistics.
+"""
+import asyncio, itertools, json, logging, os, threading, time
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+from slh.metrics import RETRIES, RPC_ERRORS, RPC_SECONDS, TrackedExecutor
+
+logger = logging.getLogger("slh.rpc")
+
+_LOCK = threading.Lock()
+_W3: Dict[str, Web3] = {}
+_ENDPOINTS: Dict[str, "Endpoint"] = {}
+_CONTRACTS: Dict[Tuple[str, str, str], Any] = {}
+_PROBE: Optional[threading.Thread] = None
+
+_EWMA = 0.3
+_DOWN_AFTER = 3          # consecutive failures before an endpoint is parked
+_DOWN_SECONDS = 30.0
+
+# JSON-RPC errors that say "this node is struggling", not "your call is wrong"
+_RETRYABLE_RPC_ERRORS = ("rate limit", "too many requests", "limit exceeded", "timeout",
+                         "header not found", "busy", "unavailable", "internal error")
+
+
+def rpc_spec_from_env(default: Optional[str] = None) -> str:
+    spec = os.environ.get("BSC_RPC_URLS") or os.environ.get("BSC_RPC_URL") or default
+    if not spec:
+        raise RuntimeError("Missing env: BSC_RPC_URL")
+    return spec
+
+def split_spec(spec: str) -> List[str]:
+    return [u.strip() for u in spec.split(",") if u.strip()]
+
+
+def _new_session() -> requests.Session:
+    size = int(os.environ.get("RPC_POOL_SIZE", "20"))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+class Endpoint:
+    __slots__ = ("url", "session", "latency", "error_rate", "fails", "down_until",
+                 "calls", "errors", "block", "checked_at", "last_error")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session = _new_session()
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.fails = 0
+        self.down_until = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.block: Optional[int] = None
+        self.checked_at: Optional[int] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def score(self) -> float:
+        lat = self.latency if self.latency is not None else 0.5
+        return lat * (1.0 + 4.0 * self.error_rate)
+
+    def record(self, ok: bool, dt: float, err: Optional[BaseException] = None):
+        self.calls += 1
+        self.latency = dt if self.latency is None else (1 - _EWMA) * self.latency + _EWMA * dt
+        self.error_rate = (1 - _EWMA) * self.error_rate + _EWMA * (0.0 if ok else 1.0)
+        if ok:
+            self.fails = 0
+            return
+        self.errors += 1
+        self.fails += 1
+        self.last_error = str(err)
+        if self.fails >= _DOWN_AFTER and self.healthy:
+            self.down_until = time.monotonic() + _DOWN_SECONDS
+            logger.warning("[RPC] endpoint parked for %.0fs | %s | %s", _DOWN_SECONDS, self.url, err)
+
+    def snapshot(self) -> dict:
+        return {"ok": self.healthy and self.fails == 0 if self.calls else None,
+                "latency": None if self.latency is None else round(self.latency, 4),
+                "error_rate": round(self.error_rate, 3), "calls": self.calls, "errors": self.errors,
+                "block": self.block, "checked_at": self.checked_at, "error": self.last_error}
+
+
+def _endpoint(url: str) -> Endpoint:
+    ep = _ENDPOINTS.get(url)
+    if ep is None:
+        with _LOCK:
+            ep = _ENDPOINTS.get(url)
+            if ep is None:
+                ep = _ENDPOINTS[url] = Endpoint(url)
+    return ep
+
+def rank(urls: List[str]) -> List[Endpoint]:
+    """Endpoints best-first: healthy ones by score, parked ones last."""
+    eps = [_endpoint(u) for u in urls]
+    return sorted(eps, key=lambda e: (not e.healthy, e.score()))
+
+def fastest_url(spec: str) -> str:
+    return rank(split_spec(spec))[0].url
+
+def mark_failed(url: str, err: BaseException, dt: float = 0.0):
+    _endpoint(url).record(False, dt, err)
+
+
+class _RetryableRPCError(Exception):
+    pass
+
+
+class FailoverHTTPProvider(JSONBaseProvider):
+    """JSON-RPC over several endpoints with hedged reads and broadcast sends."""
+
+    def __init__(self, spec: str, request_kwargs: Optional[dict] = None):
+        super().__init__()
+        self.endpoint_uri = spec
+        self.urls = split_spec(spec)
+        if not self.urls:
+            raise ValueError("empty RPC spec")
+        self._request_kwargs = request_kwargs or {}
+        self.hedge_floor = float(os.environ.get("RPC_HEDGE_MS", "300")) / 1000.0
+        self.broadcast_to = int(os.environ.get("RPC_BROADCAST", "3"))
+        self._pool = TrackedExecutor("rpc", max_workers=max(4, 2 * len(self.urls)))
+
+    def __str__(self) -> str:
+        return f"RPC failover {self.urls}"
+
+    def _post(self, ep: Endpoint, data: bytes, raise_rpc_errors: bool = True):
+        t0 = time.perf_counter()
+        try:
+            r = ep.session.post(ep.url, data=data, headers={"Content-Type": "application/json"}, **self._request_kwargs)
+            r.raise_for_status()
+            resp = self.decode_rpc_response(r.content)
+            err = resp.get("error") if isinstance(resp, dict) else None
+            if err and raise_rpc_errors and any(s in str(err).lower() for s in _RETRYABLE_RPC_ERRORS):
+                raise _RetryableRPCError(err)
+        except Exception as e:
+            ep.record(False, time.perf_counter() - t0, e)
+            raise
+        ep.record(True, time.perf_counter() - t0)
+        return resp
+
+    def make_request(self, method, params):
+        data = self.encode_rpc_request(method, params)
+        eps = rank(self.urls)
+        t0 = time.perf_counter()
+        try:
+            if method == "eth_sendRawTransaction":
+                live = [e for e in eps if e.healthy] or eps
+                resp = self._broadcast(live[:max(1, self.broadcast_to)], data)
+            else:
+                resp = self._read(eps, data)
+        except Exception:
+            RPC_ERRORS.labels(method).inc()
+            raise
+        finally:
+            RPC_SECONDS.labels(method).observe(time.perf_counter() - t0)
+        if isinstance(resp, dict) and "error" in resp:
+            RPC_ERRORS.labels(method).inc()
+        return resp
+
+    def _read(self, eps: List[Endpoint], data: bytes):
+        if len(eps) == 1:
+            return self._post(eps[0], data)
+        futs = {self._pool.submit(self._post, eps[0], data): eps[0]}
+        nxt = 1
+        hedge = max(self.hedge_floor, 3.0 * (eps[0].latency or 0.0))
+        done, _ = wait(futs, timeout=hedge)
+        if not done:
+            logger.debug("[RPC] hedging read to %s after %.2fs", eps[nxt].url, hedge)
+            RETRIES.labels("rpc_hedge").inc()
+            futs[self._pool.submit(self._post, eps[nxt], data)] = eps[nxt]
+            nxt += 1
+        last_exc: Optional[BaseException] = None
+        while futs:
+            done, _ = wait(futs, return_when=FIRST_COMPLETED)
+            for f in done:
+                futs.pop(f)
+                try:
+                    return f.result()
+                except Exception as e:
+                    last_exc = e
+            if not futs and nxt < len(eps):
+                RETRIES.labels("rpc_failover").inc()
+                futs[self._pool.submit(self._post, eps[nxt], data)] = eps[nxt]
+                nxt += 1
+        raise last_exc
+
+    def _broadcast(self, eps: List[Endpoint], data: bytes):
+        """Send to every endpoint; first acceptance wins, else the first error response."""
+        futs = [self._pool.submit(self._post, ep, data, False) for ep in eps]
+        first_err, last_exc = None, None
+        for f in _as_completed(futs):
+            try:
+                resp = f.result()
+            except Exception as e:
+                last_exc = e
+                continue
+            if "error" not in resp:
+                return resp
+            first_err = first_err or resp
+        if first_err is not None:
+            return first_err
+        raise last_exc
+
+    def probe(self):
+        payload = json.dumps({"jsonrpc": "2.0", "id": 0, "method": "eth_blockNumber", "params": []}).encode()
+        for ep in (_endpoint(u) for u in self.urls):
+            try:
+                resp = self._post(ep, payload)
+                ep.block = int(resp["result"], 16)
+                ep.last_error = None
+            except Exception as e:
+                logger.debug("[RPC] probe failed | %s | %s", ep.url, e)
+            ep.checked_at = int(time.time())
+
+
+def _as_completed(futs):
+    pending = set(futs)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        yield from done
+
+
+def get_w3(spec: str) -> Web3:
+    w3 = _W3.get(spec)
+    if w3 is not None:
+        return w3
+    with _LOCK:
+        w3 = _W3.get(spec)
+        if w3 is None:
+            timeout = float(os.environ.get("BSC_RPC_TIMEOUT", "30"))
+            w3 = _W3[spec] = Web3(FailoverHTTPProvider(spec, request_kwargs={"timeout": timeout}))
+            _start_probe_locked()
+    return w3
+
+
+def get_contract(w3: Web3, address: str, abi: list):
+    key = (str(w3.provider.endpoint_uri), address.lower(), json.dumps(abi, sort_keys=True))
+    c = _CONTRACTS.get(key)
+    if c is None:
+        c = _CONTRACTS[key] = w3.eth.contract(address=Web3.to_checksum_address(address), abi=abi)
+    return c
+
+
+# ---------- async client ----------
+class RPCError(RuntimeError):
+    """The node answered with a JSON-RPC error (as opposed to a transport failure)."""
+
+    def __init__(self, method: str, error: dict):
+        super().__init__(f"{method}: {error.get('message', error)}")
+        self.code = error.get("code")
+
+
+class AsyncRPC:
+    """JSON-RPC over one shared keep-alive ``httpx.AsyncClient``.
+
+    Calls without an explicit ``url`` go to the fastest healthy endpoint of
+    ``spec`` and fail over to the next one on transport errors; node errors
+    raise ``RPCError`` straight away. ``send_raw`` broadcasts like the sync
+    provider does. Latency feeds the same endpoint stats as the sync provider.
+    """
+
+    def __init__(self, spec: str, http_timeout: float = 30.0, max_connections: int = 100):
+        self.spec = spec
+        self._http_timeout = http_timeout
+        self._max_connections = max_connections
+        self._ids = itertools.count(1)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.broadcast_to = int(os.environ.get("RPC_BROADCAST", "3"))
+        self._sends: set = set()  # broadcast legs still running after another endpoint accepted
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self._http_timeout,
+                                             limits=httpx.Limits(max_connections=self._max_connections))
+        return self._client
+
+    def request(self, method: str, params: list) -> dict:
+        return {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+
+    async def post(self, url: str, body, label: str):
+        """POST one request or a batch; returns the decoded body (errors inside it are the caller's)."""
+        t0 = time.monotonic()
+        try:
+            with RPC_SECONDS.labels(label).time():
+                r = await self.client.post(url, json=body)
+            r.raise_for_status()
+            out = r.json()
+        except Exception:
+            RPC_ERRORS.labels(label).inc()
+            raise
+        _endpoint(url).record(True, time.monotonic() - t0)
+        return out
+
+    async def call(self, method: str, params: list, url: Optional[str] = None):
+        urls = [url] if url else [e.url for e in rank(split_spec(self.spec))]
+        last: Optional[BaseException] = None
+        for i, u in enumerate(urls):
+            t0 = time.monotonic()
+            try:
+                body = await self.post(u, self.request(method, params), method)
+            except (httpx.HTTPError, ValueError) as e:
+                last = e
+                mark_failed(u, e, time.monotonic() - t0)
+                if i + 1 < len(urls):
+                    RETRIES.labels("rpc_failover").inc()
+                continue
+            if body.get("error"):
+                RPC_ERRORS.labels(method).inc()
+                raise RPCError(method, body["error"])
+            return body.get("result")
+        raise last
+
+    async def send_raw(self, raw: str) -> str:
+        """eth_sendRawTransaction to the ``RPC_BROADCAST`` best endpoints at once; first acceptance wins.
+
+        If no endpoint accepts, the first node error is raised as ``RPCError``
+        (a transport error only when every endpoint failed that way).
+        """
+        method = "eth_sendRawTransaction"
+        eps = rank(split_spec(self.spec))
+        eps = ([e for e in eps if e.healthy] or eps)[:max(1, self.broadcast_to)]
+        body = self.request(method, [raw])
+
+        async def leg(url: str):
+            t0 = time.monotonic()
+            try:
+                return await self.post(url, body, method)
+            except (httpx.HTTPError, ValueError) as e:
+                mark_failed(url, e, time.monotonic() - t0)
+                return e
+
+        loop = asyncio.get_running_loop()
+        legs = [loop.create_task(leg(e.url)) for e in eps]
+        for t in legs:  # the slower legs keep going: every node that has the tx helps it propagate
+            self._sends.add(t)
+            t.add_done_callback(self._sends.discard)
+        first_err, last_exc = None, None
+        for t in asyncio.as_completed(legs):
+            out = await t
+            if isinstance(out, Exception):
+                last_exc = out
+            elif out.get("error"):
+                first_err = first_err or out["error"]
+            else:
+                return out.get("result")
+        if first_err is not None:
+            RPC_ERRORS.labels(method).inc()
+            raise RPCError(method, first_err)
+        raise last_exc
+
+    async def close(self):
+        if self._sends:
+            await asyncio.gather(*self._sends, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# ---------- background health probe ----------
+def rpc_health(spec: Optional[str] = None) -> dict:
+    """Last known health of ``spec`` (or of every endpoint); never touches the network."""
+    if spec is None:
+        return {u: ep.snapshot() for u, ep in _ENDPOINTS.items()}
+    eps = {u: _endpoint(u).snapshot() for u in split_spec(spec)}
+    oks = [e["ok"] for e in eps.values()]
+    blocks = [e["block"] for e in eps.values() if e["block"] is not None]
+    return {"ok": True if any(oks) else (None if all(o is None for o in oks) else False),
+            "block": max(blocks) if blocks else None, "endpoints": eps}
+
+def _probe_loop():
+    interval = float(os.environ.get("RPC_HEALTH_INTERVAL", "15"))
+    while True:
+        for w3 in list(_W3.values()):
+            w3.provider.probe()
+        time.sleep(interval)
+
+def _start_probe_locked():
+    global _PROBE
+    if _PROBE is None:
+        _PROBE = threading.Thread(target=_probe_loop, name="rpc-health", daemon=True)
+        _PROBE.start()
@@ -0,0 +1,152 @@
+"""Process-pool transaction signer for bulk sends.
+
+ECDSA signing and RLP encoding hold the GIL (several ms per tx with the
+pure-Python backends), so a thread pool does not help. ``PoolSigner`` hands
+chunks of fully built transactions (nonce, gas and fees already filled in)
+to worker processes; each worker loads the key once in its initializer, and
+results come back in submission order as ``(raw, tx_hash)``.
+
+    signer = signer_from_env()              # None when SIGN_WORKERS=0
+    signed = signer.sign(txs)               # [(raw bytes, "0x…hash"), ...]
+    signed = await signer.sign_async(txs)
+
+Batches smaller than ``min_batch`` are signed inline, where the pool round
+trip would cost more than it saves.
+
+    python -m slh.signer bench --n 1000,10000
+"""
+import argparse, asyncio, logging, multiprocessing, os, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from eth_account import Account
+
+from slh import metrics
+
+logger = logging.getLogger("slh.signer")
+
+SIGN_SECONDS = metrics.histogram("slh_sign_batch_seconds", "Batch signing latency", ("mode",))
+
+_ACCT = None  # per worker process
+
+
+def _init_worker(private_key: str):
+    global _ACCT
+    _ACCT = Account.from_key(private_key)
+
+def _sign_chunk(txs: Sequence[dict]) -> List[Tuple[bytes, str]]:
+    out = []
+    for tx in txs:
+        s = _ACCT.sign_transaction(tx)
+        out.append((bytes(s.rawTransaction), s.hash.hex()))
+    return out
+
+
+class PoolSigner:
+    def __init__(self, private_key: str, workers: Optional[int] = None, chunk: int = 128,
+                 min_batch: int = 32, start_method: str = "spawn"):
+        self.address = Account.from_key(private_key).address
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk = max(1, chunk)
+        self.min_batch = min_batch
+        self._key = private_key
+        self._acct = Account.from_key(private_key)
+        # spawn: forking a process that already runs an event loop and threads is not safe
+        self._ctx = multiprocessing.get_context(start_method)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=self._ctx,
+                                             initializer=_init_worker, initargs=(self._key,))
+            logger.info("[SIGN] pool up | workers=%s chunk=%s", self.workers, self.chunk)
+        return self._pool
+
+    def _chunks(self, txs: Sequence[dict]) -> List[List[dict]]:
+        # at least one chunk per worker, so small airdrops still use every core
+        size = max(1, min(self.chunk, -(-len(txs) // self.workers)))
+        return [[dict(tx) for tx in txs[i:i + size]] for i in range(0, len(txs), size)]
+
+    def _inline(self, txs: Sequence[dict]) -> List[Tuple[bytes, str]]:
+        out = []
+        for tx in txs:
+            s = self._acct.sign_transaction(tx)
+            out.append((bytes(s.rawTransaction), s.hash.hex()))
+        return out
+
+    def start(self):
+        """Spawn the workers now (they import eth_account and load the key) instead of on the first batch."""
+        list(self._executor().map(_init_worker, [self._key] * self.workers))
+
+    def sign(self, txs: Sequence[dict]) -> List[Tuple[bytes, str]]:
+        """Blocking; ``(raw, tx_hash)`` per tx, in the order given."""
+        if len(txs) < self.min_batch:
+            with SIGN_SECONDS.labels("inline").time():
+                return self._inline(txs)
+        with SIGN_SECONDS.labels("pool").time():
+            return [r for part in self._executor().map(_sign_chunk, self._chunks(txs)) for r in part]
+
+    async def sign_async(self, txs: Sequence[dict]) -> List[Tuple[bytes, str]]:
+        if len(txs) < self.min_batch:
+            return await asyncio.to_thread(self.sign, txs)
+        ex, loop = self._executor(), asyncio.get_running_loop()
+        with SIGN_SECONDS.labels("pool").time():
+            parts = await asyncio.gather(*(loop.run_in_executor(ex, _sign_chunk, c) for c in self._chunks(txs)))
+        return [r for part in parts for r in part]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+def signer_from_env() -> Optional[PoolSigner]:
+    """TREASURY_PRIVATE_KEY, SIGN_WORKERS (default: CPU count, 0 = sign inline), SIGN_CHUNK=128, SIGN_MIN_BATCH=32."""
+    pk = os.environ.get("TREASURY_PRIVATE_KEY")
+    workers = int(os.environ.get("SIGN_WORKERS", "0" if (os.cpu_count() or 1) < 2 else str(os.cpu_count())))
+    if not pk or workers <= 0:
+        return None
+    return PoolSigner(pk, workers=workers, chunk=int(os.environ.get("SIGN_CHUNK", "128")),
+                      min_batch=int(os.environ.get("SIGN_MIN_BATCH", "32")))
+
+
+# ---------- bench ----------
+def _bench_txs(n: int, chain_id: int) -> List[dict]:
+    # safeMint(address,string)-sized calldata; signing cost does not depend on what it encodes
+    data = "0xd204c45e" + "00" * 160
+    return [{"to": "0x8AD1de67648dB44B1b1D0E3475485910CedDe90b", "data": data, "value": 0, "gas": 220000,
+             "maxFeePerGas": 2 * 10**9, "maxPriorityFeePerGas": 10**9, "nonce": i, "chainId": chain_id}
+            for i in range(n)]
+
+def bench(sizes: Sequence[int], workers: Optional[int], chunk: int, chain_id: int = 97):
+    acct = Account.create()
+    signer = PoolSigner(acct.key.hex(), workers=workers, chunk=chunk, min_batch=0)
+    t0 = time.perf_counter()
+    signer.start()
+    print(f"pool start: {signer.workers} worker(s) in {time.perf_counter() - t0:.2f}s (cpu_count={os.cpu_count()})")
+    try:
+        for n in sizes:
+            txs = _bench_txs(n, chain_id)
+            t0 = time.perf_counter()
+            single = signer._inline(txs)
+            t_single = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            pooled = signer.sign(txs)
+            t_pool = time.perf_counter() - t0
+            assert pooled == single, "pool output differs from inline signing"
+            print(f"n={n:<6} single {t_single:7.2f}s ({n / t_single:7.0f} tx/s) | "
+                  f"pool {t_pool:7.2f}s ({n / t_pool:7.0f} tx/s) | x{t_single / t_pool:.2f}")
+    finally:
+        signer.close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="SLH transaction signer")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("bench", help="single-threaded vs process-pool signing, same txs, same key")
+    b.add_argument("--n", default="1000,10000", help="comma list of batch sizes")
+    b.add_argument("--workers", type=int, default=None, help="default: CPU count")
+    b.add_argument("--chunk", type=int, default=128)
+    a = ap.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    bench([int(x) for x in a.n.split(",")], a.workers, a.chunk)
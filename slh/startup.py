@@ -0,0 +1,139 @@
+"""Boot profile and warm-up readiness gate for the API and the bots.
+
+Import this module before anything heavy. The process start time comes from
+/proc (or, elsewhere, from this import), so the profile covers the whole
+restart: imports, serving, warm-up done, first request.
+
+    WARMUP = Warmup(timeout=20)
+    WARMUP.step("chain", load_chain, required=True)
+    WARMUP.step("engine", lambda: engine().warm())
+    WARMUP.start()          # on boot, in the background
+    await WARMUP.wait()     # gate for work that needs the warm stack
+    WARMUP.report()         # {"ready", "ok", "steps", "marks", "imports"} for /healthz
+
+``lazy("slh.txengine")`` returns a stand-in that imports the module on first
+attribute access, which keeps web3 & co. off the import path; the time each
+deferred import took is part of the report.
+"""
+import asyncio, importlib, logging, os, sys, time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("slh.startup")
+
+
+def _process_start() -> float:
+    try:
+        with open("/proc/self/stat") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])  # field 22: starttime, clock ticks after boot
+        with open("/proc/stat") as f:
+            btime = next(int(ln.split()[1]) for ln in f if ln.startswith("btime"))
+        return btime + ticks / os.sysconf("SC_CLK_TCK")
+    except Exception:
+        return time.time()
+
+PROCESS_START = _process_start()
+MARKS: Dict[str, float] = {}    # phase -> seconds since process start
+IMPORTS: Dict[str, float] = {}  # module -> seconds its (deferred) import took
+
+
+def mark(name: str):
+    """Record the first time ``name`` happened (imports, serving, ready, first_request...)."""
+    if name not in MARKS:
+        MARKS[name] = round(time.time() - PROCESS_START, 3)
+
+def first_request():
+    if "first_request" not in MARKS:
+        mark("first_request")
+
+
+def timed_import(name: str):
+    mod = sys.modules.get(name)
+    if mod is None:
+        t0 = time.perf_counter()
+        mod = importlib.import_module(name)
+        IMPORTS.setdefault(name, round(time.perf_counter() - t0, 3))
+    return mod
+
+
+class _Lazy:
+    def __init__(self, name: str):
+        self._lazy_name = name
+        self._lazy_mod = None
+
+    def _load(self):
+        if self._lazy_mod is None:
+            self._lazy_mod = timed_import(self._lazy_name)
+        return self._lazy_mod
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy {self._lazy_name} ({'loaded' if self._lazy_mod is not None else 'not loaded'})>"
+
+def lazy(name: str) -> Any:
+    return _Lazy(name)
+
+def preload(*mods):
+    """Import lazy modules now (meant for a warm-up thread)."""
+    for m in mods:
+        m._load() if isinstance(m, _Lazy) else timed_import(m)
+
+
+class Warmup:
+    """Named async steps run once, in order; each gets ``timeout`` seconds and records its outcome.
+
+    A failed ``required`` step stops the run and leaves ``ok`` False; any other
+    failure is reported but does not keep the process from becoming ready.
+    """
+
+    def __init__(self, timeout: float = 20.0):
+        self.timeout = timeout
+        self._steps: List[Tuple[str, Callable[[], Awaitable], bool]] = []
+        self.steps: Dict[str, dict] = {}
+        self.ready = False
+        self.ok: Optional[bool] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def step(self, name: str, fn: Callable[[], Awaitable], required: bool = False):
+        self._steps.append((name, fn, required))
+
+    def start(self) -> asyncio.Task:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="warmup")
+        return self._task
+
+    async def wait(self) -> bool:
+        await asyncio.shield(self.start())
+        return bool(self.ok)
+
+    async def _run(self):
+        t0, ok = time.perf_counter(), True
+        for name, fn, required in self._steps:
+            s0 = time.perf_counter()
+            try:
+                detail = await asyncio.wait_for(fn(), self.timeout)
+                res = {"ok": True}
+                if detail is not None:
+                    res["detail"] = detail
+            except Exception as e:
+                res = {"ok": False, "error": str(e) or type(e).__name__}
+                logger.warning("[WARMUP] %s failed: %s", name, res["error"])
+            res["seconds"] = round(time.perf_counter() - s0, 3)
+            self.steps[name] = res
+            if required and not res["ok"]:
+                ok = False
+                break
+        self.ok, self.ready = ok, True
+        mark("ready")
+        logger.info("[WARMUP] %s in %.2fs (%.2fs since process start) | %s", "ready" if ok else "FAILED",
+                    time.perf_counter() - t0, MARKS["ready"],
+                    " ".join(f"{n}={'ok' if r['ok'] else 'fail'}/{r['seconds']}s" for n, r in self.steps.items()))
+
+    def report(self) -> dict:
+        return {"ready": self.ready, "ok": self.ok, "steps": dict(self.steps),
+                "marks": dict(MARKS), "imports": dict(IMPORTS)}
+
+
+def warmup_from_env() -> Warmup:
+    return Warmup(timeout=float(os.environ.get("WARMUP_TIMEOUT", "20")))
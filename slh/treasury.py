@@ -0,0 +1,83 @@
+"""Treasury transaction builders and batch helpers.
+
+Batches are signed and broadcast by ``AsyncTxEngine.sign_batch`` /
+``AsyncTxEngine.broadcast``; this module builds the calls, de-duplicates the
+wallets and describes a signed item (``Signed``).
+"""
+import os, re
+from decimal import Decimal
+from typing import Callable, Iterable, NamedTuple
+
+from web3 import Web3
+
+from slh.rpc import get_contract
+from slh.viewcache import cached_call, cached_call_async
+
+WALLET_RE = re.compile(r"0x[a-fA-F0-9]{40}")
+
+ERC721_MINT_URI_ABI = [{
+    "inputs": [{"internalType": "address", "name": "to", "type": "address"},
+               {"internalType": "string", "name": "uri", "type": "string"}],
+    "name": "safeMint", "outputs": [], "stateMutability": "nonpayable", "type": "function",
+}]
+
+ERC20_ABI = [
+    {"inputs": [{"internalType": "address", "name": "to", "type": "address"},
+                {"internalType": "uint256", "name": "amount", "type": "uint256"}],
+     "name": "transfer", "outputs": [{"internalType": "bool", "name": "", "type": "bool"}],
+     "stateMutability": "nonpayable", "type": "function"},
+    {"inputs": [], "name": "decimals", "outputs": [{"internalType": "uint8", "name": "", "type": "uint8"}],
+     "stateMutability": "view", "type": "function"},
+    {"inputs": [], "name": "symbol", "outputs": [{"internalType": "string", "name": "", "type": "string"}],
+     "stateMutability": "view", "type": "function"},
+]
+
+
+class Signed(NamedTuple):
+    index: int
+    wallet: str
+    nonce: int
+    raw: bytes
+    tx_hash: str
+
+
+def treasury_account(w3: Web3):
+    pk = os.environ.get("TREASURY_PRIVATE_KEY")
+    if not pk:
+        raise RuntimeError("Missing env: TREASURY_PRIVATE_KEY")
+    return w3.eth.account.from_key(pk)
+
+def fee_fields(w3: Web3) -> dict:
+    return {
+        "maxFeePerGas": w3.to_wei(os.environ.get("MAX_FEE_GWEI", "2"), "gwei"),
+        "maxPriorityFeePerGas": w3.to_wei(os.environ.get("MAX_PRIO_FEE_GWEI", "1"), "gwei"),
+    }
+
+def mint_call(w3: Web3, contract: str, to_wallet: str, token_uri: str):
+    c = get_contract(w3, contract, ERC721_MINT_URI_ABI)
+    return c.functions.safeMint(Web3.to_checksum_address(to_wallet), token_uri)
+
+def erc20_decimals(w3: Web3, token: str) -> int:
+    return cached_call(get_contract(w3, token, ERC20_ABI).functions.decimals())
+
+async def erc20_decimals_async(w3: Web3, token: str, call: Callable, chain_id: int) -> int:
+    return await cached_call_async(get_contract(w3, token, ERC20_ABI).functions.decimals(), call, chain_id)
+
+def grant_call(w3: Web3, token: str, to_wallet: str, amount: str, decimals: int):
+    units = int(Decimal(amount) * (10 ** decimals))
+    return get_contract(w3, token, ERC20_ABI).functions.transfer(Web3.to_checksum_address(to_wallet), units)
+
+
+def dedupe_wallets(items: Iterable, wallet_of: Callable = lambda it: it.to_wallet):
+    """Split items into (accepted [(index, item)], rejected [result dict]) by wallet validity/uniqueness."""
+    seen, ok, rejected = set(), [], []
+    for i, it in enumerate(items):
+        w = (wallet_of(it) or "").strip()
+        if not WALLET_RE.fullmatch(w):
+            rejected.append({"i": i, "wallet": w, "ok": False, "error": "invalid wallet"})
+        elif w.lower() in seen:
+            rejected.append({"i": i, "wallet": w, "ok": False, "error": "duplicate wallet"})
+        else:
+            seen.add(w.lower())
+            ok.append((i, it))
+    return ok, rejected
@@ -0,0 +1,344 @@
+"""Async transaction engine: build, sign, send and confirm without threads.
+
+Calldata is encoded offline from the contract function, the transaction is
+signed locally and broadcast over a shared ``AsyncRPC`` client (to the
+``RPC_BROADCAST`` best endpoints at once); confirmation and Transfer decoding go through the batched
+``ReceiptWatcher``. Retries back off with ``asyncio.sleep``, so hundreds of
+mints can be in flight from a single event loop, and a cancelled send gives
+its nonce back.
+
+Fees and gas limits come from the ``GasOracle`` (fee history percentiles,
+per-call-shape estimates). A transaction still unmined ``bump_after`` seconds
+after it was sent is re-signed at the same nonce with bumped fees; ``wait``
+resolves with whichever version gets mined. Concurrent waiters on any version
+of the same tx share one confirmation loop, and a mined result is remembered
+for later waiters.
+
+    engine = AsyncTxEngine(rpc_spec, 97, acct, contract=NFT)
+    tx_hash, res = await engine.transact(mint_call(w3, NFT, wallet, uri), gas=220000)
+"""
+import asyncio, logging, time
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Iterable, List, Optional, Tuple
+
+import httpx
+from web3 import Web3
+
+from slh.gas import GasOracle, oracle_from_env
+from slh.metrics import RETRIES, histogram
+from slh.nonce import is_nonce_error, treasury_nonces
+from slh.receipts import ReceiptWatcher, TxResult
+from slh.ratelimit import Coalescer
+from slh.rpc import AsyncRPC, RPCError, fastest_url, get_w3
+from slh.treasury import Signed, fee_fields
+
+logger = logging.getLogger("slh.txengine")
+
+_KNOWN = ("already known", "known transaction")
+
+
+def is_revert(err: RPCError) -> bool:
+    """Execution reverted (code 3 or a "revert" message), as opposed to a rate limit or a struggling node."""
+    return err.code == 3 or "revert" in str(err).lower()
+_TRACKED_MAX = 10_000  # sent txs remembered for replacement
+
+TX_STAGE = histogram("slh_tx_stage_seconds", "Transaction pipeline stages (price, sign, send, confirm)", ("stage",))
+
+
+class AsyncTxEngine:
+    def __init__(self, rpc_url: str, chain_id: int, account, contract: Optional[str] = None,
+                 retries: int = 5, backoff: float = 1.0, watcher: Optional[ReceiptWatcher] = None,
+                 receipt_timeout: float = 180.0, poll_interval: float = 1.0, http_timeout: float = 30.0,
+                 oracle: bool = True, bump_after: float = 0.0, max_bumps: int = 3, rpc: Optional[AsyncRPC] = None):
+        self.rpc_url = rpc_url
+        self.chain_id = int(chain_id)
+        self.account = account
+        self.retries = max(1, retries)
+        self.backoff = backoff
+        self.w3 = get_w3(rpc_url)  # offline helpers only (to_wei, ABI encoding); no calls on the loop
+        self.nonces = treasury_nonces(self.w3, account.address, self.chain_id)
+        self._own_rpc = rpc is None
+        self.rpc = rpc or AsyncRPC(rpc_url, http_timeout)
+        self.watcher = watcher or ReceiptWatcher(rpc_url, contract or "", poll_interval=poll_interval,
+                                                 timeout=receipt_timeout, rpc=self.rpc)
+        self._resync = asyncio.Lock()
+        self.oracle: Optional[GasOracle] = oracle_from_env(self.call) if oracle else None
+        self.bump_after = bump_after
+        self.max_bumps = max_bumps
+        # every hash of a tracked tx (original + replacements) -> {"tx": signed fields, "sent_at", "hashes"}
+        self._sent: "OrderedDict[str, dict]" = OrderedDict()
+        self._mined: "OrderedDict[str, TxResult]" = OrderedDict()  # any version's hash -> final receipt
+        self._waits = Coalescer()  # original hash -> the one confirmation loop for that nonce
+
+    # ---------- public ----------
+    def build(self, fn, gas: int, nonce: int, fees: Optional[dict] = None) -> dict:
+        """Unsigned EIP-1559 tx for a bound ContractFunction; no network I/O."""
+        return dict(fees or fee_fields(self.w3), to=fn.address, data=fn._encode_transaction_data(),
+                    value=0, gas=int(gas), nonce=nonce, chainId=self.chain_id)
+
+    async def send(self, fn, gas: Optional[int] = None, fees: Optional[dict] = None,
+                   on_signed: Optional[Callable[[int, str], None]] = None) -> str:
+        """Sign and broadcast; returns the tx hash once a node accepted it.
+
+        ``gas`` is the fallback limit when the oracle is off or its estimate is unreachable.
+        ``on_signed(nonce, tx_hash)`` runs before each newly signed tx is broadcast.
+        """
+        with TX_STAGE.labels("price").time():
+            fees = fees or (await self.oracle.current() if self.oracle else fee_fields(self.w3))
+            gas = await self._gas_limit(fn, gas)
+        nonce = raw = tx_hash = None
+        last_exc: Optional[BaseException] = None
+        try:
+            for i in range(self.retries):
+                url = fastest_url(self.rpc_url)
+                t0 = time.monotonic()
+                try:
+                    if nonce is None:
+                        nonce = await self._reserve(url)
+                        with TX_STAGE.labels("sign").time():
+                            signed = self.account.sign_transaction(self.build(fn, gas, nonce, fees))
+                        raw, tx_hash = Web3.to_hex(signed.rawTransaction), Web3.to_hex(signed.hash)
+                        if on_signed is not None:
+                            on_signed(nonce, tx_hash)
+                    await self.rpc.send_raw(raw)
+                except RPCError as e:
+                    last_exc = e
+                    if any(s in str(e).lower() for s in _KNOWN):
+                        pass  # an earlier attempt did reach the node
+                    elif is_nonce_error(e):
+                        # slot taken on chain (another sender): forget it, resync and re-sign right away
+                        logger.warning("[TX] attempt %s/%s nonce conflict: %s | resync", i + 1, self.retries, e)
+                        RETRIES.labels("tx_nonce_resync").inc()
+                        self.nonces.sent(nonce)
+                        self.nonces.invalidate()
+                        nonce = None
+                        continue
+                    else:
+                        if nonce is not None:
+                            self.nonces.release(nonce)
+                        nonce = None
+                        await self._sleep(i, e)
+                        continue
+                except (httpx.HTTPError, ValueError) as e:
+                    # transport failure: the node may or may not have it, so resend the same raw tx
+                    last_exc = e
+                    await self._sleep(i, e)
+                    continue
+                self.nonces.sent(nonce)
+                TX_STAGE.labels("send").observe(time.monotonic() - t0)
+                if self.bump_after > 0 and self.oracle is not None:
+                    self._track(tx_hash, self.build(fn, gas, nonce, fees))
+                logger.info("[TX] sent nonce=%s maxFee=%s maxPrio=%s dt=%.2fs tx=%s", nonce, fees.get("maxFeePerGas"),
+                            fees.get("maxPriorityFeePerGas"), time.monotonic() - t0, tx_hash)
+                nonce = None
+                return tx_hash
+            raise RuntimeError(f"send failed after {self.retries} attempts: {last_exc}")
+        finally:
+            if nonce is not None:  # failed or cancelled before any node accepted it
+                self.nonces.release(nonce)
+
+    async def sign_batch(self, calls: Iterable[tuple], gas: int, signer=None) -> List[Signed]:
+        """Sign ``(index, wallet, contract_fn)`` items at consecutive nonces; no network I/O per item.
+
+        ``signer`` (a ``slh.signer.PoolSigner`` for the same key) moves the signing into worker processes.
+        """
+        fees = await self.oracle.current() if self.oracle else fee_fields(self.w3)
+        await self._sync_nonce()
+        meta, txs = [], []
+        try:
+            for index, wallet, fn in calls:
+                nonce = self.nonces.reserve()
+                meta.append((index, wallet, nonce))
+                txs.append(self.build(fn, gas, nonce, fees))
+            if signer is not None:
+                signed = await signer.sign_async(txs)
+            else:
+                signed = [(bytes(s.rawTransaction), s.hash.hex()) for s in map(self.account.sign_transaction, txs)]
+        except BaseException:
+            for _, _, n in reversed(meta):
+                self.nonces.release(n)
+            raise
+        return [Signed(index, wallet, nonce, raw, h) for (index, wallet, nonce), (raw, h) in zip(meta, signed)]
+
+    async def broadcast(self, signed: List[Signed], concurrency: int = 8) -> AsyncIterator[dict]:
+        """Send signed txs, ``concurrency`` at a time; yields one result dict per tx in completion order."""
+        gate = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(s: Signed) -> dict:
+            async with gate:
+                try:
+                    await self.rpc.send_raw(Web3.to_hex(s.raw))
+                except (RPCError, httpx.HTTPError, ValueError) as e:
+                    if not any(k in str(e).lower() for k in _KNOWN):
+                        if isinstance(e, RPCError) and not is_nonce_error(e):
+                            self.nonces.release(s.nonce)  # refused: the nonce never left the process
+                        else:
+                            self.nonces.sent(s.nonce)  # slot taken on chain, or unknown after a transport error: resync
+                            self.nonces.invalidate()
+                        logger.warning("[BATCH] send failed | nonce=%s wallet=%s | %s", s.nonce, s.wallet, e)
+                        return {"i": s.index, "wallet": s.wallet, "ok": False, "nonce": s.nonce, "error": str(e)}
+            self.nonces.sent(s.nonce)
+            return {"i": s.index, "wallet": s.wallet, "ok": True, "nonce": s.nonce, "tx": s.tx_hash}
+
+        # tasks, not bare coroutines: a client that hangs up mid-stream does not strand the remaining nonces
+        for t in asyncio.as_completed([asyncio.ensure_future(one(s)) for s in signed]):
+            yield await t
+
+    async def wait(self, tx_hash: str) -> TxResult:
+        """Receipt of ``tx_hash`` or of a fee-bumped replacement (``TxResult.tx_hash`` tells which)."""
+        h = tx_hash.lower()
+        res = self._mined.get(h)
+        if res is not None:
+            return res
+        ent = self._sent.get(h)
+        if ent is None:
+            t0 = time.monotonic()
+            try:
+                return await self.watcher.wait(tx_hash)
+            finally:
+                TX_STAGE.labels("confirm").observe(time.monotonic() - t0)
+        task, _ = self._waits.submit(ent["hashes"][0], lambda: self._wait_or_bump(ent))
+        return await asyncio.shield(task)
+
+    async def _wait_or_bump(self, ent: dict) -> TxResult:
+        """One loop per nonce: watch every version, bump when due, first mined wins."""
+        tx, sent_at, t0 = ent["tx"], ent["sent_at"], ent["sent_at"]
+        hashes, bumps, last_exc = list(ent["hashes"]), 0, None
+        try:
+            while hashes:
+                futs = {self.watcher.watch(h): h for h in hashes}
+                left = self.bump_after - (time.monotonic() - sent_at)
+                can_bump = bumps < self.max_bumps
+                done, _ = await asyncio.wait(futs, timeout=max(left, 0.0) if can_bump else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                won = next((f for f in done if not f.cancelled() and f.exception() is None), None)
+                if won is not None:
+                    for f, h in futs.items():
+                        if f is not won:
+                            self.watcher.forget(h)
+                    res = won.result()
+                    for h in ent["hashes"]:
+                        self._mined[h] = res
+                    while len(self._mined) > _TRACKED_MAX:
+                        self._mined.popitem(last=False)
+                    return res
+                if done:
+                    # one version timed out: not fatal while another can still be mined
+                    for f in done:
+                        h = futs[f]
+                        last_exc = f.exception() if not f.cancelled() else RuntimeError(f"stopped watching {h}")
+                        hashes.remove(h)
+                        if hashes:
+                            logger.warning("[TX] nonce=%s gave up on %s (%s), still watching %s",
+                                           tx["nonce"], h, last_exc, ", ".join(hashes))
+                    continue
+                new = await self._replace(tx, bumps + 1)
+                bumps += 1
+                if new is not None:
+                    tx, h = new
+                    ent["tx"] = tx
+                    hashes.append(h)
+                    ent["hashes"].append(h)
+                    self._sent[h] = ent  # a waiter on the replacement joins this loop
+                sent_at = time.monotonic()
+            raise last_exc
+        finally:
+            for h in ent["hashes"]:  # final: later waiters get _mined, or the plain watcher
+                self._sent.pop(h, None)
+            TX_STAGE.labels("confirm").observe(time.monotonic() - t0)
+
+    async def transact(self, fn, gas: Optional[int] = None, fees: Optional[dict] = None) -> Tuple[str, TxResult]:
+        tx_hash = await self.send(fn, gas, fees)
+        return tx_hash, await self.wait(tx_hash)
+
+    async def call(self, method: str, params: list, url: Optional[str] = None):
+        return await self.rpc.call(method, params, url)
+
+    async def warm(self) -> dict:
+        """Open the RPC pool and prefetch what the first send needs: chain id, pending nonce, fees."""
+        async def fees():
+            if self.oracle is None:
+                return None
+            await self.oracle.current()  # also starts the background fee poll
+            return self.oracle.snapshot.base_fee if self.oracle.snapshot else None
+        chain, nonce, base_fee = await asyncio.gather(self.call("eth_chainId", []), self._sync_nonce(), fees())
+        if int(chain, 16) != self.chain_id:
+            raise RuntimeError(f"RPC chain id {int(chain, 16)} != CHAIN_ID {self.chain_id}")
+        return {"chain_id": self.chain_id, "nonce": nonce, "base_fee": base_fee}
+
+    async def close(self):
+        if self.oracle is not None:
+            await self.oracle.close()
+        await self.watcher.close()
+        if self._own_rpc:
+            await self.rpc.close()
+
+    # ---------- internals ----------
+    async def _sync_nonce(self, url: Optional[str] = None) -> Optional[int]:
+        if self.nonces.stale:
+            async with self._resync:  # one pending-count fetch for a burst of senders
+                if self.nonces.stale:
+                    return self.nonces.resync(int(await self.call("eth_getTransactionCount", [self.account.address, "pending"], url=url), 16))
+        return None
+
+    async def _reserve(self, url: str) -> int:
+        await self._sync_nonce(url)
+        return self.nonces.reserve()
+
+    async def _gas_limit(self, fn, fallback: Optional[int]) -> int:
+        if self.oracle is None:
+            if fallback is None:
+                raise ValueError("gas limit required when the gas oracle is off")
+            return int(fallback)
+        try:
+            return await self.oracle.estimate({"to": fn.address, "data": fn._encode_transaction_data()}, self.account.address)
+        except RPCError as e:
+            if is_revert(e):
+                raise  # the call itself reverts: sending it would only burn gas
+            err = e  # rate limit (-32005), "internal error", timeout: the node, not the call
+        except (httpx.HTTPError, ValueError) as e:
+            err = e
+        if fallback is None:
+            raise err
+        logger.warning("[TX] gas estimate unavailable (%s), using %s", err, fallback)
+        return int(fallback)
+
+    def _track(self, tx_hash: str, tx: dict):
+        h = tx_hash.lower()
+        self._sent[h] = {"tx": tx, "sent_at": time.monotonic(), "hashes": [h]}
+        while len(self._sent) > _TRACKED_MAX:
+            self._sent.popitem(last=False)
+
+    async def _replace(self, tx: dict, n: int) -> Optional[Tuple[dict, str]]:
+        """Re-sign ``tx`` at its nonce with bumped fees and broadcast it; (new tx, hash) or None."""
+        fees = self.oracle.bump(tx)
+        if fees is None:
+            logger.warning("[TX] stuck nonce=%s but bump would exceed the fee cap", tx["nonce"])
+            return None
+        new = dict(tx, **fees)
+        signed = self.account.sign_transaction(new)
+        raw, h = Web3.to_hex(signed.rawTransaction), Web3.to_hex(signed.hash)
+        try:
+            await self.rpc.send_raw(raw)
+        except RPCError as e:
+            if not any(s in str(e).lower() for s in _KNOWN):
+                # "nonce too low": an earlier version just got mined; underpriced: the next bump starts higher
+                logger.warning("[TX] replacement %s for nonce=%s refused: %s", n, tx["nonce"], e)
+                if "underpriced" in str(e).lower():
+                    tx.update(fees)
+                return None
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning("[TX] replacement %s for nonce=%s not sent: %s", n, tx["nonce"], e)
+            return None
+        RETRIES.labels("tx_replace").inc()
+        logger.info("[TX] replaced nonce=%s bump=%s maxFee=%s maxPrio=%s tx=%s", tx["nonce"], n,
+                    fees["maxFeePerGas"], fees["maxPriorityFeePerGas"], h)
+        return new, h
+
+    async def _sleep(self, i: int, err: BaseException):
+        if i + 1 >= self.retries:
+            return
+        wait = self.backoff * (2 ** i)
+        RETRIES.labels("tx_send").inc()
+        logger.warning("[TX] attempt %s/%s failed: %s | backoff %.1fs", i + 1, self.retries, err, wait)
+        await asyncio.sleep(wait)
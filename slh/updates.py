@@ -0,0 +1,150 @@
+"""Concurrent Telegram update processing for PTB applications.
+
+``ChatUpdateProcessor`` lets updates from different chats run side by side
+while each chat still sees its updates one at a time, in arrival order (so
+wizard steps such as WIZ_SELL never overtake each other). On top of that:
+
+* redelivered updates (same ``update_id``) are dropped, using a bounded
+  cache of recently seen ids;
+* at most ``max_concurrent_updates`` handlers run at once, and at most
+  ``max_backlog`` updates are admitted; beyond that PTB stops taking updates
+  off its ``update_queue``, which is bounded too, so webhook deliveries and
+  polling slow down instead of piling up in memory;
+* a chat with ``max_per_chat`` updates already waiting gets the rest dropped.
+
+    proc = processor_from_env()
+    app = ApplicationBuilder().token(TOKEN).update_queue(proc.update_queue).concurrent_updates(proc).build()
+"""
+import asyncio, logging, os, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram.ext import BaseUpdateProcessor
+
+from slh import metrics, startup
+
+logger = logging.getLogger("slh.updates")
+
+UPDATE_WAIT = metrics.histogram("slh_update_wait_seconds", "Time an admitted update waited for its chat turn and a handler slot")
+UPDATES_DROPPED = metrics.counter("slh_updates_dropped_total", "Updates not processed", ("reason",))
+
+
+class _AdmissionQueue(asyncio.Queue):
+    """PTB's update_queue; its consumer only gets the next update once an admission slot is free."""
+
+    def __init__(self, maxsize: int, slots: asyncio.Semaphore):
+        super().__init__(maxsize)
+        self._slots = slots
+
+    async def get(self):
+        await self._slots.acquire()
+        try:
+            item = await super().get()
+        except BaseException:
+            self._slots.release()
+            raise
+        if type(item) is object:  # PTB's stop sentinel never reaches the processor
+            self._slots.release()
+        return item
+
+
+def _chat_key(update: Any) -> Optional[Hashable]:
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, "effective_user", None)
+    return ("user", user.id) if user is not None else None
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = 32, max_backlog: int = 256,
+                 max_per_chat: int = 50, seen_size: int = 10_000):
+        max_backlog = max(max_backlog, max_concurrent_updates, 2)
+        super().__init__(max_backlog)  # PTB's semaphore counts admitted updates; never contended
+        self.max_running = max_concurrent_updates
+        self.max_backlog = max_backlog
+        self.max_per_chat = max_per_chat
+        self.seen_size = seen_size
+        self._admitted = asyncio.Semaphore(max_backlog)
+        self._running = asyncio.Semaphore(max_concurrent_updates)
+        self.update_queue = _AdmissionQueue(max_backlog, self._admitted)
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._tails: Dict[Hashable, asyncio.Future] = {}  # chat -> last admitted update's completion
+        self._depth: Dict[Hashable, int] = {}
+        self.admitted = 0
+        self.in_flight = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        t0 = time.perf_counter()
+        self.admitted += 1
+        try:
+            reason = self._reject(update)
+            if reason:
+                coroutine.close()
+                UPDATES_DROPPED.labels(reason).inc()
+                logger.warning("[UPDATES] dropped (%s) | update_id=%s", reason, getattr(update, "update_id", None))
+                return
+            key = _chat_key(update)
+            if key is None:
+                await self._run(coroutine, t0)
+                return
+            prev = self._tails.get(key)
+            mine = asyncio.get_running_loop().create_future()
+            self._tails[key] = mine
+            self._depth[key] = self._depth.get(key, 0) + 1
+            try:
+                if prev is not None:
+                    await asyncio.shield(prev)
+                await self._run(coroutine, t0)
+            finally:
+                mine.set_result(None)
+                self._depth[key] -= 1
+                if not self._depth[key]:
+                    del self._depth[key]
+                if self._tails.get(key) is mine:
+                    del self._tails[key]
+        finally:
+            self.admitted -= 1
+            self._admitted.release()
+
+    async def _run(self, coroutine, t0: float):
+        async with self._running:
+            UPDATE_WAIT.observe(time.perf_counter() - t0)
+            self.in_flight += 1
+            try:
+                await coroutine
+            finally:
+                self.in_flight -= 1
+                startup.first_request()
+
+    def _reject(self, update: object) -> Optional[str]:
+        uid = getattr(update, "update_id", None)
+        if uid is not None:
+            if uid in self._seen:
+                return "duplicate"
+            self._seen[uid] = None
+            while len(self._seen) > self.seen_size:
+                self._seen.popitem(last=False)
+        key = _chat_key(update)
+        if key is not None and self._depth.get(key, 0) >= self.max_per_chat:
+            return "chat_flood"
+        return None
+
+
+def processor_from_env() -> ChatUpdateProcessor:
+    proc = ChatUpdateProcessor(
+        max_concurrent_updates=int(os.environ.get("BOT_CONCURRENT_UPDATES", "32")),
+        max_backlog=int(os.environ.get("BOT_UPDATE_BACKLOG", "256")),
+        max_per_chat=int(os.environ.get("BOT_UPDATES_PER_CHAT", "50")),
+        seen_size=int(os.environ.get("BOT_SEEN_UPDATES", "10000")),
+    )
+    metrics.gauge("slh_updates_inflight", "Update handlers running").set_function(lambda: proc.in_flight)
+    metrics.gauge("slh_updates_admitted", "Updates taken off the queue and not finished").set_function(lambda: proc.admitted)
+    metrics.gauge("slh_updates_queued", "Updates waiting in PTB's update_queue").set_function(lambda: proc.update_queue.qsize())
+    return proc
@@ -0,0 +1,134 @@
+"""Read-through cache for contract view calls.
+
+Entries are keyed by (chain, contract, function, args, block tag):
+
+* ``name`` / ``symbol`` / ``decimals`` and any call pinned to a block number
+  never change, so they are kept until evicted;
+* mutable reads get a short TTL (``ownerOf`` 15s, ``tokenURI`` 5 min, …);
+* ``invalidate_token`` drops ownership reads as soon as a Transfer for that
+  token is observed (indexer, receipt watcher).
+
+Bounded by ``VIEW_CACHE_MAX`` entries with LRU eviction.
+
+    symbol = cached_call(token.functions.symbol())
+    decimals = await cached_call_async(token.functions.decimals(), rpc.call, chain_id)
+"""
+import os, threading, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set
+
+from eth_abi import decode
+from web3._utils.abi import get_abi_output_types
+
+IMMUTABLE = frozenset({"name", "symbol", "decimals"})
+TTLS = {"ownerOf": 15.0, "getApproved": 15.0, "balanceOf": 15.0, "tokenURI": 300.0}
+DEFAULT_TTL = 30.0
+
+_OWNERSHIP = ("ownerOf", "getApproved")
+
+
+class ViewCache:
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, expires_at | None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable):
+        """(hit, value)."""
+        with self._lock:
+            ent = self._data.get(key)
+            if ent is None or (ent[1] is not None and ent[1] < time.monotonic()):
+                if ent is not None:
+                    del self._data[key]
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, ent[0]
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float]):
+        with self._lock:
+            self._data[key] = (value, None if ttl is None else time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+_CACHE = ViewCache(int(os.environ.get("VIEW_CACHE_MAX", "10000")))
+_CHAIN_IDS: Dict[str, int] = {}  # RPC spec -> chain id (sync path)
+_CHAINS: Set[int] = set()         # every chain id a cached read was keyed by, sync or async
+
+
+def view_cache() -> ViewCache:
+    return _CACHE
+
+def _chain_id(w3) -> int:
+    spec = str(w3.provider.endpoint_uri)
+    cid = _CHAIN_IDS.get(spec)
+    if cid is None:
+        cid = _CHAIN_IDS[spec] = int(w3.eth.chain_id)
+        _CHAINS.add(cid)
+    return cid
+
+def _freeze(v):
+    if isinstance(v, (list, tuple)):
+        return tuple(_freeze(x) for x in v)
+    if isinstance(v, str) and v.startswith("0x"):
+        return v.lower()
+    return v
+
+def call_key(chain_id: int, contract: str, fn_name: str, args: tuple, block="latest") -> tuple:
+    return (chain_id, contract.lower(), fn_name, _freeze(args), block)
+
+
+def cached_call(fn, block_identifier="latest", ttl: Optional[float] = None):
+    """``fn.call()`` through the cache; ``fn`` is a bound ContractFunction (``c.functions.x(args)``)."""
+    key = call_key(_chain_id(fn.w3), fn.address, fn.fn_name, tuple(fn.args or ()), block_identifier)
+    hit, value = _CACHE.get(key)
+    if hit:
+        return value
+    value = fn.call(block_identifier=block_identifier)
+    _store(key, fn.fn_name, block_identifier, ttl, value)
+    return value
+
+async def cached_call_async(fn, call: Callable[[str, list], Awaitable], chain_id: int,
+                            block_identifier="latest", ttl: Optional[float] = None):
+    """``cached_call`` for the event loop: a miss is one ``eth_call`` through ``call`` (e.g. ``AsyncRPC.call``)."""
+    _CHAINS.add(chain_id)
+    key = call_key(chain_id, fn.address, fn.fn_name, tuple(fn.args or ()), block_identifier)
+    hit, value = _CACHE.get(key)
+    if hit:
+        return value
+    block = hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+    raw = await call("eth_call", [{"to": fn.address, "data": fn._encode_transaction_data()}, block])
+    out = decode(get_abi_output_types(fn.abi), bytes.fromhex(raw[2:]))
+    value = out[0] if len(out) == 1 else list(out)
+    _store(key, fn.fn_name, block_identifier, ttl, value)
+    return value
+
+def _store(key: tuple, fn_name: str, block_identifier, ttl: Optional[float], value):
+    if ttl is None and (fn_name in IMMUTABLE or isinstance(block_identifier, int)):
+        _CACHE.put(key, value, None)
+    else:
+        _CACHE.put(key, value, ttl if ttl is not None else TTLS.get(fn_name, DEFAULT_TTL))
+
+
+def invalidate_token(contract: str, token_id: int, *wallets: str):
+    """A Transfer of ``token_id`` was seen: drop latest-block ownership reads and the wallets' balances."""
+    for cid in tuple(_CHAINS):
+        for name in _OWNERSHIP:
+            _CACHE.discard(call_key(cid, contract, name, (token_id,)))
+        for w in wallets:
+            _CACHE.discard(call_key(cid, contract, "balanceOf", (w,)))